@@ -0,0 +1,79 @@
+"""
+Micro benchmark of attribute access on documents. It compares a normal
+python object, a Document and a Document which uses the old
+``__getattribute__`` based attribute access.
+
+Usage::
+
+    python benchmarks/document_access.py [number]
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../"))
+
+from djamo import Document
+from djamo.serializers import Serializer
+
+
+class AnySerializer(Serializer):
+
+    def is_valid_value(self, value):
+        return True
+
+
+class Plain(object):
+
+    def __init__(self, data):
+        self.__dict__.update(data)
+        self._fields = {}
+
+    def validate(self):
+        pass
+
+
+class Student(Document):
+    fields = {
+        "age": AnySerializer(),
+    }
+
+    def validate(self):
+        pass
+
+
+class OldStudent(Student):
+
+    def __getattribute__(self, name):
+        if name in self:
+            return self[name]
+
+        return super(OldStudent, self).__getattribute__(name)
+
+
+CASES = [
+    ("field attribute", "doc.age"),
+    ("key attribute", "doc.name"),
+    ("method lookup", "doc.validate"),
+    ("internal attribute", "doc._fields"),
+]
+
+
+def run(number=1000000):
+    data = {"name": "Okarin", "age": 18}
+    docs = [("object", Plain(data)),
+            ("Document", Student(data)),
+            ("old Document", OldStudent(data))]
+
+    print("%d iterations" % number)
+    print("%-20s %14s %14s %14s" % (("",) + tuple(i[0] for i in docs)))
+
+    for title, statement in CASES:
+        row = [timeit.timeit(statement, number=number, globals={"doc": doc})
+               for name, doc in docs]
+
+        print("%-20s %13.3fs %13.3fs %13.3fs" % ((title,) + tuple(row)))
+
+
+if __name__ == "__main__":
+    run(*[int(i) for i in sys.argv[1:]])
@@ -0,0 +1,78 @@
+"""
+Benchmark of validating and serializing documents across a pool of
+processes. It prints the preparation time of the documents for different
+number of workers.
+
+Usage::
+
+    python benchmarks/parallel_prepare.py [documents] [max_workers]
+"""
+import os
+import sys
+import time
+from multiprocessing import cpu_count
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../"))
+
+from djamo import Document
+from djamo.collections.parallel import prepare_documents
+from djamo.serializers import String, Float, Integer, List
+
+
+class Car(Document):
+    fields = {
+        "model": String(min_length=3, max_length=15, required=True),
+        "cost": Float(min_value=7.0, max_value=40000.50),
+        "owners": List(String()),
+        "acc": Integer(min_value=30, max_value=60),
+    }
+
+    def validate_model(self, value):
+        if not value.isalnum():
+            raise self._fields["model"].ValidationError("bad model")
+
+
+def cars(count):
+    for i in range(count):
+        yield {"model": "model%s" % (i % 1000), "cost": 100.0 + i % 100,
+               "owners": ["owner%s" % j for j in range(10)],
+               "acc": 30 + i % 30}
+
+
+def serial(count):
+    result = []
+    for data in cars(count):
+        doc = Car(data)
+        doc.save()
+        result.append(doc.serialize())
+    return result
+
+
+def run(count=200000, max_workers=None):
+    max_workers = max_workers or cpu_count()
+
+    start = time.time()
+    serial(count)
+    base = time.time() - start
+    print("%d documents" % count)
+    print("%-10s %10s %10s" % ("workers", "seconds", "speedup"))
+    print("%-10s %9.3fs %9.2fx" % ("serial", base, 1))
+
+    workers = 1
+    while workers <= max_workers:
+        start = time.time()
+        total = 0
+        for chunk_count, data, error in prepare_documents(Car, cars(count),
+                                                          workers, 2000):
+            if error is not None:
+                raise error
+            total += len(data)
+
+        spent = time.time() - start
+        assert total == count
+        print("%-10s %9.3fs %9.2fx" % (workers, spent, base / spent))
+        workers *= 2
+
+
+if __name__ == "__main__":
+    run(*[int(i) for i in sys.argv[1:]])
@@ -0,0 +1,438 @@
+# -----------------------------------------------------------------------------
+#    Djamo - Yetanother Mongodb driver for Django
+#    Copyright (C) 2012-2013 Yellowen
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+# -----------------------------------------------------------------------------
+"""
+The query recorder aggregates the shapes of the queries which run through
+the collections, so you can compare them with the declared indexes. A
+recorded shape is the operation, the fields of the query grouped by
+equality and range conditions and the sort keys, without any value.
+
+Recording is opt-in. Enable it for a block::
+
+    from djamo.advisor import recorder, advise
+
+    with recorder.recording():
+        run_the_test_suite_or_a_load_test()
+
+    for advice in advise():
+        print(advice)
+
+or for the whole process using the ``record_queries`` key of
+``settings.DJAMO``. The recorded shapes can be written to a file using
+:py:meth:`QueryRecorder.dump` and reported later by the ``indexreport``
+management command::
+
+    $ python manage.py indexreport /tmp/shapes.pickle --explain
+
+The advisor suggests a compound index for each shape that none of the
+declared indexes supports (equality fields first, then the sort keys and
+then the range fields) and flags the declared indexes which none of the
+shapes can use. With ``samples`` the recorder keeps the last query of each
+shape (including its values) to ``explain`` it against a server.
+"""
+import pickle
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+
+from djamo.index import Index
+from djamo.utils import six
+
+
+#: Operators which match exact values, like a plain value
+EQUALITY_OPERATORS = frozenset(["$eq", "$in", "$all"])
+
+
+def sort_pairs(sort):
+    """
+    Return the given sort argument as a tuple of (key, direction) pairs.
+    """
+    if not sort:
+        return ()
+
+    if isinstance(sort, six.string_types):
+        return ((sort, 1),)
+
+    return tuple((i, 1) if isinstance(i, six.string_types) else tuple(i)
+                 for i in sort)
+
+
+def reverse_pairs(pairs):
+    return [(key, -direction) if isinstance(direction, int)
+            else (key, direction) for key, direction in pairs]
+
+
+class QueryShape(namedtuple("QueryShape",
+                            "operation equality ranges sort")):
+    """
+    Shape of a query: the operation (``find``, ``update`` or ``remove``),
+    the sorted tuples of equality and range fields and the sort pairs.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def from_query(cls, operation, spec, sort=None):
+        equality = set()
+        ranges = set()
+
+        for key, value in (spec or {}).items():
+            if key.startswith("$"):
+                # Query level operators like $or and $where
+                continue
+
+            if isinstance(value, dict) and value and \
+               all(i.startswith("$") for i in value):
+                if EQUALITY_OPERATORS.issuperset(value):
+                    equality.add(key)
+                else:
+                    ranges.add(key)
+
+            else:
+                equality.add(key)
+
+        return cls(operation, tuple(sorted(equality)),
+                   tuple(sorted(ranges - equality)), sort_pairs(sort))
+
+    @property
+    def fields(self):
+        """
+        All the fields that an index of this shape might use.
+        """
+        return set(self.equality) | set(self.ranges) | \
+            set(key for key, direction in self.sort)
+
+    def index_keys(self):
+        """
+        Return the keys of the best index for this shape: equality fields,
+        then the sort keys and then the range fields.
+        """
+        keys = [(key, 1) for key in self.equality]
+        used = set(self.equality)
+
+        for key, direction in self.sort:
+            if key not in used:
+                keys.append((key, direction))
+                used.add(key)
+
+        keys.extend((key, 1) for key in self.ranges if key not in used)
+        return keys
+
+    def supported_by(self, keys):
+        """
+        Return True if an index with the given (key, direction) pairs
+        supports this shape.
+        """
+        if not self.fields:
+            # Nothing to look up
+            return True
+
+        keys = [tuple(i) for i in keys]
+        count = len(self.equality)
+        if set(key for key, direction in keys[:count]) != \
+           set(self.equality):
+            return False
+
+        rest = keys[count:]
+        sort = [i for i in self.sort if i[0] not in self.equality]
+        if sort:
+            head = rest[:len(sort)]
+            if head != sort and head != reverse_pairs(sort):
+                return False
+            rest = rest[len(sort):]
+
+        if self.ranges and not self.equality and not sort:
+            return bool(rest) and rest[0][0] in self.ranges
+
+        return True
+
+    def uses(self, keys):
+        """
+        Return True if this shape might use an index with the given keys.
+        """
+        return bool(keys) and keys[0][0] in self.fields
+
+    def __str__(self):
+        parts = []
+        if self.equality:
+            parts.append("equality=%s" % ",".join(self.equality))
+        if self.ranges:
+            parts.append("ranges=%s" % ",".join(self.ranges))
+        if self.sort:
+            parts.append("sort=%s" % ",".join("%s:%s" % i
+                                              for i in self.sort))
+        return "%s(%s)" % (self.operation, " ".join(parts))
+
+
+class ShapeStats(object):
+    """
+    Frequency and latency of a query shape.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+        #: The last query of the shape if the recorder keeps samples
+        self.sample = None
+
+    @property
+    def mean_time(self):
+        if not self.count:
+            return 0.0
+        return self.total_time / self.count
+
+    def merge(self, other):
+        self.count += other.count
+        self.total_time += other.total_time
+        self.max_time = max(self.max_time, other.max_time)
+        if other.sample is not None:
+            self.sample = other.sample
+
+    def as_dict(self):
+        return {"count": self.count,
+                "total_time": self.total_time,
+                "mean_time": self.mean_time,
+                "max_time": self.max_time}
+
+
+class QueryRecorder(object):
+    """
+    A thread safe recorder of the query shapes of each collection class.
+
+    :param enabled: (optional) If ``True`` the recorder is always active. If
+                    no value provided it will be read from settings on first
+                    use.
+    :param samples: (optional) Keep the last query of each shape.
+    """
+
+    def __init__(self, enabled=None, samples=False):
+        self._enabled = enabled
+        self.samples = samples
+        self._lock = threading.Lock()
+        self._shapes = {}
+
+    def _load_settings(self):
+        """
+        Read the ``record_queries`` flag of ``settings.DJAMO``.
+        """
+        from django.conf import settings
+        from django.core.exceptions import ImproperlyConfigured
+
+        try:
+            djamo_settings = getattr(settings, "DJAMO", {})
+        except ImproperlyConfigured:
+            # Djamo is in use without Django settings (e.g tests)
+            return False
+
+        if not isinstance(djamo_settings, dict):
+            return False
+
+        return bool(djamo_settings.get("record_queries", False))
+
+    @property
+    def enabled(self):
+        if self._enabled is None:
+            with self._lock:
+                if self._enabled is None:
+                    self._enabled = self._load_settings()
+
+        return self._enabled
+
+    def configure(self, enabled, samples=False):
+        self._enabled = enabled
+        self.samples = samples
+
+    @contextmanager
+    def recording(self, samples=None):
+        """
+        Record the queries inside a ``with`` block.
+        """
+        old = (self._enabled, self.samples)
+        self._enabled = True
+        if samples is not None:
+            self.samples = samples
+
+        try:
+            yield self
+
+        finally:
+            self._enabled, self.samples = old
+
+    def record(self, collection, operation, spec, sort=None, elapsed=0.0):
+        """
+        Add a query of the given collection to its shape.
+        """
+        shape = QueryShape.from_query(operation, spec, sort)
+        cls = collection.__class__
+
+        with self._lock:
+            shapes = self._shapes.setdefault(cls, {})
+            stats = shapes.get(shape)
+            if stats is None:
+                stats = shapes[shape] = ShapeStats()
+
+            stats.count += 1
+            stats.total_time += elapsed
+            if elapsed > stats.max_time:
+                stats.max_time = elapsed
+            if self.samples:
+                stats.sample = spec
+
+        return shape
+
+    def shapes(self, collection=None):
+        """
+        Return a copy of the recorded shapes of the given collection class
+        (a dictionary of shapes to their stats) or the shapes of all the
+        collections by their class.
+        """
+        with self._lock:
+            if collection is not None:
+                return dict(self._shapes.get(collection, {}))
+
+            return dict((cls, dict(shapes))
+                        for cls, shapes in self._shapes.items())
+
+    def clear(self):
+        with self._lock:
+            self._shapes = {}
+
+    def dump(self, path):
+        """
+        Write the recorded shapes to the given file.
+        """
+        with open(path, "wb") as f:
+            pickle.dump(self.shapes(), f, pickle.HIGHEST_PROTOCOL)
+
+    def load(self, path):
+        """
+        Merge the shapes of a file which is written by :py:meth:`dump`.
+        """
+        with open(path, "rb") as f:
+            data = pickle.load(f)
+
+        with self._lock:
+            for cls, shapes in data.items():
+                current = self._shapes.setdefault(cls, {})
+                for shape, stats in shapes.items():
+                    current.setdefault(shape, ShapeStats()).merge(stats)
+
+
+#: The global recorder which is used by collections
+recorder = QueryRecorder()
+
+
+class Advice(namedtuple("Advice", "collection kind index shapes")):
+    """
+    A suggestion of the advisor. ``kind`` is ``missing`` for a suggested
+    index and ``unused`` for a declared index that no shape uses.
+    ``shapes`` is the list of (shape, stats) pairs of the advice.
+    """
+    __slots__ = ()
+
+    @property
+    def total_time(self):
+        return sum(stats.total_time for shape, stats in self.shapes)
+
+    def __str__(self):
+        name = self.collection.__name__
+        if self.kind == "unused":
+            return "%s: index %s is not used" % (name, self.index.name)
+
+        count = sum(stats.count for shape, stats in self.shapes)
+        return "%s: missing index %s for %s (%d queries, %.3fs)" % (
+            name, self.index.name,
+            ", ".join(str(shape) for shape, stats in self.shapes),
+            count, self.total_time)
+
+
+def advise(recorder=recorder, collections=None):
+    """
+    Compare the recorded shapes with the declared indexes and return the
+    list of :py:class:`Advice`, the missing indexes which cost more come
+    first.
+
+    :param recorder: (optional) The recorder of shapes.
+    :param collections: (optional) List of the collection classes to
+                        advise, all the recorded collections by default.
+    """
+    result = []
+    recorded = recorder.shapes()
+    if collections is None:
+        collections = list(recorded)
+
+    for cls in collections:
+        shapes = recorded.get(cls, {})
+        declared = [[("_id", 1)]] + [i.key_list for i in cls.indexes]
+
+        suggested = {}
+        for shape, stats in shapes.items():
+            if any(shape.supported_by(keys) for keys in declared):
+                continue
+
+            keys = tuple(shape.index_keys())
+            suggested.setdefault(keys, []).append((shape, stats))
+
+        for keys, pairs in suggested.items():
+            result.append(Advice(cls, "missing", Index(list(keys)), pairs))
+
+        for index in cls.indexes:
+            keys = index.key_list
+            if not any(shape.uses(keys) for shape in shapes):
+                result.append(Advice(cls, "unused", index, []))
+
+    result.sort(key=lambda i: (i.kind != "missing", -i.total_time))
+    return result
+
+
+def winning_plan(explanation):
+    """
+    Return a short description of the plan of an ``explain`` result, like
+    ``IXSCAN age_1`` or ``COLLSCAN``.
+    """
+    if "cursor" in explanation:
+        # Old servers
+        return explanation["cursor"]
+
+    plan = explanation.get("queryPlanner", {}).get("winningPlan", {})
+    stages = []
+    while plan:
+        stage = plan.get("stage", "")
+        if plan.get("indexName"):
+            stage = "%s %s" % (stage, plan["indexName"])
+        stages.append(stage)
+        plan = plan.get("inputStage")
+
+    return " <- ".join(stages)
+
+
+def explain(collection, shape, stats):
+    """
+    Run ``explain`` for the sample query of the given shape on the given
+    collection and return the description of its plan, or None if there
+    is no sample.
+    """
+    if stats.sample is None or shape.operation != "find":
+        return None
+
+    cursor = collection._find(stats.sample, as_class=dict)
+    if shape.sort:
+        cursor.sort(list(shape.sort))
+
+    return winning_plan(cursor.explain())
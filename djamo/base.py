@@ -16,72 +16,346 @@
 #    with this program; if not, write to the Free Software Foundation, Inc.,
 #    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 # -----------------------------------------------------------------------------
+"""
+The **Client** manages the connection pool of Djamo to MongoDB. Beside the
+options of the pool itself, it recycles the pool after ``max_age`` seconds
+and checks the health of the server in a background thread::
+
+    DJAMO = {
+        "name": "my_database",
+        "max_pool_size": 50,
+        "min_pool_size": 5,
+        "max_idle_time": 60,
+        "wait_queue_timeout": 1,
+        "max_age": 400,
+        "heartbeat_interval": 10,
+    }
+
+``min_pool_size`` and ``max_idle_time`` need a PyMongo version which
+supports them (3.0 or newer) and will be ignored otherwise. Set
+``heartbeat_interval`` to ``None`` to disable the background checks.
+
+Only PyMongo 2.x clients can drop their connections in place. Newer
+clients are never closed while other threads may use them, instead the
+driver retires the connections which are idle for ``max_idle_time``
+seconds, which defaults to ``max_age``.
+
+Creating a client does not open any connection and does not start any
+thread. The pool connects on the first operation. The background health
+checks only start when you call :py:meth:`Client.warm_up` (for example in
+the post fork hook of your application server), so a prefork master
+process never pings the server by itself.
+
+Clients are fork safe. A client which is used in a forked process (e.g. a
+worker of a preloaded gunicorn or uwsgi application) notices the new
+process id and creates its own ``MongoClient`` instead of sharing the
+sockets of its parent, see :py:attr:`Client.generation`.
+
+``read_preference`` sets the default read preference of the connection,
+for example ``"secondary_preferred"``. To use several connections see
+:py:mod:`djamo.connections`.
+"""
+import os
 import time
+import logging
+import threading
+import weakref
+
+import pymongo
+from pymongo import MongoClient, ReadPreference
+from pymongo.errors import ConnectionFailure, PyMongoError
+
+
+logger = logging.getLogger("djamo")
+
+#: Pool options of Djamo config and their PyMongo keyword and the
+#: multiplier of their values. Names of the PyMongo 2.x keywords differ.
+POOL_OPTIONS = {
+    "max_pool_size": ("maxPoolSize", 1),
+    "min_pool_size": ("minPoolSize", 1),
+    "max_idle_time": ("maxIdleTimeMS", 1000),
+    "wait_queue_timeout": ("waitQueueTimeoutMS", 1000),
+    "connect_timeout": ("connectTimeoutMS", 1000),
+    "socket_timeout": ("socketTimeoutMS", 1000),
+}
+
+#: Pool options that PyMongo 2.x does not support
+NEW_POOL_OPTIONS = ("min_pool_size", "max_idle_time")
+
+#: Lock of re-creating the clients after fork
+fork_lock = threading.Lock()
+
+
+def _reset_fork_lock():
+    global fork_lock
+    # Another thread of the parent might have held it while forking
+    fork_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_fork_lock)
+
+
+def legacy_pymongo():
+    """
+    True if the installed PyMongo is older than 3.0.
+    """
+    return pymongo.version_tuple[0] < 3
+
+
+def read_preference(name):
+    """
+    Return the PyMongo read preference of the given name like
+    ``secondary_preferred``.
+    """
+    try:
+        return getattr(ReadPreference, name.upper())
+    except AttributeError:
+        raise ValueError("'%s' is not a read preference" % name)
+
+
+def with_read_preference(collection, name):
+    """
+    Return the PyMongo ``collection`` with the given read preference.
+    """
+    preference = read_preference(name)
+
+    if legacy_pymongo():
+        collection.read_preference = preference
+        return collection
 
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure
+    return collection.with_options(read_preference=preference)
+
+
+class PoolStats(object):
+    """
+    Counters of the lifecycle of a client's connection pool.
+    """
+
+    def __init__(self):
+        self.created = time.time()
+        self.recycles = 0
+        self.pings = 0
+        self.ping_failures = 0
+        self.consecutive_failures = 0
+        self.last_ping = None
+        self.last_latency = None
+        self.last_error = None
+
+    def as_dict(self):
+        return {"created": self.created,
+                "recycles": self.recycles,
+                "pings": self.pings,
+                "ping_failures": self.ping_failures,
+                "consecutive_failures": self.consecutive_failures,
+                "last_ping": self.last_ping,
+                "last_latency": self.last_latency,
+                "last_error": self.last_error}
+
+
+class PoolMonitor(threading.Thread):
+    """
+    Background thread which pings the server and recycles the expired pool
+    of a client every ``interval`` seconds. It only keeps a weak reference
+    to the client and stops when the client goes away or closes.
+    """
+
+    def __init__(self, client, interval):
+        super(PoolMonitor, self).__init__(name="djamo-pool-monitor")
+        self.daemon = True
+        self.interval = interval
+
+        self._client = weakref.ref(client)
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            client = self._client()
+            if client is None:
+                return
+
+            try:
+                client.recycle_if_expired()
+                client.ping()
+            except Exception:
+                logger.exception("Djamo pool monitor failed")
+
+            # Do not keep the client alive while waiting
+            del client
 
 
 class Client(object):
     """
     Client class for Djamo that is responsible for connection management.
+
+    :param config: (optional) A dictionary of connection options just like
+                   ``settings.DJAMO``. If no config provided the options will
+                   be read from settings.
+
+    All the other keyword arguments will be passed to ``MongoClient``.
     """
 
     def __init__(self, config=None, **kwargs):
+        from_settings = not config
+
         if not config:
             from django.conf import settings
-            from django.core.signals import request_finished
 
             if hasattr(settings, "DJAMO"):
                 if isinstance(settings.DJAMO, dict):
                     # Retrieve Mongo server information form settings.py
                     config = settings.DJAMO
 
+                    if "connections" in config:
+                        config = config["connections"]["default"]
+
                 else:
                     raise TypeError("settings.DJAMO should be a dictionary")
             else:
                 raise AttributeError("settings does not have DJAMO attribute.")
 
-        host = config.get("host", "localhost")
-        port = int(config.get("port", 27017))
+        self.host = config.get("host", "localhost")
+        self.port = int(config.get("port", 27017))
         db_name = config.get("name", None)
-        max_pool_size = config.get("max_pool_size", 10)
         tz_awar = config.get("USE_TZ", False)
 
         # TODO: Use our Document implementation
         document_class = config.get("document_class",
                                     dict)
 
-        # Connection aging options
-        max_age = config.get("max_age",
-                             400)
+        # Connection aging options, the pool will be recycled after
+        # max_age seconds
+        self.max_age = config.get("max_age",
+                                  400)
         # Calculate the client expiration date
-        self.expire_time = time.time() + max_age
+        self.expire_time = time.time() + self.max_age
 
         if not db_name:
             raise TypeError("Djamo does not have 'name' key")
 
+        self.pool_options = self._pool_options(config)
+        self.stats = PoolStats()
+        self._lock = threading.Lock()
+
+        options = dict(self.pool_options)
+        options.update(kwargs)
+
+        # Connect on the first operation, not now
+        if legacy_pymongo():
+            options.setdefault("_connect", False)
+        else:
+            options.setdefault("connect", False)
+
+        options["document_class"] = document_class
+        options["tz_aware"] = tz_awar
+        self._options = options
+        self.db_name = db_name
+
+        #: Number of times that the ``MongoClient`` of this client is
+        #: re-created after a fork. Collections compare it with their own
+        #: to know when they should re-resolve their database.
+        self.generation = 0
+        self._pid = os.getpid()
+        self._connect()
+
+        # TODO: Implement database authentication
+
+        # The monitor starts by warm_up
+        self._monitor = None
+        self.heartbeat_interval = config.get("heartbeat_interval", 30)
+
+        if from_settings:
+            # Keep the pool between requests and only recycle it when it
+            # is too old, instead of tearing it down after each request
+            from django.core.signals import request_finished
+            request_finished.connect(self.recycle_if_expired, weak=True)
+
+    def _connect(self):
         try:
-            self._connection = MongoClient(host, port,
-                                           max_pool_size,
-                                           document_class,
-                                           tz_awar,
-                                           **kwargs)
+            self._connection = MongoClient(self.host, self.port,
+                                           **self._options)
         except ConnectionFailure:
             # TODO: Add some loggin here
             raise
 
         # Get the Database from connection object
-        self._db = getattr(self._connection, db_name)
-        self.db_name = db_name
+        self._db = getattr(self._connection, self.db_name)
 
-        # TODO: Implement database authentication
+    def check_fork(self):
+        """
+        Create a new ``MongoClient`` if the current process is a fork of
+        the process which created the current one. The sockets of the old
+        one belong to the parent process, so they will be left untouched.
+        Return True if the client changed.
+        """
+        pid = os.getpid()
+        if self._pid == pid:
+            return False
 
-        if not config:
-            # Terminate connection after request finish.
-            # This is the default action until Django 1.5
-            # Django 1.6 will use Aging by default
-            request_finished.connect(self.terminate_connection)
+        with fork_lock:
+            # Another thread might have re-created it while waiting
+            if self._pid == pid:
+                return False
+
+            # Locks and threads of the parent are not usable in the child
+            self._lock = threading.Lock()
+            if self._monitor is not None:
+                # Only the thread object is copied, the thread itself does
+                # not exist in the child
+                self._monitor.stop()
+                self._monitor = None
+            self.stats = PoolStats()
+
+            self._connect()
+            self.expire_time = time.time() + self.max_age
+            self.generation += 1
+            self._pid = pid
+
+        logger.debug("Djamo client re-created after fork (pid %s)", pid)
+        return True
+
+    def _pool_options(self, config):
+        """
+        Return the PyMongo keyword arguments of the pool options.
+        """
+        legacy = legacy_pymongo()
+        options = {}
+
+        for key, (name, multiplier) in POOL_OPTIONS.items():
+            value = config.get(key, 10 if key == "max_pool_size" else None)
+            if value is None:
+                continue
+
+            if legacy and key in NEW_POOL_OPTIONS:
+                logger.warning("'%s' needs PyMongo 3.0 or newer, ignored",
+                               key)
+                continue
+
+            if legacy and key == "max_pool_size":
+                options["max_pool_size"] = value
+            else:
+                options[name] = int(value * multiplier)
+
+        max_age = config.get("max_age", 400)
+        if not legacy and "maxIdleTimeMS" not in options and max_age > 0:
+            # The driver retires the old connections itself
+            options["maxIdleTimeMS"] = int(max_age * 1000)
+
+        preference = config.get("read_preference")
+        if preference:
+            if legacy:
+                options["read_preference"] = read_preference(preference)
+            else:
+                # PyMongo 3 takes the camel case mode name
+                read_preference(preference)
+                words = preference.lower().split("_")
+                options["readPreference"] = words[0] + "".join(
+                    i.title() for i in words[1:])
+
+        return options
 
     @property
     def is_expired(self):
@@ -92,11 +366,131 @@ class Client(object):
             return True
         return False
 
+    @property
+    def is_healthy(self):
+        """
+        True unless the last health check failed.
+        """
+        return self.stats.consecutive_failures == 0
+
+    def _start_monitor(self):
+        if self.heartbeat_interval and self._monitor is None:
+            with self._lock:
+                if self._monitor is None:
+                    self._monitor = PoolMonitor(self,
+                                                self.heartbeat_interval)
+                    self._monitor.start()
+
     def get_database(self):
+        self.check_fork()
         return self._db
 
+    def warm_up(self):
+        """
+        Open the connections of the pool and start the health checks, so
+        the first request does not pay for them. Return True if the server
+        responded. The health checks do not start without calling it, call
+        it after forking the worker processes.
+        """
+        self.check_fork()
+        self._start_monitor()
+        return self.ping()
+
     def drop_database(self):
+        self.check_fork()
         self._connection.drop_database(self.db_name)
 
+    def recycle(self):
+        """
+        Close all the connections of the pool if the driver supports it
+        (PyMongo 2.x) and reset the age of the pool. New connections will
+        be opened on demand, so the client, its databases and collections
+        remain usable.
+        """
+        if self.check_fork():
+            return
+
+        with self._lock:
+            if self._reset_pool():
+                self.stats.recycles += 1
+            self.expire_time = time.time() + self.max_age
+
+    def recycle_if_expired(self, *args, **kwargs):
+        """
+        Recycle the pool if it is older than ``max_age``. It accepts any
+        argument so it can be connected to signals.
+        """
+        if self.is_expired:
+            self.recycle()
+
+    def ping(self):
+        """
+        Check the health of the server, update the pool stats and return
+        True if the server responded.
+        """
+        self.check_fork()
+        stats = self.stats
+        start = time.time()
+
+        try:
+            self._connection.admin.command("ping")
+        except PyMongoError as e:
+            stats.pings += 1
+            stats.ping_failures += 1
+            stats.consecutive_failures += 1
+            stats.last_error = str(e)
+            logger.warning("MongoDB health check failed: %s", e)
+            return False
+
+        stats.pings += 1
+        stats.consecutive_failures = 0
+        stats.last_ping = time.time()
+        stats.last_latency = stats.last_ping - start
+        return True
+
+    def pool_stats(self):
+        """
+        Return the pool options and lifecycle counters as a dictionary.
+        """
+        result = self.stats.as_dict()
+        result.update({"host": self.host,
+                       "port": self.port,
+                       "age": time.time() - (self.expire_time - self.max_age),
+                       "healthy": self.is_healthy,
+                       "options": dict(self.pool_options)})
+        return result
+
+    def _reset_pool(self):
+        """
+        Retire all the connections of the pool and return True if it did.
+        Only PyMongo 2.x can do it in place using ``disconnect``. Newer
+        clients may have operations and cursors in flight in other
+        threads, so they are never closed here and the driver retires
+        their idle connections (see ``max_idle_time``). It should be called
+        with the lock.
+        """
+        connection = self._connection
+
+        # Look it up on the class, unknown attributes of MongoClient are
+        # databases
+        disconnect = getattr(type(connection), "disconnect", None)
+        if disconnect is None:
+            return False
+
+        disconnect(connection)
+        return True
+
+    def close(self):
+        """
+        Stop the health checks and close all the connections. The client
+        should not be used after closing it.
+        """
+        if self._monitor is not None:
+            self._monitor.stop()
+            self._monitor = None
+
+        self._connection.close()
+
     def terminate_connection(self, *args, **kwargs):
-        self._connection.disconnect()
+        with self._lock:
+            self._reset_pool()
@@ -0,0 +1,211 @@
+# -----------------------------------------------------------------------------
+#    Djamo - Yetanother Mongodb driver for Django
+#    Copyright (C) 2012-2013 Yellowen
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+# -----------------------------------------------------------------------------
+"""
+Djamo keeps the de-serialized values of expensive serializers (like
+:py:class:`~djamo.serializers.DjangoUser`) in a cache to prevent
+serializers from doing non efficient jobs like database queries over and
+over again.
+
+Each serializer class has its own namespace in the cache. The cache
+itself is stored in a backend. By default the ``local`` backend is used
+which keeps a bounded least recently used cache in the memory of each
+process, but you can share the cached values between processes using the
+``shared_memory`` or ``redis`` backends. You can configure the cache using
+the ``cache`` key of ``settings.DJAMO``::
+
+    DJAMO = {
+        "name": "my_database",
+        "cache": {
+            "backend": "local",
+            "max_entries": 1000,
+            "max_bytes": 1024 * 1024,
+            "ttl": 300,
+            "namespaces": {
+                "DjangoUser": {"max_entries": 5000, "ttl": 60},
+            },
+        },
+    }
+
+``backend`` can be one of ``local``, ``shared_memory``, ``redis``, a
+dotted path to a :py:class:`~djamo.cache.base.BaseBackend` subclass or a
+backend instance. The rest of the keys except ``codec`` are the backend
+options. ``codec`` can be ``pickle``, ``json`` or a dotted path to a codec
+class and it specifies how the out of process backends encode values::
+
+    DJAMO = {
+        "name": "my_database",
+        "cache": {
+            "backend": "redis",
+            "host": "127.0.0.1",
+            "port": 6379,
+            "ttl": 60,
+            "codec": "pickle",
+        },
+    }
+"""
+import threading
+
+from djamo.utils import six, import_object
+
+from .base import BaseBackend, CacheStats
+from ._codec import PickleCodec, JSONCodec, NULL
+from ._local import LRUCache, LocalBackend
+from ._shm import SharedMemoryBackend
+from ._socket import RedisBackend
+from .results import ResultCache
+
+
+BACKENDS = {
+    "local": LocalBackend,
+    "shared_memory": SharedMemoryBackend,
+    "redis": RedisBackend,
+}
+
+CODECS = {
+    "pickle": PickleCodec,
+    "json": JSONCodec,
+}
+
+
+class SerializerCache(object):
+    """
+    Cache of de-serialized values which has a separate namespace for each
+    serializer and stores them in a cache backend.
+
+    :param config: (optional) A dictionary of cache options just like the
+                   ``cache`` key of ``settings.DJAMO``. If no config provided
+                   the options will be read from settings on first use.
+    """
+
+    def __init__(self, config=None):
+        self._config = config
+        self._backend = None
+        self._lock = threading.Lock()
+
+    def configure(self, config):
+        """
+        Reset the cache using the given config.
+        """
+        with self._lock:
+            self._config = config or {}
+            self._backend = None
+
+    def _get_config(self):
+        if self._config is None:
+            self._config = self._load_settings()
+        return self._config
+
+    def _load_settings(self):
+        """
+        Read the cache options from ``settings.DJAMO``.
+        """
+        from django.conf import settings
+        from django.core.exceptions import ImproperlyConfigured
+
+        try:
+            djamo_settings = getattr(settings, "DJAMO", {})
+        except ImproperlyConfigured:
+            # Djamo is in use without Django settings (e.g tests)
+            return {}
+
+        if not isinstance(djamo_settings, dict):
+            return {}
+
+        config = djamo_settings.get("cache", {})
+        if not isinstance(config, dict):
+            raise TypeError("settings.DJAMO['cache'] should be a dictionary")
+
+        return config
+
+    def _get_codec(self, codec):
+        if isinstance(codec, six.string_types):
+            codec = CODECS.get(codec) or import_object(codec)
+
+        if isinstance(codec, type):
+            codec = codec()
+
+        return codec
+
+    def _create_backend(self):
+        options = dict(self._get_config())
+        backend = options.pop("backend", "local")
+
+        if isinstance(backend, BaseBackend):
+            return backend
+
+        if isinstance(backend, six.string_types):
+            backend = BACKENDS.get(backend) or import_object(backend)
+
+        if "codec" in options:
+            options["codec"] = self._get_codec(options["codec"])
+
+        return backend(**options)
+
+    @property
+    def backend(self):
+        """
+        The backend of the cache which will be created on first use.
+        """
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    self._backend = self._create_backend()
+
+        return self._backend
+
+    def get(self, namespace, key, default=None):
+        """
+        Get the cached value of ``key`` from ``namespace``. Pass a
+        ``default`` other than None to tell a cached None from a miss.
+        """
+        value = self.backend.get(namespace, key, default)
+
+        if value is NULL:
+            return None
+        return value
+
+    def set(self, namespace, key, value):
+        """
+        Put the ``value`` of ``key`` into ``namespace``.
+        """
+        if value is None:
+            value = NULL
+        return self.backend.set(namespace, key, value)
+
+    def delete(self, namespace, key):
+        """
+        Remove the ``key`` from ``namespace``.
+        """
+        return self.backend.delete(namespace, key)
+
+    def clear(self, namespace=None):
+        """
+        Clear the given namespace or all of the namespaces.
+        """
+        return self.backend.clear(namespace)
+
+    def stats(self):
+        """
+        Return the counters of each namespace as a dictionary.
+        """
+        return self.backend.stats()
+
+
+#: Global cache of de-serialized values
+serializer_cache = SerializerCache()
@@ -0,0 +1,76 @@
+# -----------------------------------------------------------------------------
+#    Djamo - Yetanother Mongodb driver for Django
+#    Copyright (C) 2012-2013 Yellowen
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+# -----------------------------------------------------------------------------
+"""
+Codecs are responsible for converting the cached values to bytes and vice
+versa for the backends which store values out of the current process.
+Codecs should keep :py:data:`NULL` as the same object.
+"""
+import json
+import pickle
+
+
+class Null(object):
+    """
+    Type of :py:data:`NULL`. Unpickling it returns the same object.
+    """
+
+    def __reduce__(self):
+        return "NULL"
+
+    def __repr__(self):
+        return "NULL"
+
+
+#: Stored in place of None, so the values which de-serialize to None (e.g
+#: deleted users of ``DjangoUser(missing="null")``) are cached too
+NULL = Null()
+
+
+class PickleCodec(object):
+    """
+    Codec which uses pickle to encode values. It can encode almost any
+    python object including Django model instances.
+    """
+
+    def __init__(self, protocol=pickle.HIGHEST_PROTOCOL):
+        self.protocol = protocol
+
+    def dumps(self, value):
+        return pickle.dumps(value, self.protocol)
+
+    def loads(self, data):
+        return pickle.loads(data)
+
+
+class JSONCodec(object):
+    """
+    Codec which uses json to encode values. It only supports json
+    compatible values but it is safe to share between untrusted processes.
+    """
+
+    def dumps(self, value):
+        if value is NULL:
+            # No json document is empty
+            return b""
+        return json.dumps(value).encode("utf-8")
+
+    def loads(self, data):
+        if not data:
+            return NULL
+        return json.loads(data.decode("utf-8"))
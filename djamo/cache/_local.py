@@ -0,0 +1,265 @@
+# -----------------------------------------------------------------------------
+#    Djamo - Yetanother Mongodb driver for Django
+#    Copyright (C) 2012-2013 Yellowen
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+# -----------------------------------------------------------------------------
+import sys
+import time
+import threading
+from collections import OrderedDict
+
+from .base import BaseBackend, CacheStats
+
+
+_missing = object()
+
+
+def default_sizeof(key, value):
+    """
+    Estimate the memory usage of a cache entry in bytes. This is a shallow
+    estimation and does not follow the references of the given objects.
+    """
+    return sys.getsizeof(key) + sys.getsizeof(value)
+
+
+class LRUCache(object):
+    """
+    A thread safe, least recently used cache which is limited by the
+    number of its entries and (optionally) the estimated size of its entries.
+
+    :param max_entries: (optional) Maximum number of entries, ``None`` means
+                        no limit.
+
+    :param max_bytes: (optional) Maximum estimated size of all the entries in
+                      bytes, ``None`` means no limit.
+
+    :param ttl: (optional) Number of seconds that each entry is valid, after
+                that the entry will be expired. ``None`` means no expiration.
+
+    :param sizeof: (optional) A callable that estimate the size of an entry
+                   using its key and value.
+
+    :param timer: (optional) A callable which returns the current time in
+                  seconds.
+    """
+
+    def __init__(self, max_entries=1000, max_bytes=None, ttl=None,
+                 sizeof=default_sizeof, timer=time.time):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.stats = CacheStats()
+
+        self._sizeof = sizeof
+        self._timer = timer
+        self._lock = threading.Lock()
+
+        # key -> (value, size, expire_time)
+        self._data = OrderedDict()
+        self._bytes = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return self.get(key, _missing) is not _missing
+
+    @property
+    def size(self):
+        """
+        Estimated size of the current entries in bytes.
+        """
+        return self._bytes
+
+    def get(self, key, default=None):
+        """
+        Return the value of the given key or ``default`` if key is not in
+        the cache or it is expired.
+        """
+        with self._lock:
+            try:
+                value, size, expire_time = self._data.pop(key)
+            except (KeyError, TypeError):
+                # TypeError: unhashable keys can not be cached at all
+                self.stats.misses += 1
+                return default
+
+            if expire_time is not None and expire_time <= self._timer():
+                self._bytes -= size
+                self.stats.expirations += 1
+                self.stats.misses += 1
+                return default
+
+            # Put the key back at the end as the most recently used one
+            self._data[key] = (value, size, expire_time)
+            self.stats.hits += 1
+            return value
+
+    def set(self, key, value):
+        """
+        Put the value of the given key into cache and evict the least
+        recently used entries if the limits exceeded.
+        """
+        size = self._sizeof(key, value) if self.max_bytes else 0
+        if self.max_bytes and size > self.max_bytes:
+            # The entry will never fit in the cache
+            return False
+
+        expire_time = None
+        if self.ttl is not None:
+            expire_time = self._timer() + self.ttl
+
+        with self._lock:
+            try:
+                old = self._data.pop(key, None)
+            except TypeError:
+                return False
+
+            if old is not None:
+                self._bytes -= old[1]
+
+            self._data[key] = (value, size, expire_time)
+            self._bytes += size
+            self._evict()
+
+        return True
+
+    def delete(self, key):
+        """
+        Remove the given key from cache.
+        """
+        with self._lock:
+            try:
+                old = self._data.pop(key, None)
+            except TypeError:
+                return False
+
+            if old is None:
+                return False
+
+            self._bytes -= old[1]
+            return True
+
+    def clear(self):
+        """
+        Remove all the entries of the cache.
+        """
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def _evict(self):
+        """
+        Evict the least recently used entries until the cache fit in its
+        limits. Caller should hold the lock.
+        """
+        while self._data and (
+                (self.max_entries is not None and
+                 len(self._data) > self.max_entries) or
+                (self.max_bytes is not None and
+                 self._bytes > self.max_bytes)):
+
+            key, (value, size, expire_time) = self._data.popitem(last=False)
+            self._bytes -= size
+            self.stats.evictions += 1
+
+
+class LocalBackend(BaseBackend):
+    """
+    Cache backend which keeps the values in the memory of the current
+    process. Each namespace is a :py:class:`LRUCache`.
+
+    :param max_entries: (optional) Maximum number of entries of each
+                        namespace.
+
+    :param max_bytes: (optional) Maximum estimated size of each namespace in
+                      bytes.
+
+    :param ttl: (optional) Number of seconds that each entry is valid.
+
+    :param namespaces: (optional) A dictionary of namespace names to a
+                       dictionary of options which overrides the global
+                       options for that namespace.
+    """
+
+    def __init__(self, max_entries=1000, max_bytes=None,
+                 ttl=None, namespaces=None, **kwargs):
+        super(LocalBackend, self).__init__(ttl=ttl, **kwargs)
+
+        self._options = {"max_entries": max_entries,
+                         "max_bytes": max_bytes,
+                         "ttl": ttl}
+        self._namespace_options = namespaces or {}
+        self._namespaces = {}
+        self._lock = threading.Lock()
+
+        # Counters never get evicted or expired, (namespace, key) -> value
+        self._counters = {}
+
+    def namespace(self, name):
+        """
+        Return the cache of given namespace and create it if it does not
+        exists.
+        """
+        try:
+            return self._namespaces[name]
+        except KeyError:
+            pass
+
+        options = dict(self._options)
+        options.update(self._namespace_options.get(name, {}))
+
+        with self._lock:
+            if name not in self._namespaces:
+                cache = LRUCache(**options)
+                self._stats[name] = cache.stats
+                self._namespaces[name] = cache
+
+            return self._namespaces[name]
+
+    def get(self, namespace, key, default=None):
+        return self.namespace(namespace).get(key, default)
+
+    def set(self, namespace, key, value):
+        return self.namespace(namespace).set(key, value)
+
+    def delete(self, namespace, key):
+        return self.namespace(namespace).delete(key)
+
+    def clear(self, namespace=None):
+        if namespace is not None:
+            return self.namespace(namespace).clear()
+
+        for cache in list(self._namespaces.values()):
+            cache.clear()
+
+    def counter(self, namespace, key):
+        return self._counters.get((namespace, key))
+
+    def incr(self, namespace, key):
+        with self._lock:
+            value = self._counters.get((namespace, key), 0) + 1
+            self._counters[(namespace, key)] = value
+            return value
+
+    def stats(self):
+        result = {}
+        for name, cache in list(self._namespaces.items()):
+            result[name] = cache.stats.as_dict()
+            result[name]["entries"] = len(cache)
+            result[name]["bytes"] = cache.size
+
+        return result
@@ -0,0 +1,301 @@
+# -----------------------------------------------------------------------------
+#    Djamo - Yetanother Mongodb driver for Django
+#    Copyright (C) 2012-2013 Yellowen
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+# -----------------------------------------------------------------------------
+import os
+import mmap
+import time
+import zlib
+import fcntl
+import struct
+import hashlib
+import tempfile
+import threading
+from contextlib import contextmanager
+
+from .base import BaseBackend
+from ._codec import PickleCodec
+
+
+# Header of the file: (magic, slots, slot size, codec id)
+FILE_HEADER = struct.Struct("!8sIII")
+MAGIC = b"djamoshm"
+
+# Header of each slot:
+# (key digest, namespace id, write time, expire time, data length)
+HEADER = struct.Struct("!20sIddI")
+EMPTY_DIGEST = b"\0" * 20
+
+
+def default_path(name="cache"):
+    """
+    Return the default path of the shared memory file of the cache with
+    the given name.
+    """
+    filename = "djamo-%s" % name
+    if os.path.isdir("/dev/shm"):
+        return os.path.join("/dev/shm", filename)
+
+    return os.path.join(tempfile.gettempdir(), filename)
+
+
+class SharedMemoryBackend(BaseBackend):
+    """
+    Cache backend which stores the encoded values in a memory mapped file
+    that can be shared between all the processes of a machine (e.g all the
+    workers of a gunicorn server).
+
+    The file is a fixed size hash table of ``slots`` slots. Each key can be
+    stored in one of its two candidate slots based on its hash and a new key
+    will evict the oldest key of those slots if both of them are in use. So
+    the memory usage of this backend is always ``slots * slot_size`` bytes.
+
+    .. Note:: All the processes should use the same ``path``, ``slots``,
+              ``slot_size`` and ``codec``. The file remembers them and
+              opening it with other ones raises a ``ValueError``.
+
+    :param path: (optional) Path of the shared file. default is
+                 ``/dev/shm/djamo-<name>``
+
+    :param name: (optional) Name of the cache which makes its default
+                 path, e.g ``cache`` for the serializers cache and
+                 ``results`` for the result caches.
+
+    :param slots: (optional) Number of the slots.
+
+    :param slot_size: (optional) Size of each slot in bytes. Values bigger
+                      than slot_size (minus a small header) will not be
+                      cached.
+
+    :param ttl: (optional) Number of seconds that each entry is valid.
+
+    :param codec: (optional) Codec to encode the values, default:
+                  :py:class:`~djamo.cache.PickleCodec`
+
+    :param timer: (optional) A callable which returns the current time in
+                  seconds.
+    """
+
+    def __init__(self, path=None, slots=4096, slot_size=4096, ttl=None,
+                 codec=None, timer=time.time, name="cache"):
+
+        super(SharedMemoryBackend, self).__init__(ttl=ttl,
+                                                  codec=codec or PickleCodec())
+
+        if slot_size <= HEADER.size:
+            raise ValueError("'slot_size' should be bigger than %s" %
+                             HEADER.size)
+
+        self.path = path or default_path(name)
+        self.slots = slots
+        self.slot_size = slot_size
+
+        self._timer = timer
+        # fcntl locks are per process so we need a lock for threads too
+        self._lock = threading.Lock()
+        self._open()
+
+    def _codec_id(self):
+        codec = self.codec.__class__
+        name = "%s.%s" % (codec.__module__, codec.__name__)
+        return zlib.crc32(name.encode("utf-8")) & 0xffffffff
+
+    def _open(self):
+        size = FILE_HEADER.size + self.slots * self.slot_size
+        header = FILE_HEADER.pack(MAGIC, self.slots, self.slot_size,
+                                  self._codec_id())
+
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+
+        fcntl.lockf(self._fd, fcntl.LOCK_EX)
+        try:
+            os.lseek(self._fd, 0, os.SEEK_SET)
+            current = os.read(self._fd, FILE_HEADER.size)
+
+            if not current.strip(b"\0"):
+                # A new file
+                os.ftruncate(self._fd, size)
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                os.write(self._fd, header)
+                current = header
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN)
+
+        if current != header:
+            os.close(self._fd)
+            raise ValueError("'%s' is not a cache file of the same slots, "
+                             "slot_size and codec" % self.path)
+
+        self._mmap = mmap.mmap(self._fd, size)
+
+    def close(self):
+        """
+        Unmap and close the shared file.
+        """
+        self._mmap.close()
+        os.close(self._fd)
+
+    @contextmanager
+    def _locked(self, offsets=(0,), length=0, exclusive=False):
+        """
+        Lock the given ranges of the shared file. Zero length means the
+        whole file.
+        """
+        mode = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+
+        with self._lock:
+            for offset in offsets:
+                fcntl.lockf(self._fd, mode, length, offset)
+            try:
+                yield
+            finally:
+                for offset in offsets:
+                    fcntl.lockf(self._fd, fcntl.LOCK_UN, length, offset)
+
+    def _locate(self, namespace, key):
+        """
+        Return a tuple like (digest, offsets) for the given key which
+        offsets are the sorted offsets of its candidate slots.
+        """
+        full_key = self.make_key(namespace, key)
+        digest = hashlib.sha1(full_key.encode("utf-8")).digest()
+
+        first, second = struct.unpack("!QQ", digest[:16])
+        offsets = set([FILE_HEADER.size + (i % self.slots) * self.slot_size
+                       for i in (first, second)])
+
+        return digest, sorted(offsets)
+
+    def _namespace_id(self, namespace):
+        return zlib.crc32(namespace.encode("utf-8")) & 0xffffffff
+
+    def get(self, namespace, key, default=None):
+        stats = self.stats_for(namespace)
+
+        try:
+            digest, offsets = self._locate(namespace, key)
+        except TypeError:
+            stats.misses += 1
+            return default
+
+        data = None
+        with self._locked(offsets, self.slot_size):
+            for offset in offsets:
+                slot_digest, _, _, expire_time, length = \
+                    HEADER.unpack_from(self._mmap, offset)
+
+                if slot_digest != digest:
+                    continue
+
+                if expire_time and expire_time <= self._timer():
+                    stats.expirations += 1
+                    break
+
+                start = offset + HEADER.size
+                data = self._mmap[start:start + length]
+                break
+
+        if data is None:
+            stats.misses += 1
+            return default
+
+        try:
+            value = self.codec.loads(data)
+        except Exception:
+            stats.errors += 1
+            stats.misses += 1
+            return default
+
+        stats.hits += 1
+        return value
+
+    def set(self, namespace, key, value):
+        stats = self.stats_for(namespace)
+
+        try:
+            digest, offsets = self._locate(namespace, key)
+        except TypeError:
+            return False
+
+        data = self.codec.dumps(value)
+        if len(data) > self.slot_size - HEADER.size:
+            return False
+
+        now = self._timer()
+        expire_time = now + self.ttl if self.ttl else 0.0
+
+        with self._locked(offsets, self.slot_size, exclusive=True):
+            candidates = []
+            for offset in offsets:
+                slot_digest, _, write_time, slot_expire, _ = \
+                    HEADER.unpack_from(self._mmap, offset)
+
+                if slot_digest == digest:
+                    # Replace the old value of the same key
+                    priority = -2
+                elif slot_digest == EMPTY_DIGEST or \
+                     (slot_expire and slot_expire <= now):
+                    priority = -1
+                else:
+                    priority = write_time
+
+                candidates.append((priority, offset))
+
+            priority, offset = min(candidates)
+            if priority >= 0:
+                # Both slots are in use by other live keys
+                stats.evictions += 1
+
+            HEADER.pack_into(self._mmap, offset, digest,
+                             self._namespace_id(namespace),
+                             now, expire_time, len(data))
+
+            start = offset + HEADER.size
+            self._mmap[start:start + len(data)] = data
+
+        return True
+
+    def delete(self, namespace, key):
+        try:
+            digest, offsets = self._locate(namespace, key)
+        except TypeError:
+            return False
+
+        with self._locked(offsets, self.slot_size, exclusive=True):
+            for offset in offsets:
+                if HEADER.unpack_from(self._mmap, offset)[0] == digest:
+                    HEADER.pack_into(self._mmap, offset, EMPTY_DIGEST,
+                                     0, 0.0, 0.0, 0)
+                    return True
+
+        return False
+
+    def clear(self, namespace=None):
+        namespace_id = None
+        if namespace is not None:
+            namespace_id = self._namespace_id(namespace)
+
+        with self._locked(exclusive=True):
+            for offset in range(FILE_HEADER.size,
+                                FILE_HEADER.size +
+                                self.slots * self.slot_size,
+                                self.slot_size):
+
+                slot_namespace = HEADER.unpack_from(self._mmap, offset)[1]
+                if namespace_id is None or slot_namespace == namespace_id:
+                    HEADER.pack_into(self._mmap, offset, EMPTY_DIGEST,
+                                     0, 0.0, 0.0, 0)
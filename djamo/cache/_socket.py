@@ -0,0 +1,293 @@
+# -----------------------------------------------------------------------------
+#    Djamo - Yetanother Mongodb driver for Django
+#    Copyright (C) 2012-2013 Yellowen
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+# -----------------------------------------------------------------------------
+import os
+import socket
+import logging
+import threading
+
+from .base import BaseBackend
+from ._codec import PickleCodec
+
+
+logger = logging.getLogger("djamo")
+
+
+class ResponseError(Exception):
+    """
+    This exception will raise if the cache server replied with an error.
+    """
+    pass
+
+
+class Connection(object):
+    """
+    A single socket connection to a server which speaks the Redis
+    serialization protocol (RESP).
+    """
+
+    def __init__(self, host, port, timeout=None):
+        self.pid = os.getpid()
+
+        self._sock = socket.create_connection((host, port), timeout)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._file = self._sock.makefile("rb")
+
+    def close(self):
+        try:
+            self._file.close()
+            self._sock.close()
+        except socket.error:
+            pass
+
+    def execute(self, *args):
+        """
+        Send a command to server and return its reply.
+        """
+        self._sock.sendall(self.pack(args))
+        return self.read_reply()
+
+    def pack(self, args):
+        parts = [b"*" + str(len(args)).encode("ascii") + b"\r\n"]
+
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode("utf-8")
+
+            parts.append(b"$" + str(len(arg)).encode("ascii") + b"\r\n")
+            parts.append(arg)
+            parts.append(b"\r\n")
+
+        return b"".join(parts)
+
+    def read_reply(self):
+        line = self._file.readline()
+        if not line:
+            raise socket.error("Connection closed by server")
+
+        kind, rest = line[:1], line[1:-2]
+
+        if kind == b"+":
+            return rest
+
+        elif kind == b"-":
+            raise ResponseError(rest.decode("utf-8"))
+
+        elif kind == b":":
+            return int(rest)
+
+        elif kind == b"$":
+            length = int(rest)
+            if length == -1:
+                return None
+            return self._file.read(length + 2)[:-2]
+
+        elif kind == b"*":
+            length = int(rest)
+            if length == -1:
+                return None
+            return [self.read_reply() for i in range(length)]
+
+        raise ResponseError("Unknown reply type '%r'" % kind)
+
+
+class RedisBackend(BaseBackend):
+    """
+    Cache backend which stores the encoded values in a Redis (or any other
+    server which speaks the Redis protocol) server, so all the processes
+    of all the machines can share the cached values.
+
+    Each thread uses its own connection and connections will re-create
+    after a fork. Any network error would be a cache miss, so the cache
+    server going down never breaks the application.
+
+    :param host: (optional) Host of the server.
+
+    :param port: (optional) Port of the server.
+
+    :param db: (optional) Database number of the server.
+
+    :param password: (optional) Password of the server.
+
+    :param timeout: (optional) Socket timeout in seconds.
+
+    :param prefix: (optional) A prefix for all the keys.
+
+    :param ttl: (optional) Number of seconds that each entry is valid.
+
+    :param codec: (optional) Codec to encode the values, default:
+                  :py:class:`~djamo.cache.PickleCodec`
+    """
+
+    def __init__(self, host="localhost", port=6379, db=0, password=None,
+                 timeout=1.0, prefix="djamo:", ttl=None, codec=None):
+
+        super(RedisBackend, self).__init__(ttl=ttl,
+                                           codec=codec or PickleCodec())
+
+        self.host = host
+        self.port = int(port)
+        self.db = db
+        self.password = password
+        self.timeout = timeout
+        self.prefix = prefix
+
+        self._local = threading.local()
+
+    def _connect(self):
+        connection = Connection(self.host, self.port, self.timeout)
+
+        if self.password:
+            connection.execute("AUTH", self.password)
+
+        if self.db:
+            connection.execute("SELECT", self.db)
+
+        return connection
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+
+        if connection is None or connection.pid != os.getpid():
+            # Never use a connection of the parent process
+            connection = self._connect()
+            self._local.connection = connection
+
+        return connection
+
+    def _reset(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+        self._local.connection = None
+
+    def execute(self, *args):
+        """
+        Execute a command on the server and reconnect once if the
+        connection was broken.
+        """
+        try:
+            return self._connection().execute(*args)
+
+        except socket.error:
+            self._reset()
+            return self._connection().execute(*args)
+
+    def make_key(self, namespace, key):
+        return self.prefix + super(RedisBackend, self).make_key(namespace,
+                                                                key)
+
+    def get(self, namespace, key, default=None):
+        stats = self.stats_for(namespace)
+
+        try:
+            data = self.execute("GET", self.make_key(namespace, key))
+        except TypeError:
+            stats.misses += 1
+            return default
+        except (socket.error, ResponseError):
+            stats.errors += 1
+            stats.misses += 1
+            return default
+
+        if data is None:
+            stats.misses += 1
+            return default
+
+        try:
+            value = self.codec.loads(data)
+        except Exception:
+            stats.errors += 1
+            stats.misses += 1
+            return default
+
+        stats.hits += 1
+        return value
+
+    def set(self, namespace, key, value):
+        try:
+            args = ["SET", self.make_key(namespace, key),
+                    self.codec.dumps(value)]
+        except TypeError:
+            return False
+
+        if self.ttl:
+            args.extend(["EX", int(self.ttl)])
+
+        try:
+            self.execute(*args)
+        except (socket.error, ResponseError):
+            self.stats_for(namespace).errors += 1
+            return False
+
+        return True
+
+    def delete(self, namespace, key):
+        try:
+            return bool(self.execute("DEL", self.make_key(namespace, key)))
+        except TypeError:
+            return False
+        except (socket.error, ResponseError):
+            self.stats_for(namespace).errors += 1
+            return False
+
+    def counter(self, namespace, key):
+        try:
+            value = self.execute("GET", self.make_key(namespace, key))
+        except (socket.error, ResponseError):
+            self.stats_for(namespace).errors += 1
+            return None
+
+        if value is None:
+            return None
+
+        return int(value)
+
+    def incr(self, namespace, key):
+        """
+        Increase the counter atomically on the server, counters never
+        expire.
+        """
+        try:
+            return self.execute("INCR", self.make_key(namespace, key))
+        except (socket.error, ResponseError):
+            self.stats_for(namespace).errors += 1
+            return None
+
+    def clear(self, namespace=None):
+        if namespace is None:
+            pattern = self.prefix + "*"
+        else:
+            pattern = "%s%s:*" % (self.prefix, namespace)
+
+        cursor = b"0"
+        try:
+            while True:
+                cursor, keys = self.execute("SCAN", cursor, "MATCH",
+                                            pattern, "COUNT", 1000)
+                if keys:
+                    self.execute("DEL", *keys)
+
+                if cursor in (b"0", 0):
+                    break
+
+        except (socket.error, ResponseError):
+            if namespace is not None:
+                self.stats_for(namespace).errors += 1
+            logger.warning("Can't clear the cache keys like %r", pattern,
+                           exc_info=True)
@@ -0,0 +1,137 @@
+# -----------------------------------------------------------------------------
+#    Djamo - Yetanother Mongodb driver for Django
+#    Copyright (C) 2012-2013 Yellowen
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+# -----------------------------------------------------------------------------
+"""
+All the cache backends should be a subclass of the **BaseBackend** class.
+"""
+import time
+
+
+class CacheStats(object):
+    """
+    Counters of a cache namespace.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.errors = 0
+
+    def as_dict(self):
+        return {"hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "errors": self.errors}
+
+
+class BaseBackend(object):
+    """
+    Base class for all the cache backends. A cache backend stores the
+    de-serialized values of each serializer in a separate namespace.
+
+    :param ttl: (optional) Number of seconds that each entry is valid,
+                ``None`` means no expiration.
+
+    :param codec: (optional) A codec object which is responsible for
+                  converting values to bytes and vice versa. Only backends
+                  which store values out of the current process use it.
+    """
+
+    def __init__(self, ttl=None, codec=None):
+        self.ttl = ttl
+        self.codec = codec
+        self._stats = {}
+
+    def stats_for(self, namespace):
+        """
+        Return the :py:class:`CacheStats` of the given namespace.
+        """
+        try:
+            return self._stats[namespace]
+        except KeyError:
+            return self._stats.setdefault(namespace, CacheStats())
+
+    def make_key(self, namespace, key):
+        """
+        Create a string key for ``key`` in the ``namespace``. Raise a
+        ``TypeError`` for keys that can not be cached (unhashable keys).
+        """
+        hash(key)
+        return "%s:%r" % (namespace, key)
+
+    def get(self, namespace, key, default=None):
+        """
+        Get the cached value of ``key`` from ``namespace``.
+        """
+        raise NotImplementedError()
+
+    def set(self, namespace, key, value):
+        """
+        Put the ``value`` of ``key`` into ``namespace``. Return ``False``
+        if the value did not stored.
+        """
+        raise NotImplementedError()
+
+    def delete(self, namespace, key):
+        """
+        Remove the ``key`` from ``namespace``.
+        """
+        raise NotImplementedError()
+
+    def clear(self, namespace=None):
+        """
+        Clear the given namespace or all of the namespaces.
+        """
+        raise NotImplementedError()
+
+    def counter(self, namespace, key):
+        """
+        Return the current value of the counter ``key`` of ``namespace`` or
+        ``None`` if there is no such counter.
+        """
+        return self.get(namespace, key)
+
+    def incr(self, namespace, key):
+        """
+        Increase the counter ``key`` of ``namespace`` and return its new
+        value. Backends which may lose a counter start it from the current
+        time in milliseconds, so a re-created counter never goes back to an
+        old value.
+
+        .. NOTE: This implementation is not atomic, subclasses should
+                 override it if they can.
+        """
+        value = self.counter(namespace, key)
+
+        if value is None:
+            value = int(time.time() * 1000)
+        else:
+            value += 1
+
+        self.set(namespace, key, value)
+        return value
+
+    def stats(self):
+        """
+        Return the counters of each namespace as a dictionary.
+        """
+        return dict((name, stats.as_dict())
+                    for name, stats in list(self._stats.items()))
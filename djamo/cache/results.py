@@ -0,0 +1,160 @@
+# -----------------------------------------------------------------------------
+#    Djamo - Yetanother Mongodb driver for Django
+#    Copyright (C) 2012-2013 Yellowen
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+# -----------------------------------------------------------------------------
+"""
+A read-through cache of query results which is configured per collection
+using the ``result_cache`` option of its ``Meta``::
+
+    class Countries(Collection):
+        document = Country
+
+        class Meta:
+            result_cache = {
+                "ttl": 300,
+                "max_entries": 200,
+                "max_results": 500,
+            }
+
+The options are the same as the options of the serializers cache (see
+:py:mod:`djamo.cache`) plus:
+
+``max_results``
+    Queries with more results than this are never cached (default 1000).
+
+``versions``
+    Cache options of a separate backend for the version counters.
+
+Shared memory backends of result caches use ``/dev/shm/djamo-results`` (and
+``/dev/shm/djamo-versions`` for the counters) by default, so they never
+share a file with the serializers cache.
+
+Each collection has a version counter which is a part of the keys of its
+cached results. Any write through the collection increases the counter, so
+the old results will never be read again and will be evicted over time. By
+default the counters live in the same backend of the results, but you can
+keep the results in the memory of each process and share the counters
+between processes to invalidate the results of all of them::
+
+    result_cache = {
+        "ttl": 60,
+        "versions": {"backend": "redis", "host": "127.0.0.1"},
+    }
+"""
+import json
+import hashlib
+
+from ._codec import PickleCodec
+from ._local import LocalBackend
+from ._shm import SharedMemoryBackend
+
+
+VERSION_KEY = "__version__"
+
+
+def _named(config, name):
+    """
+    Give the shared memory backend of ``config`` its own default file.
+    """
+    backend = config.get("backend")
+    if backend == "shared_memory" or backend is SharedMemoryBackend:
+        config = dict(config)
+        config.setdefault("name", name)
+
+    return config
+
+
+class ResultCache(object):
+    """
+    Cache of the raw results of the queries of a collection.
+
+    :param config: A dictionary of cache options.
+    """
+
+    def __init__(self, config):
+        # Avoid a circular import, SerializerCache lives in the package
+        from . import SerializerCache
+
+        config = dict(config)
+        versions = config.pop("versions", None)
+
+        self.max_results = config.pop("max_results", 1000)
+        self.cache = SerializerCache(_named(config, "results"))
+
+        if versions is None:
+            self.versions = self.cache
+        else:
+            self.versions = SerializerCache(_named(versions, "versions"))
+
+        # Local values are pickled, so the cached results are never shared
+        # with the documents and their size is known
+        self.codec = PickleCodec()
+
+    def version(self, namespace):
+        """
+        Return the current version of ``namespace``.
+        """
+        backend = self.versions.backend
+        version = backend.counter(namespace, VERSION_KEY)
+
+        if version is None:
+            version = backend.incr(namespace, VERSION_KEY)
+
+        return version
+
+    def invalidate(self, namespace):
+        """
+        Invalidate all the cached results of ``namespace``.
+        """
+        self.versions.backend.incr(namespace, VERSION_KEY)
+
+    def make_key(self, namespace, query):
+        """
+        Return the cache key of the given query, that is a dictionary of
+        query arguments, in the current version of ``namespace``. Return
+        None if the version is not available.
+        """
+        version = self.version(namespace)
+        if version is None:
+            return None
+
+        data = json.dumps(query, sort_keys=True, default=repr)
+        digest = hashlib.sha1(data.encode("utf-8")).hexdigest()
+        return "%s:%s" % (version, digest)
+
+    def _is_local(self):
+        return isinstance(self.cache.backend, LocalBackend)
+
+    def get(self, namespace, key):
+        value = self.cache.get(namespace, key)
+
+        if value is not None and self._is_local():
+            value = self.codec.loads(value)
+
+        return value
+
+    def set(self, namespace, key, value):
+        if self._is_local():
+            value = self.codec.dumps(value)
+
+        return self.cache.set(namespace, key, value)
+
+    def clear(self, namespace=None):
+        return self.cache.clear(namespace)
+
+    def stats(self):
+        return self.cache.stats()
@@ -17,12 +17,24 @@
 #    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 # -----------------------------------------------------------------------------
 import sys
+import time
 
 from pymongo.collection import Collection as MongoCollection
 
+from djamo.advisor import recorder
+from djamo.base import with_read_preference
+from djamo.cache import ResultCache
+from djamo.cursor import Cursor
 from djamo.document import Document
+from djamo.identity import identity_map
+from djamo.instrumentation import instrumentation, affected_documents
 from djamo.options import Options
-from djamo.utils import six
+from djamo.query import QueryCompiler
+from djamo.utils import six, chunks, BackgroundCall
+
+from .parallel import prepare_documents
+from .registry import registry
+from .results import BatchResult
 
 
 class CollectionMeta(type):
@@ -61,9 +73,24 @@ class CollectionMeta(type):
         if "document" in attrs:
             kwargs["document_name"] = attrs["document"].__name__
 
-        setattr(new_class, "_meta", Options(meta, **kwargs))
+        options = Options(meta, **kwargs)
+        setattr(new_class, "_meta", options)
+
+        result_cache = None
+        if options.result_cache:
+            result_cache = ResultCache(options.result_cache)
+
+        setattr(new_class, "result_cache", result_cache)
         return new_class
 
+    @property
+    def objects(cls):
+        """
+        The shared instance of the collection in the current process, see
+        :py:mod:`djamo.collections.registry`.
+        """
+        return registry.get(cls)
+
 
 class BaseCollection (six.with_metaclass(CollectionMeta, MongoCollection)):
     """
@@ -79,12 +106,23 @@ class BaseCollection (six.with_metaclass(CollectionMeta, MongoCollection)):
     #: value current collection class name will use in lower case
     name = None
 
-    #: Index list for current collection, each element will be a index
-    #: dictionary according to mongodb standards. Each element should
-    #: be a list with index dictionary as its first element and index
-    #: options as its second.
+    #: List of :py:class:`~djamo.index.Index` instances of this collection.
+    #: They will be created by :py:func:`~djamo.index.sync_indexes` (or
+    #: ``syncindexes`` command), not by creating the collection.
     indexes = []
 
+    #: Compiler which compiles the query shapes of this collection to
+    #: reusable plans, see :py:mod:`djamo.query`
+    query_compiler = QueryCompiler()
+
+    #: Number of results which :py:meth:`find` fetches and de-serializes
+    #: at once.
+    cursor_batch_size = 100
+
+    #: Cache of the query results which is created using the
+    #: ``result_cache`` option of ``Meta``, see :py:mod:`djamo.cache.results`
+    result_cache = None
+
     def __init__(self, create=False, client=None, *args, **kwargs):
         """
         Initilize the collection instance.
@@ -93,32 +131,66 @@ class BaseCollection (six.with_metaclass(CollectionMeta, MongoCollection)):
                                    without options being set
         :param client: (optional): If client provided, **Djamo** will use it,
                                    instead of its own (mostly for debugging)
+
+        Without a client the connections of writes and reads will be chosen
+        by :py:mod:`djamo.connections`.
         """
+        read_client = client
+
         if not client:
-            from djamo.db import client
-            self._client = client
-        else:
-            self._client = client
+            from djamo.connections import connections
+
+            cls = self.__class__
+            client = connections[connections.route(cls, "write")]
+            read_client = connections[connections.route(cls, "read")]
+
+        self._client = client
+        self._read_client = read_client
         self.name = self.name or self.__class__.__name__.lower()
 
+        self._collection_args = (args, kwargs)
+        self.resolve_database(create)
+
+    def resolve_database(self, create=False):
+        """
+        Get the database (and the collection of reads) from the clients
+        again. It happens automatically before each operation when a client
+        is re-created, for example in a forked worker process, see
+        :py:meth:`djamo.base.Client.check_fork`.
+        """
+        args, kwargs = self._collection_args
+        client, read_client = self._client, self._read_client
+
         # Get the database instance from client
-        self.db = self._client.get_database()
+        self.db = client.get_database()
 
         super(BaseCollection, self).__init__(self.db, self.name, create,
-                                         *args, **kwargs)
+                                             *args, **kwargs)
 
-        if self.indexes:
-            # Create indexes
-            from djamo import Index
+        # A separate PyMongo collection for reads if they go to another
+        # connection or they have their own read preference
+        self._reader = None
+        if read_client is not client or self._meta.read_preference:
+            self._reader = MongoCollection(read_client.get_database(),
+                                           self.name)
 
-            def wrap(index):
-                if isinstance(index, Index):
-                    return index.ensure(self)
+            if self._meta.read_preference:
+                self._reader = with_read_preference(
+                    self._reader, self._meta.read_preference)
 
-                raise TypeError("'indexes' should be a list of 'Index' \
-                instances.")
+        self._generations = (client.generation, read_client.generation)
 
-            [wrap(i) for i in self.indexes]
+    def _check_client(self):
+        """
+        Re-resolve the database if one of the clients is re-created after a
+        fork.
+        """
+        client, read_client = self._client, self._read_client
+        client.check_fork()
+        read_client.check_fork()
+
+        if self._generations != (client.generation, read_client.generation):
+            self.resolve_database()
 
     def _get_document(self):
         """
@@ -156,88 +228,48 @@ class BaseCollection (six.with_metaclass(CollectionMeta, MongoCollection)):
             raise TypeError("'doc_or_docs' should be dict or a list of dict \
             like object")
 
-    def _prepare_data(self, doc_or_docs):
+    def _prepare_document(self, doc):
         """
-        validate doc_or_docs and create a dictionary data.
+        validate doc and return its serialized data.
         """
+        document = self.validate_document(doc)
 
-        def to_data(document):
-            # Return the serialized value of the document
-            if isinstance(document, Document):
-                document.save()
-                return document.serialize()
-            else:
-                return document
+        # Return the serialized value of the document
+        document.save()
+        return document.serialize()
 
+    def _prepare_data(self, doc_or_docs):
+        """
+        validate doc_or_docs and create a dictionary data.
+        """
         docs = doc_or_docs
 
         if isinstance(docs, (list, tuple)):
             # If docs were a list or tuple of documents, validate each one
             # and get a document instance with their data for each document
-            docs = [self.validate_document(i) for i in docs]
+            return [self._prepare_document(i) for i in docs]
 
         elif isinstance(docs, dict):
-            docs = [self.validate_document(docs)]
+            return [self._prepare_document(docs)]
 
         else:
             raise TypeError("'doc_or_docs' should be dict or a list of dict \
             like object")
 
-        data = [to_data(i) for i in docs]
-
-        return data
-
-    def _prepare_query(self, query_item, query_type="query"):
-        """
-        Prepare each query_item (key, value) for the specific query type.
+    def prepare_query(self, query, query_type="query"):
         """
-        key, value = query_item
-
-        # If key was a mongo operator
-        if key.startswith("$"):
-
-            # Q: Why did you use a nested class for operators ?
-            # A: Because pymongo collection class override the __getattr__
-            #    and we don't want to mess with that
-
-            # Get the mongo operator handler
-            query_handler = getattr(self.Operators, "%s_%s" % (key[1:],
-                                                               query_type),
-                                    self.__query__)
+        Prepare query (spec). Values of the fields which have a serializer
+        in the collection document will be serialized. The structure of the
+        query compiles to a plan once and will be reused for other queries
+        with the same structure, see :py:mod:`djamo.query`.
 
-            document = self._get_document()
-            return query_handler(key, value, document)
+        :param query: The query (spec) or the update document to prepare.
 
-        else:
-            if isinstance(value, dict):
-                # If current value was a dictionary
-                if any([i.startswith("$") for i in value.keys()]):
-                    # If one of the current value (which is a dictionary) was
-                    # a mongo query command and starts with $ then prepare
-                    # each key/value of it again
-                    return {key: self.prepare_query(value)}
-
-            document = self._get_document()
-
-            # Spliting using "." to allow document serializer find possible
-            # key and its attribute to handle the mongodb dot notation
-            return document.serialize_item((key.split(".")[0], value),
-                                           key.split("."))
-
-    def prepare_query(self, query, query_type="query"):
-        """
-        Prepare query (spec).
+        :param query_type: (optional) ``query`` for specs and ``update`` for
+                           update documents.
         """
         if query is not None:
-
-            # Serialize each item in query by serialize_item classmethod
-            # of document.
-            result = {}
-            result_list = [self._prepare_query(
-                i, query_type) for i in query.items()]
-
-            [result.update(i) for i in result_list]
-            return result
+            return self.query_compiler.prepare(self, query, query_type)
 
         return None
 
@@ -248,7 +280,10 @@ class BaseCollection (six.with_metaclass(CollectionMeta, MongoCollection)):
         manipulate is False and the documents passed as doc_or_docs do not
         include an ``_id`` field.
 
-        :param doc_or_docs: a document or list of documents to be inserted.
+        :param doc_or_docs: a document or list of documents to be inserted. Any
+                            other iterable (e.g a generator) will be inserted
+                            in batches using
+                            :py:meth:`~djamo.collections.BaseCollection.insert_stream`
 
         :param manipulate: (optional): If True manipulate the documents before
                            inserting.
@@ -287,9 +322,182 @@ class BaseCollection (six.with_metaclass(CollectionMeta, MongoCollection)):
                       files before returning. When used with j the server
                       awaits the next group commit before returning.
 
+        :param processes: (optional): Number of worker processes (or a
+                          ``multiprocessing.Pool``) to validate and serialize
+                          the documents in parallel. Input order will be
+                          preserved.
+
+        :param batch_size: (optional): Number of documents of each batch
+                           when inserting an iterable or using processes.
+
+        """
+        self._check_client()
+        processes = kwargs.pop("processes", None)
+        batch_size = kwargs.pop("batch_size", 1000)
+
+        # Documents are always sent as a list, a single one gets its _id
+        single = isinstance(doc_or_docs, dict)
+
+        if processes or (not isinstance(doc_or_docs, (list, tuple, dict))
+                         and hasattr(doc_or_docs, "__iter__")):
+
+            if isinstance(doc_or_docs, dict):
+                doc_or_docs = [doc_or_docs]
+
+            # Stream any other iterable (e.g generators) in batches
+            ids = []
+            for result in self.insert_stream(doc_or_docs, batch_size,
+                                             True, processes,
+                                             *args, **kwargs):
+                if not result.ok:
+                    raise result.error
+                ids.extend(result.ids)
+
+            return ids[0] if single else ids
+
+        operation = instrumentation.operation(self, "insert")
+        try:
+            data = self._prepare_data(doc_or_docs)
+        except Exception as e:
+            if operation is not None:
+                operation.finish("prepare", error=e)
+            raise
+
+        insert = super(BaseCollection, self).insert
+
+        if operation is None:
+            result = insert(data, *args, **kwargs)
+        else:
+            operation.mark("prepare")
+            result = operation.call(insert, data, *args, **kwargs)
+            operation.measure(data)
+            operation.finish(documents=len(data))
+
+        if not isinstance(result, list):
+            result = [result]
+
+        self._changed(result)
+        return result[0] if single else result
+
+    def _prepare_batches(self, documents, batch_size, processes=None):
+        """
+        Yield a tuple like (count, data, error) for each batch of documents.
+        """
+        if processes:
+            for batch in prepare_documents(self._get_document(), documents,
+                                           processes, batch_size):
+                yield batch
+            return
+
+        for batch in chunks(documents, batch_size):
+            try:
+                yield (len(batch),
+                       [self._prepare_document(i) for i in batch], None)
+            except Exception as e:
+                yield (len(batch), None, e)
+
+    def insert_stream(self, documents, batch_size=1000, stop_on_error=True,
+                      processes=None, *args, **kwargs):
         """
-        data = self._prepare_data(doc_or_docs)
-        return super(BaseCollection, self).insert(data, *args, **kwargs)
+        Insert the documents of any iterable (lists, generators, cursors,
+        ...) in batches and yield a
+        :py:class:`~djamo.collections.results.BatchResult` for each batch.
+        Each batch will be validated and serialized while the previous
+        batch is sending to the database, and at most two batches are in
+        memory at any time, so the memory usage is bounded by the batch size
+        instead of the size of the data::
+
+            def students():
+                for line in open("students.csv"):
+                    yield Student({"name": line.strip()})
+
+            for result in collection.insert_stream(students(), 5000):
+                if not result.ok:
+                    print("batch %s failed: %s" % (result.index,
+                                                   result.error))
+
+        .. Note:: This method is a generator so nothing will be inserted
+                  until you iterate over its results.
+
+        :param documents: An iterable of documents or dictionaries.
+
+        :param batch_size: (optional) Number of documents of each batch.
+
+        :param stop_on_error: (optional) If ``True`` (default) stop after
+                              the first failed batch, otherwise continue
+                              with the next batches.
+
+        :param processes: (optional) Number of worker processes (or a
+                          ``multiprocessing.Pool``) to validate and serialize
+                          the batches in parallel. See
+                          :py:func:`~djamo.collections.parallel.prepare_documents`
+
+        All the other arguments are the same as
+        :py:meth:`~djamo.collections.BaseCollection.insert` arguments.
+        """
+        pending = None
+        batches = self._prepare_batches(documents, batch_size, processes)
+
+        try:
+            for index, (count, data, error) in enumerate(batches):
+                if pending is not None:
+                    # Wait for the previous batch to send
+                    result = self._batch_result(*pending)
+                    pending = None
+                    yield result
+
+                    if not result.ok and stop_on_error:
+                        return
+
+                if error is not None:
+                    yield BatchResult(index, count, error=error)
+
+                    if stop_on_error:
+                        return
+                    continue
+
+                # Send the current batch in background and prepare the
+                # next one. Only the PyMongo call runs in the other thread,
+                # the identity map and listeners belong to this thread.
+                self._check_client()
+                pending = (index, count, data,
+                           BackgroundCall(super(BaseCollection, self).insert,
+                                          data, *args, **kwargs))
+
+            if pending is not None:
+                result = self._batch_result(*pending)
+                pending = None
+                yield result
+
+        finally:
+            batches.close()
+
+            if pending is not None:
+                # Consumer stopped the iteration, let the last batch finish
+                self._batch_result(*pending)
+
+    def _batch_result(self, index, count, data, call):
+        """
+        Wait for the insert of a batch and return its result.
+        """
+        operation = instrumentation.operation(self, "insert")
+
+        try:
+            ids = call.result()
+        except Exception as e:
+            if operation is not None:
+                operation.add("network", call.elapsed)
+                operation.finish(error=e)
+            return BatchResult(index, count, error=e)
+
+        self._changed(ids)
+
+        if operation is not None:
+            operation.add("network", call.elapsed)
+            operation.measure(data)
+            operation.finish(documents=len(data))
+
+        return BatchResult(index, count, ids=ids)
 
     def save(self, to_save, *args, **kwargs):
         """
@@ -328,8 +536,121 @@ class BaseCollection (six.with_metaclass(CollectionMeta, MongoCollection)):
                       files before returning. When used with j the server
                       awaits the next group commit before returning.
 
+        Documents which are loaded from database or saved before, and
+        partial documents (loaded using ``fields``) will be saved using
+        ``$set`` and ``$unset`` of their changes, see
+        :py:meth:`~djamo.document.Document.serialize_update`.
         """
-        return super(BaseCollection, self).save(to_save, *args, **kwargs)
+        self._check_client()
+
+        if isinstance(to_save, Document):
+            if to_save.is_partial or (to_save.changed_keys is not None and
+                                      "_id" in to_save):
+                return self._save_changes(to_save, *args, **kwargs)
+
+        operation = instrumentation.operation(self, "save")
+        save = super(BaseCollection, self).save
+
+        # The same serialized data of insert and save_many
+        try:
+            data = self._prepare_document(to_save)
+        except Exception as e:
+            if operation is not None:
+                operation.finish("prepare", error=e)
+            raise
+
+        if operation is None:
+            _id = save(data, *args, **kwargs)
+        else:
+            operation.mark("prepare")
+            _id = operation.call(save, data, *args, **kwargs)
+            operation.measure([data])
+            operation.finish(documents=1)
+
+        self._changed([_id])
+
+        if _id is not None:
+            dict.setdefault(to_save, "_id", _id)
+
+        if isinstance(to_save, Document):
+            to_save.mark_clean()
+
+        return _id
+
+    def _save_changes(self, doc, manipulate=True, safe=None,
+                      check_keys=True, **kwargs):
+        _id = dict.get(doc, "_id")
+        if _id is None:
+            raise ValueError("A partial document without '_id' can not "
+                             "be saved")
+
+        operation = instrumentation.operation(self, "save")
+        update = doc.serialize_update()
+        if update:
+            call = super(BaseCollection, self).update
+            spec = {"_id": _id}
+
+            if operation is None:
+                call(spec, update, safe=safe, check_keys=check_keys,
+                     **kwargs)
+            else:
+                operation.spec = spec
+                operation.mark("prepare")
+                result = operation.call(call, spec, update, safe=safe,
+                                        check_keys=check_keys, **kwargs)
+                operation.measure([update])
+                operation.finish(documents=affected_documents(result))
+
+            self._changed([_id])
+
+        doc.mark_clean()
+        return _id
+
+    def save_many(self, docs, processes=None, batch_size=1000, *args,
+                  **kwargs):
+        """
+        Validate, serialize and save each document of ``docs`` and return
+        the list of their ``_id`` values in the same order of ``docs``.
+
+        :param docs: An iterable of documents or dictionaries.
+
+        :param processes: (optional): Number of worker processes (or a
+                          ``multiprocessing.Pool``) to validate and serialize
+                          the documents in parallel.
+
+        :param batch_size: (optional): Number of documents that will be
+                           prepared at once.
+
+        All the other arguments are the same as
+        :py:meth:`~djamo.collections.BaseCollection.save` arguments.
+        """
+        self._check_client()
+        operation = instrumentation.operation(self, "save_many")
+        save = super(BaseCollection, self).save
+
+        ids = []
+        for count, data, error in self._prepare_batches(docs, batch_size,
+                                                        processes):
+            if error is not None:
+                if operation is not None:
+                    operation.finish("prepare", len(ids), error=error)
+                raise error
+
+            if operation is None:
+                ids.extend([save(i, *args, **kwargs) for i in data])
+                continue
+
+            operation.mark("prepare")
+            operation.measure(data)
+            ids.extend([operation.call(save, i, *args, **kwargs)
+                        for i in data])
+
+        self._changed(ids)
+
+        if operation is not None:
+            operation.finish(documents=len(ids))
+
+        return ids
 
     def update(self, spec, doc, *args, **kwargs):
         """
@@ -340,7 +661,8 @@ class BaseCollection (six.with_metaclass(CollectionMeta, MongoCollection)):
 
         :param doc: A dict or SON instance specifying the document to be used
                     for the update or (in the case of an upsert) insert - see
-                    docs on MongoDB update modifiers
+                    docs on MongoDB update modifiers. A document which
+                    tracks its changes will only update its changed keys.
 
         :param upsert: (optional): perform an upsert if True
 
@@ -380,11 +702,49 @@ class BaseCollection (six.with_metaclass(CollectionMeta, MongoCollection)):
                       awaits the next group commit before returning.
 
         """
-        spec = self.prepare_query(spec)
-        doc = self.prepare_query(doc, "update")
+        self._check_client()
+        self._changed(self._target_ids(spec))
+
+        operation = instrumentation.operation(self, "update")
+
+        tracked = None
+        if isinstance(doc, Document) and doc.changed_keys is not None:
+            tracked = doc
+
+        try:
+            spec = self.prepare_query(spec)
+            if tracked is not None:
+                doc = tracked.serialize_update()
+            else:
+                doc = self.prepare_query(doc, "update")
+        except Exception as e:
+            if operation is not None:
+                operation.finish("prepare", error=e)
+            raise
 
-        return super(BaseCollection, self).update(spec, doc, *args,
-                                                  **kwargs)
+        if tracked is not None and not doc:
+            return None
+
+        start = time.time()
+        update = super(BaseCollection, self).update
+
+        if operation is None:
+            result = update(spec, doc, *args, **kwargs)
+        else:
+            operation.spec = spec
+            operation.mark("prepare")
+            result = operation.call(update, spec, doc, *args, **kwargs)
+            operation.measure([doc])
+            operation.finish(documents=affected_documents(result))
+
+        # Keep the changes of failed updates for the next try
+        if tracked is not None:
+            tracked.mark_clean()
+
+        if recorder.enabled:
+            recorder.record(self, "update", spec,
+                            elapsed=time.time() - start)
+        return result
 
     def remove(self, spec_or_id=None, *args, **kwargs):
         """
@@ -430,7 +790,53 @@ class BaseCollection (six.with_metaclass(CollectionMeta, MongoCollection)):
                       before returning. When used with j the server awaits the
                       next group commit before returning.
         """
-        super(BaseCollection, self).remove(spec_or_id, *args, **kwargs)
+        self._check_client()
+        self._changed(self._target_ids(spec_or_id))
+
+        operation = instrumentation.operation(self, "remove")
+        remove = super(BaseCollection, self).remove
+        start = time.time()
+
+        if operation is None:
+            remove(spec_or_id, *args, **kwargs)
+        else:
+            operation.spec = spec_or_id
+            result = operation.call(remove, spec_or_id, *args, **kwargs)
+            operation.finish(documents=affected_documents(result))
+
+        if recorder.enabled:
+            if spec_or_id is not None and not isinstance(spec_or_id, dict):
+                spec_or_id = {"_id": spec_or_id}
+            recorder.record(self, "remove", spec_or_id,
+                            elapsed=time.time() - start)
+
+    def _changed(self, ids=None):
+        """
+        Invalidate the loaded documents and cached results after a write.
+        ``ids`` is the list of changed ``_id`` values or None if any
+        document might be changed.
+        """
+        identity_map.discard(self, ids)
+
+        if self.result_cache is not None:
+            self.result_cache.invalidate(self.full_name)
+
+    def _target_ids(self, spec_or_id):
+        """
+        Return the list of ``_id`` values that the given spec is limited to
+        or None if it may match any document.
+        """
+        if spec_or_id is None:
+            return None
+
+        if not isinstance(spec_or_id, dict):
+            return [spec_or_id]
+
+        _id = spec_or_id.get("_id")
+        if _id is None or isinstance(_id, dict):
+            return None
+
+        return [_id]
 
     def find(self, spec=None, fields=None, *args, **kwargs):
         """
@@ -490,7 +896,11 @@ class BaseCollection (six.with_metaclass(CollectionMeta, MongoCollection)):
                          when performing the query.
 
         :param as_class: (optional) class to use for documents in the query
-                         result (default is document_class)
+                         result. If given, the PyMongo cursor will be returned
+                         instead of a :py:class:`~djamo.cursor.Cursor`.
+
+        :param batch_size: (optional) number of results to fetch and
+                           de-serialize at once (default is 100).
 
         :param slave_okay: (optional) if True, allows this query to be run
                            against a replica secondary.
@@ -527,16 +937,49 @@ class BaseCollection (six.with_metaclass(CollectionMeta, MongoCollection)):
         """
         # TODO: use a validate parameter in this method to pass to deserialize
         # method of document
-        document = self._get_document()
+        batch_size = kwargs.pop("batch_size", self.cursor_batch_size)
+        operation = instrumentation.operation(self, "find")
 
         if spec:
             spec = self.prepare_query(spec)
 
-        result = super(BaseCollection, self).find(spec, fields,
-                                                  as_class=document,
-                                                  *args, **kwargs)
+        if operation is not None:
+            # Results are reported by the cursor as fetch operations
+            operation.spec = spec
+            operation.finish("prepare")
 
-        return result
+        if "as_class" in kwargs:
+            return self._find(spec, fields, *args, **kwargs)
+
+        # Results come as raw dictionaries and the cursor builds the
+        # documents in batches
+        query = None
+        if self.result_cache is not None and \
+           not kwargs.get("tailable", False):
+            query = {"spec": spec, "fields": fields, "args": args,
+                     "options": dict(kwargs), "modifiers": []}
+
+        result = self._find(spec, fields, as_class=dict, *args, **kwargs)
+        result.batch_size(batch_size)
+
+        cursor = Cursor(self, result, batch_size, self._meta.prefetch,
+                        fields, query)
+        cursor.spec = spec
+        if recorder.enabled:
+            cursor.record(spec, kwargs.get("sort"))
+
+        return cursor
+
+    def _find(self, *args, **kwargs):
+        """
+        Run a raw PyMongo find on the collection of reads.
+        """
+        self._check_client()
+
+        if self._reader is not None:
+            return self._reader.find(*args, **kwargs)
+
+        return super(BaseCollection, self).find(*args, **kwargs)
 
     def find_one(self, spec_or_id=None, *args, **kwargs):
         """
@@ -547,45 +990,80 @@ class BaseCollection (six.with_metaclass(CollectionMeta, MongoCollection)):
 
         :param spec_or_id: (optional) a dictionary specifying the query to be
                            performed OR any other type to be used as the value
-                           for a query for "_id".
-        """
-        result = self.find(spec_or_id, limit=-1, *args, **kwargs)
-        if result.count():
-            return result[0]
-        return None
+                           for a query for "_id". The "_id" value is used as
+                           is, without serializing it.
 
-    def __query__(self, key, value, document):
+        Lookups by ``_id`` (including ``{"_id": value}`` specs when ``_id``
+        is not a field with a serializer) return the loaded document of the
+        identity map if there is one, see :py:mod:`djamo.identity`.
         """
-        Default operator handler.
-        """
-        # TODO: can a operator have a dictionary value with another
-        #       operator as its key?
-        if isinstance(value, dict):
-            # If the operator value was a dictionary
-            result = {}
-            result_list = [self._prepare_query(i) for i in value.items()]
-            [result.update(i) for i in result_list]
-
-            return {key: result}
-
-        elif isinstance(value, (tuple, list)):
-            # If the operator value was a list or tuple
-
-            # TODO: Does operators get this complex ?
-            def wrap(x):
-
-                if isinstance(x, dict):
-                    return {key:
-                            [self._prepare_query(i) for i in value.items()]}
-
-                else:
-                    # If the list element was not a dict
-                    return document.serialize_item((key, x)).values()[0]
+        # A single batch with at most one document which closes the cursor
+        # on the server, there is no need to count the results first
+        kwargs["limit"] = -1
+        kwargs.pop("batch_size", None)
+
+        if isinstance(spec_or_id, dict) and list(spec_or_id) == ["_id"]:
+            _id = spec_or_id["_id"]
+            if _id is not None and not isinstance(_id, dict) and \
+               "_id" not in self._get_document()._fields:
+                # The same as a primary key lookup
+                spec_or_id = _id
+
+        if isinstance(spec_or_id, dict):
+            if spec_or_id:
+                spec_or_id = self.prepare_query(spec_or_id)
+
+        elif spec_or_id is not None:
+            # Primary key lookups skip the query preparation and use the
+            # loaded document of identity map if there is one
+            if not args and "fields" not in kwargs and \
+               "as_class" not in kwargs:
+                doc = identity_map.get(self, spec_or_id)
+                if doc is not None:
+                    return doc
+
+            spec_or_id = {"_id": spec_or_id}
+
+        raw = "as_class" in kwargs
+        kwargs.setdefault("as_class", dict)
+
+        operation = instrumentation.operation(self, "find_one")
+        if operation is not None:
+            operation.spec = spec_or_id
+            operation.mark("prepare")
+
+        start = time.time()
+        result = None
+        try:
+            for result in self._find(spec_or_id, *args, **kwargs):
+                break
+        except Exception as e:
+            if operation is not None:
+                operation.finish("network", error=e)
+            raise
+
+        if operation is not None:
+            operation.mark("network")
+
+        if recorder.enabled:
+            recorder.record(self, "find", spec_or_id, kwargs.get("sort"),
+                            time.time() - start)
+
+        if result is None or raw:
+            if operation is not None:
+                operation.measure([result] if result is not None else [])
+                operation.finish(documents=int(result is not None))
+            return result
 
-            return {key: [wrap(i) for i in value]}
+        fields = args[0] if args else kwargs.get("fields")
+        cursor = Cursor(self, None, prefetch=self._meta.prefetch,
+                        fields=fields)
+        doc = cursor.build([result])[0]
 
-        else:
-            return {key: value}
+        if operation is not None:
+            operation.measure([result])
+            operation.finish("deserialize", 1)
+        return doc
 
     class Operators:
         """
@@ -610,10 +1088,12 @@ class BaseCollection (six.with_metaclass(CollectionMeta, MongoCollection)):
                     # serialize the v (value of the bit operator) and replace
                     # the old value
                     bit_op[op] = document.serialize_item(
-                        (field, v), field.split(".")).values()[1]
+                        (field, v), field.split("."))[field]
 
             return {"$bit": value}
 
         def isolated_update(self, value, document, *args, **kwargs):
-            # TODO: deal with the isolated operator
-            pass
+            """
+            Handle the $isolated operator for document update.
+            """
+            return {"$isolated": value}
@@ -0,0 +1,309 @@
+# -----------------------------------------------------------------------------
+#    Djamo - Yetanother Mongodb driver for Django
+#    Copyright (C) 2012-2013 Yellowen
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+# -----------------------------------------------------------------------------
+"""
+Bulk operations queue many inserts, updates and removes and send them to
+the server in batches instead of a round trip for each of them::
+
+    bulk = students.bulk(ordered=False)
+    bulk.insert({"name": "Okarin"})
+    bulk.find({"name": "Kurisu"}).upsert().update_one({"$set": {"age": 18}})
+    bulk.find({"age": {"$lt": 10}}).remove()
+
+    result = bulk.execute()
+    print(result.n_inserted, result.n_upserted, result.errors)
+
+Each operation will be prepared just like the single operations of the
+collection, documents will be validated and serialized and specs and
+update documents will go through ``prepare_query``. Any error of this
+phase becomes the error of that operation.
+"""
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+from djamo.instrumentation import instrumentation
+
+from .results import BulkResult
+
+
+def _affected(details):
+    """
+    Return the number of the documents which the bulk operation inserted,
+    matched or removed.
+    """
+    return sum(details.get(i, 0) for i in ("nInserted", "nUpserted",
+                                           "nMatched", "nRemoved"))
+
+
+class BulkSelector(object):
+    """
+    The operations which work on the documents that matched to a spec. Use
+    :py:meth:`BulkOperation.find` to create one.
+    """
+
+    def __init__(self, bulk, spec, upsert=False):
+        self.bulk = bulk
+        self.spec = spec
+        self._upsert = upsert
+
+    def upsert(self):
+        """
+        Insert a new document if the spec did not match any document.
+        """
+        return self.__class__(self.bulk, self.spec, True)
+
+    def update(self, doc):
+        """
+        Update all the documents which matched to the spec.
+        """
+        self.bulk._add_update(self.spec, doc, True, self._upsert)
+
+    def update_one(self, doc):
+        """
+        Update the first document which matched to the spec.
+        """
+        self.bulk._add_update(self.spec, doc, False, self._upsert)
+
+    def replace_one(self, doc):
+        """
+        Replace the first document which matched to the spec with ``doc``.
+        """
+        self.bulk._add_replace(self.spec, doc, self._upsert)
+
+    def remove(self):
+        """
+        Remove all the documents which matched to the spec.
+        """
+        self.bulk._add_remove(self.spec, True)
+
+    def remove_one(self):
+        """
+        Remove the first document which matched to the spec.
+        """
+        self.bulk._add_remove(self.spec, False)
+
+
+class BulkOperation(object):
+    """
+    A queue of write operations on a collection.
+
+    :param collection: The Djamo collection.
+
+    :param ordered: (optional) If ``True`` the operations will run in the
+                    same order and the first error stops the rest of them.
+                    Otherwise the server may run them in any order and
+                    all of them will run.
+
+    :param batch_size: (optional) Number of operations to queue before
+                       sending them to the server, so the queue does not
+                       hold all the operations in memory.
+
+    :param write_concern: (optional) The write concern of the operations
+                          like ``{"w": 1}``.
+    """
+
+    def __init__(self, collection, ordered=True, batch_size=1000,
+                 write_concern=None):
+        self.collection = collection
+        self.ordered = ordered
+        self.batch_size = batch_size
+        self.write_concern = write_concern
+
+        self.result = BulkResult()
+
+        # Queued operations like (index, operation) which index is the
+        # position of the operation among all the added operations
+        self._operations = []
+        self._count = 0
+        self._stopped = False
+
+    def __len__(self):
+        """
+        Number of the added operations.
+        """
+        return self._count
+
+    def _add(self, prepare, *args):
+        index = self._count
+        self._count += 1
+
+        if self._stopped:
+            return
+
+        try:
+            operation = prepare(*args)
+        except Exception as e:
+            self.result.add_error(index, e)
+
+            if self.ordered:
+                # Operations before this one still run
+                self.flush()
+                self._stopped = True
+            return
+
+        self._operations.append((index, operation))
+
+        if len(self._operations) >= self.batch_size:
+            self.flush()
+
+    def insert(self, doc):
+        """
+        Insert the given document, or each document of a list of them as a
+        separate operation. Documents without an ``_id`` get a new one
+        right away, just like
+        :py:meth:`~djamo.collections.BaseCollection.save`.
+        """
+        if isinstance(doc, (list, tuple)):
+            for i in doc:
+                self._add(self._prepare_insert, i)
+        else:
+            self._add(self._prepare_insert, doc)
+
+    def find(self, spec):
+        """
+        Return a :py:class:`BulkSelector` of the documents which match the
+        ``spec``.
+        """
+        return BulkSelector(self, spec)
+
+    def _prepare_document(self, doc):
+        """
+        Return the serialized data of a single document.
+        """
+        if not isinstance(doc, dict):
+            raise TypeError("'doc' should be a dict like object")
+
+        return self.collection._prepare_document(doc)
+
+    def _prepare_insert(self, doc):
+        data = self._prepare_document(doc)
+
+        # The server never sees the caller's document, only its copy
+        if "_id" not in data:
+            data["_id"] = ObjectId()
+        dict.setdefault(doc, "_id", data["_id"])
+
+        return ("insert", data)
+
+    def _prepare_update(self, spec, doc, multi, upsert):
+        return ("update", self.collection.prepare_query(spec),
+                self.collection.prepare_query(doc, "update"), multi, upsert)
+
+    def _prepare_replace(self, spec, doc, upsert):
+        return ("replace", self.collection.prepare_query(spec),
+                self._prepare_document(doc), upsert)
+
+    def _prepare_remove(self, spec, multi):
+        return ("remove", self.collection.prepare_query(spec), multi)
+
+    def _add_update(self, spec, doc, multi, upsert):
+        self._add(self._prepare_update, spec, doc, multi, upsert)
+
+    def _add_replace(self, spec, doc, upsert):
+        self._add(self._prepare_replace, spec, doc, upsert)
+
+    def _add_remove(self, spec, multi):
+        self._add(self._prepare_remove, spec, multi)
+
+    def _builder(self, operations):
+        """
+        Create a PyMongo bulk operation of the given operations.
+        """
+        collection = self.collection
+        collection._check_client()
+
+        if self.ordered:
+            bulk = collection.initialize_ordered_bulk_op()
+        else:
+            bulk = collection.initialize_unordered_bulk_op()
+
+        for index, operation in operations:
+            kind = operation[0]
+
+            if kind == "insert":
+                bulk.insert(operation[1])
+
+            elif kind == "remove":
+                selector = bulk.find(operation[1])
+                if operation[2]:
+                    selector.remove()
+                else:
+                    selector.remove_one()
+
+            else:
+                selector = bulk.find(operation[1])
+                if operation[-1]:
+                    selector = selector.upsert()
+
+                if kind == "replace":
+                    selector.replace_one(operation[2])
+                elif operation[3]:
+                    selector.update(operation[2])
+                else:
+                    selector.update_one(operation[2])
+
+        return bulk
+
+    def flush(self):
+        """
+        Send the queued operations to the server.
+        """
+        operations = self._operations
+        if not operations or self._stopped:
+            return
+
+        self._operations = []
+        indexes = [index for index, operation in operations]
+
+        # Each flushed batch is a single ``bulk`` operation
+        operation = instrumentation.operation(self.collection, "bulk")
+        try:
+            bulk = self._builder(operations)
+        except Exception as e:
+            if operation is not None:
+                operation.finish("prepare", error=e)
+            raise
+
+        try:
+            if operation is None:
+                details = bulk.execute(self.write_concern)
+            else:
+                operation.mark("prepare")
+                operation.measure([i for index, queued in operations
+                                   for i in queued[1:]
+                                   if isinstance(i, dict)])
+                details = operation.call(bulk.execute, self.write_concern)
+                operation.finish(documents=_affected(details))
+        except BulkWriteError as e:
+            # Already emitted as a failed operation
+            details = e.details
+
+        self.result.add(details, indexes)
+        self.collection._changed()
+
+        if self.ordered and details.get("writeErrors"):
+            self._stopped = True
+
+    def execute(self):
+        """
+        Send all the remaining operations to the server and return the
+        :py:class:`~djamo.collections.results.BulkResult` of all the
+        operations.
+        """
+        self.flush()
+        return self.result
@@ -18,6 +18,7 @@
 # -----------------------------------------------------------------------------
 
 from .base import BaseCollection
+from .bulk import BulkOperation
 
 
 class Collection (BaseCollection):
@@ -36,3 +37,18 @@ class Collection (BaseCollection):
         kwargs["multi"] = True
 
         return self.update(spec, doc, *args, **kwargs)
+
+    def bulk(self, ordered=True, batch_size=1000, write_concern=None):
+        """
+        Return a new :py:class:`~djamo.collections.bulk.BulkOperation` to
+        queue many write operations and run them in batches.
+
+        :param ordered: (optional) If ``True`` the operations will run in
+                        order and stop on the first error.
+
+        :param batch_size: (optional) Number of operations of each batch.
+
+        :param write_concern: (optional) The write concern of the
+                              operations.
+        """
+        return BulkOperation(self, ordered, batch_size, write_concern)
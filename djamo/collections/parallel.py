@@ -0,0 +1,122 @@
+# -----------------------------------------------------------------------------
+#    Djamo - Yetanother Mongodb driver for Django
+#    Copyright (C) 2012-2013 Yellowen
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+# -----------------------------------------------------------------------------
+"""
+Validate and serialize documents across a pool of processes. This is useful
+for big imports where serializing documents on a single core is the
+bottleneck.
+"""
+from collections import deque
+from functools import partial
+from multiprocessing import Pool, cpu_count
+
+from djamo.utils import chunks
+
+
+def prepare_chunk(document, chunk):
+    """
+    Validate and serialize each data of the ``chunk`` as a ``document``
+    instance and return the list of serialized data. This function runs in
+    the worker processes.
+    """
+    result = []
+    for data in chunk:
+        doc = document(data)
+        doc.save()
+        result.append(doc.serialize())
+
+    return result
+
+
+def prepare_documents(document, docs, processes=None, chunk_size=1000,
+                      max_inflight=None):
+    """
+    Validate and serialize the given docs using a pool of processes and
+    yield a tuple like (count, data, error) for each chunk of ``docs`` in
+    the same order of ``docs``. ``data`` is the list of serialized data of
+    the chunk or ``None`` if preparing the chunk raised the ``error``.
+
+    Only a few chunks for each worker will be in flight at any time, so
+    ``docs`` can be a generator of any size.
+
+    Documents will be sent to the workers as dictionaries, so only the
+    data of each document will be available in the workers (and not the
+    instance attributes). Also the ``save`` method of each document runs in
+    a worker process.
+
+    :param document: The Document class of the data.
+
+    :param docs: An iterable of documents or dictionaries.
+
+    :param processes: (optional) Number of worker processes or an instance
+                      of ``multiprocessing.Pool`` to use. default is the
+                      number of CPUs.
+
+    :param chunk_size: (optional) Number of documents which will be sent to
+                       a worker at once.
+
+    :param max_inflight: (optional) Number of chunks which may be in flight
+                         at once. default is twice the number of workers of
+                         the pool.
+    """
+    if processes is None or isinstance(processes, int):
+        pool = Pool(processes)
+        workers = processes or cpu_count()
+        own_pool = True
+    else:
+        pool = processes
+        # The size of a given pool, which may be smaller than the CPUs
+        workers = getattr(pool, "_processes", None) or cpu_count()
+        own_pool = False
+
+    if max_inflight is None:
+        max_inflight = workers * 2
+
+    func = partial(prepare_chunk, document)
+    pending = deque()
+
+    def result(count, job):
+        if isinstance(job, Exception):
+            return (count, None, job)
+
+        try:
+            return (count, job.get(), None)
+        except Exception as e:
+            return (count, None, e)
+
+    try:
+        for chunk in chunks(docs, chunk_size):
+            if all(isinstance(i, dict) for i in chunk):
+                data = [i if type(i) is dict else dict(i) for i in chunk]
+                job = pool.apply_async(func, (data,))
+            else:
+                job = TypeError("'doc_or_docs' should be dict or a list of "
+                                "dict like object")
+
+            pending.append((len(chunk), job))
+
+            while len(pending) > max_inflight:
+                yield result(*pending.popleft())
+
+        while pending:
+            yield result(*pending.popleft())
+
+    finally:
+        if own_pool:
+            pool.terminate()
+            pool.join()
@@ -0,0 +1,86 @@
+# -----------------------------------------------------------------------------
+#    Djamo - Yetanother Mongodb driver for Django
+#    Copyright (C) 2012-2013 Yellowen
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+# -----------------------------------------------------------------------------
+"""
+Creating a collection resolves its clients and database, so creating one
+for each request is wasteful. The registry keeps a single instance of each
+collection class in each process which is available as the ``objects``
+attribute of the collection classes::
+
+    students = Students.objects.find({"name": "Okarin"})
+
+The instances will be created again in forked processes and after
+reconfiguring :py:mod:`djamo.connections`.
+"""
+import os
+import threading
+
+
+class CollectionRegistry(object):
+    """
+    A thread safe registry of the shared instances of the collection
+    classes.
+    """
+
+    def __init__(self):
+        self._instances = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def _check_fork(self):
+        pid = os.getpid()
+        if self._pid != pid:
+            # The lock might be held by a thread of the parent process
+            self._lock = threading.Lock()
+            self._instances = {}
+            self._pid = pid
+
+    def get(self, cls):
+        """
+        Return the shared instance of the given collection class and create
+        it on first use.
+        """
+        self._check_fork()
+
+        instance = self._instances.get(cls)
+        if instance is None:
+            with self._lock:
+                instance = self._instances.get(cls)
+                if instance is None:
+                    instance = cls()
+                    self._instances[cls] = instance
+
+        return instance
+
+    def discard(self, cls):
+        """
+        Forget the shared instance of the given collection class.
+        """
+        with self._lock:
+            self._instances.pop(cls, None)
+
+    def clear(self):
+        """
+        Forget all the shared instances.
+        """
+        with self._lock:
+            self._instances = {}
+
+
+#: The global registry which backs ``Collection.objects``
+registry = CollectionRegistry()
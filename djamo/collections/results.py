@@ -0,0 +1,117 @@
+# -----------------------------------------------------------------------------
+#    Djamo - Yetanother Mongodb driver for Django
+#    Copyright (C) 2012-2013 Yellowen
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+# -----------------------------------------------------------------------------
+"""
+Result objects of the collection operations which work on many documents.
+"""
+
+
+class BatchResult(object):
+    """
+    Result of inserting a batch of documents.
+
+    :param index: Index of the batch (starts from 0).
+
+    :param count: Number of the documents in the batch.
+
+    :param ids: List of the ``_id`` values of the inserted documents.
+
+    :param error: The exception that raised while preparing or inserting
+                  the batch or ``None``.
+    """
+
+    def __init__(self, index, count, ids=None, error=None):
+        self.index = index
+        self.count = count
+        self.ids = ids or []
+        self.error = error
+
+    @property
+    def ok(self):
+        """
+        ``True`` if the batch inserted without any error.
+        """
+        return self.error is None
+
+    def __repr__(self):
+        if self.ok:
+            return "<BatchResult %s: %s documents>" % (self.index, self.count)
+
+        return "<BatchResult %s: %s documents, error: %r>" % (
+            self.index, self.count, self.error)
+
+
+class BulkResult(object):
+    """
+    Aggregated result of all the batches of a bulk operation.
+
+    ``upserted`` is a list of (index, _id) tuples and ``errors`` is a list
+    of (index, error) tuples which ``index`` is the position of the
+    operation in the bulk operation and ``error`` is the exception of
+    preparing the operation or the write error document of the server.
+    """
+
+    def __init__(self):
+        self.n_inserted = 0
+        self.n_upserted = 0
+        self.n_matched = 0
+        self.n_modified = 0
+        self.n_removed = 0
+        self.upserted = []
+        self.errors = []
+        self.write_concern_errors = []
+
+    @property
+    def ok(self):
+        """
+        ``True`` if all the operations ran without any error.
+        """
+        return not self.errors and not self.write_concern_errors
+
+    def add_error(self, index, error):
+        self.errors.append((index, error))
+
+    def add(self, details, indexes):
+        """
+        Add the result of a batch which PyMongo returned as ``details``.
+        ``indexes`` maps the indexes of the batch to the indexes of the
+        bulk operation.
+        """
+        self.n_inserted += details.get("nInserted", 0)
+        self.n_upserted += details.get("nUpserted", 0)
+        self.n_matched += details.get("nMatched", 0)
+        self.n_modified += details.get("nModified", 0) or 0
+        self.n_removed += details.get("nRemoved", 0)
+
+        for upserted in details.get("upserted", []):
+            self.upserted.append((indexes[upserted["index"]],
+                                  upserted["_id"]))
+
+        for error in details.get("writeErrors", []):
+            self.errors.append((indexes[error["index"]], error))
+
+        self.write_concern_errors.extend(
+            details.get("writeConcernErrors", []))
+
+        self.errors.sort(key=lambda i: i[0])
+
+    def __repr__(self):
+        return ("<BulkResult inserted: %s, upserted: %s, matched: %s, "
+                "modified: %s, removed: %s, errors: %s>" % (
+                    self.n_inserted, self.n_upserted, self.n_matched,
+                    self.n_modified, self.n_removed, len(self.errors)))
@@ -0,0 +1,249 @@
+# -----------------------------------------------------------------------------
+#    Djamo - Yetanother Mongodb driver for Django
+#    Copyright (C) 2012-2013 Yellowen
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+# -----------------------------------------------------------------------------
+"""
+Djamo can work with several MongoDB connections. Describe each of them
+under the ``connections`` key of ``settings.DJAMO``, each one takes the
+same options of a single connection (see :py:mod:`djamo.base`)::
+
+    DJAMO = {
+        "connections": {
+            "default": {"name": "main"},
+            "hot": {"name": "main", "host": "hot.example.com"},
+            "archive": {"name": "archive", "host": "archive.example.com"},
+            "analytics": {"name": "main", "host": "main.example.com",
+                          "read_preference": "secondary_preferred"},
+        },
+        "router": "myproject.routers.AnalyticsRouter",
+    }
+
+The old style settings with a ``name`` key describe the ``default``
+connection. A collection uses the connection of the router, or the
+``connection`` and ``read_connection`` options of its ``Meta``, or the
+``default`` connection::
+
+    class Logs(Collection):
+        document = Log
+
+        class Meta:
+            connection = "archive"
+
+    class Orders(Collection):
+        document = Order
+
+        class Meta:
+            read_connection = "analytics"
+            read_preference = "secondary"
+
+A router is a callable (or a dotted path to one, or to a class of one)
+which takes the collection class and the kind of operation, ``"read"`` or
+``"write"``, and returns the name of a connection or ``None`` to leave the
+decision to the next step. The :py:class:`Router` class makes writing one
+easier::
+
+    class AnalyticsRouter(Router):
+
+        def read(self, collection):
+            if collection._meta.app_label == "reports":
+                return "analytics"
+"""
+import threading
+
+from djamo.utils import six, import_object
+
+from .base import Client
+
+
+DEFAULT_CONNECTION = "default"
+
+
+class Router(object):
+    """
+    Base class of routers which dispatches the calls to :py:meth:`read`
+    and :py:meth:`write` methods.
+    """
+
+    def __call__(self, collection, operation):
+        if operation == "read":
+            return self.read(collection)
+        return self.write(collection)
+
+    def read(self, collection):
+        """
+        Return the connection name of reading from the ``collection``
+        class or ``None``.
+        """
+        return None
+
+    def write(self, collection):
+        """
+        Return the connection name of writing to the ``collection`` class
+        or ``None``.
+        """
+        return None
+
+
+class ConnectionHandler(object):
+    """
+    A thread safe registry of the named connections which creates the
+    client of each connection on first use.
+
+    :param config: (optional) A dictionary like ``settings.DJAMO``. If no
+                   config provided it will be read from settings on first
+                   use.
+    """
+
+    def __init__(self, config=None):
+        self._config = config
+        self._connections = None
+        self._router = None
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def configure(self, config):
+        """
+        Reset the connections using the given config. Clients which are
+        already created remain open for their current users, but the shared
+        collection instances (``Collection.objects``) will be created again.
+        """
+        with self._lock:
+            self._config = config
+            self._connections = None
+            self._router = None
+            self._clients = {}
+
+        if self is connections:
+            # Shared collections might use the old clients
+            from djamo.collections.registry import registry
+            registry.clear()
+
+    def _load(self):
+        config = self._config
+        if config is None:
+            from django.conf import settings
+
+            config = getattr(settings, "DJAMO", None)
+            if config is None:
+                raise AttributeError("settings does not have DJAMO "
+                                     "attribute.")
+
+        if not isinstance(config, dict):
+            raise TypeError("settings.DJAMO should be a dictionary")
+
+        connections = config.get("connections")
+        if connections is None:
+            connections = {DEFAULT_CONNECTION: config}
+
+        router = config.get("router")
+        if isinstance(router, six.string_types):
+            router = import_object(router)
+        if isinstance(router, type):
+            router = router()
+
+        self._router = router
+        self._connections = connections
+
+    @property
+    def connections(self):
+        """
+        Dictionary of the config of each connection name.
+        """
+        if self._connections is None:
+            with self._lock:
+                if self._connections is None:
+                    self._load()
+
+        return self._connections
+
+    @property
+    def router(self):
+        self.connections
+        return self._router
+
+    def __contains__(self, name):
+        return name in self.connections
+
+    def __getitem__(self, name):
+        """
+        Return the client of the given connection name.
+        """
+        try:
+            return self._clients[name]
+        except KeyError:
+            pass
+
+        connections = self.connections
+
+        with self._lock:
+            if name not in self._clients:
+                if name not in connections:
+                    raise KeyError("Djamo connection '%s' does not "
+                                   "exist" % name)
+
+                self._clients[name] = self.create_client(connections[name])
+
+            return self._clients[name]
+
+    def create_client(self, config):
+        client = Client(config=config)
+
+        if self._config is None:
+            # Clients of the settings live as long as the process and
+            # recycle their pool between requests
+            from django.core.signals import request_finished
+            request_finished.connect(client.recycle_if_expired, weak=False)
+
+        return client
+
+    def all(self):
+        """
+        Return the list of the clients which are created so far.
+        """
+        return list(self._clients.values())
+
+    def warm_up(self, names=None):
+        """
+        Create the clients of the given connection names (or all of the
+        connections) and open their connections. Call it after forking the
+        worker processes, not in the master process.
+        """
+        if names is None:
+            names = list(self.connections)
+
+        return dict((name, self[name].warm_up()) for name in names)
+
+    def route(self, collection, operation):
+        """
+        Return the connection name of the given operation (``"read"`` or
+        ``"write"``) on the ``collection`` class.
+        """
+        router = self.router
+        if router is not None:
+            name = router(collection, operation)
+            if name:
+                return name
+
+        meta = collection._meta
+        if operation == "read" and meta.read_connection:
+            return meta.read_connection
+
+        return meta.connection or DEFAULT_CONNECTION
+
+
+#: The global connection handler of ``settings.DJAMO``
+connections = ConnectionHandler()
@@ -0,0 +1,387 @@
+# -----------------------------------------------------------------------------
+#    Djamo - Yetanother Mongodb driver for Django
+#    Copyright (C) 2012-2013 Yellowen
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+# -----------------------------------------------------------------------------
+"""
+**Djamo** wraps the PyMongo cursors to build the documents of the results.
+A :py:class:`Cursor` pulls the raw results from the server in batches and
+creates a document for each result only when you reach it. Serializers
+which support batch de-serialization (like
+:py:class:`~djamo.serializers.DjangoUser`) de-serialize all the values of a
+batch at once, for example using a single database query. Other fields
+can be de-serialized in batches using :py:meth:`Cursor.prefetch` or the
+``prefetch`` option of the collection's ``Meta``.
+
+If the collection has a result cache (see :py:mod:`djamo.cache.results`)
+the cursor reads its raw results from the cache, or puts them in the cache
+when it runs the query.
+"""
+import time
+from collections import deque
+from itertools import islice, chain
+
+from djamo.advisor import recorder
+from djamo.cache import serializer_cache
+from djamo.document import parse_projection
+from djamo.identity import identity_map
+from djamo.instrumentation import instrumentation
+
+
+_missing = object()
+
+
+class Cursor(object):
+    """
+    A cursor over the results of a query which yields documents of the
+    collection.
+
+    :param collection: The Djamo collection of the query.
+
+    :param cursor: The PyMongo cursor which returns raw dictionaries.
+
+    :param batch_size: (optional) Number of raw results to de-serialize at
+                       once.
+
+    :param prefetch: (optional) List of the fields to de-serialize in
+                     batches in addition to the fields that their
+                     serializer has ``batch_deserialize``.
+
+    :param fields: (optional) The fields argument of the query. Results of
+                   queries with it are partial documents, which never go to
+                   the identity map.
+
+    :param query: (optional) A dictionary of the arguments of the query
+                  which makes the key of its results in the collection's
+                  result cache. Without it results will not be cached.
+    """
+
+    def __init__(self, collection, cursor, batch_size=100, prefetch=None,
+                 fields=None, query=None):
+        self.collection = collection
+        self.document = collection._get_document()
+        self.fields = fields
+        self.query = query
+
+        #: The prepared spec of the query, only for reporting it
+        self.spec = None
+
+        self._projection = None
+        if fields is not None:
+            self._projection = parse_projection(fields)
+
+        # An iterator over the raw results, which is the PyMongo cursor
+        # itself unless the results come from the cache
+        self._results = None
+
+        self._cursor = cursor
+        self._batch_size = batch_size
+        self._buffer = deque()
+
+        # (spec, sort) of the query if it should be recorded, see
+        # djamo.advisor
+        self._recording = None
+
+        self._prefetch = [key for key, serializer in
+                          self.document._fields.items()
+                          if serializer.batch_deserialize]
+        self.prefetch(*(prefetch or []))
+
+    def prefetch(self, *keys):
+        """
+        De-serialize the given fields of each batch of results at once. It
+        only affects the batches which are not fetched yet.
+        """
+        fields = self.document._fields
+
+        for key in keys:
+            if key not in fields:
+                raise KeyError("'%s' is not a field of '%s'" % (
+                    key, self.document.__name__))
+
+            if key not in self._prefetch:
+                self._prefetch.append(key)
+
+        return self
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if not self._buffer:
+            self._fill()
+
+        if not self._buffer:
+            raise StopIteration
+
+        return self._buffer.popleft()
+
+    # Python 2
+    next = __next__
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self._copy(self._cursor[index],
+                              ("slice", index.start, index.stop))
+
+        return self.build([self._cursor[index]])[0]
+
+    def __getattr__(self, name):
+        # Other methods of the PyMongo cursor (count, explain, ...)
+        return getattr(self._cursor, name)
+
+    def _copy(self, cursor, modifier=None):
+        query = self.query
+        if query is not None:
+            query = dict(query)
+            query["modifiers"] = list(query["modifiers"])
+            if modifier is not None:
+                query["modifiers"].append(modifier)
+
+        copy = self.__class__(self.collection, cursor, self._batch_size,
+                              self._prefetch, self.fields, query)
+        copy._recording = self._recording
+        copy.spec = self.spec
+        return copy
+
+    def _modify(self, *modifier):
+        if self.query is not None:
+            self.query["modifiers"].append(modifier)
+
+    def _cache_key(self, *extra):
+        """
+        Return the namespace and key of the current query in the result
+        cache, or ``(None, None)`` if it should not be cached.
+        """
+        if self.query is None:
+            return None, None
+
+        cache = self.collection.result_cache
+        if cache is None:
+            return None, None
+
+        namespace = self.collection.full_name
+        key = cache.make_key(namespace, [self.query] + list(extra))
+        if key is None:
+            return None, None
+
+        return namespace, key
+
+    def _fetch(self):
+        """
+        Return an iterator over the raw results.
+        """
+        namespace, key = self._cache_key()
+        if key is None:
+            return self._cursor
+
+        cache = self.collection.result_cache
+
+        raw_docs = cache.get(namespace, key)
+        if raw_docs is not None:
+            return iter(raw_docs)
+
+        raw_docs = list(islice(self._cursor, cache.max_results + 1))
+        if len(raw_docs) > cache.max_results:
+            # Too many results to cache, go on with the cursor
+            return chain(raw_docs, self._cursor)
+
+        cache.set(namespace, key, raw_docs)
+        return iter(raw_docs)
+
+    def record(self, spec, sort=None):
+        """
+        Record the shape of the query and the latency of its first batch
+        in :py:data:`djamo.advisor.recorder` when the results are fetched.
+        """
+        self._recording = (spec, sort)
+        return self
+
+    def _fill(self):
+        operation = instrumentation.operation(self.collection, "fetch")
+        if operation is not None:
+            operation.spec = self.spec
+
+        start = time.time()
+
+        try:
+            if self._results is None:
+                self._results = self._fetch()
+
+            raw_docs = list(islice(self._results, self._batch_size))
+        except Exception as e:
+            if operation is not None:
+                operation.finish("network", error=e)
+            raise
+
+        if operation is not None:
+            operation.mark("network")
+
+        if self._recording is not None:
+            spec, sort = self._recording
+            self._recording = None
+            recorder.record(self.collection, "find", spec, sort,
+                            time.time() - start)
+
+        if raw_docs:
+            self._buffer.extend(self.build(raw_docs))
+
+        if operation is not None:
+            operation.measure(raw_docs)
+            operation.finish("deserialize", len(raw_docs))
+
+    def build(self, raw_docs):
+        """
+        Create documents of the given raw results. All the values of the
+        fields that their serializer supports batch de-serialization will
+        be de-serialized at once.
+        """
+        document = self.document
+
+        if self._projection is not None:
+            loaded, excluded = self._projection
+            docs = [document.partial(i, loaded, excluded) for i in raw_docs]
+
+        else:
+            docs = [document(i) for i in raw_docs]
+
+        for doc in docs:
+            doc.mark_clean()
+
+        if self._projection is None and identity_map.active:
+            # Already loaded documents win over the new results
+            docs = [identity_map.add(self.collection, i) for i in docs]
+
+        for key in self._prefetch:
+            self.deserialize_field(docs, key, document._fields[key])
+
+        return docs
+
+    def deserialize_field(self, docs, key, serializer):
+        """
+        De-serialize the raw values of ``key`` in all the ``docs`` using a
+        single call to ``deserialize_many`` of the serializer and put the
+        results in the serializers cache. Values which ``deserialize_many``
+        doesn't return are left raw, so accessing them de-serializes them
+        one by one.
+        """
+        cache_name = serializer.__class__.__name__
+        is_valid_value = serializer.is_valid_value
+
+        values = {}
+        missing = set()
+
+        for doc in docs:
+            raw = dict.get(doc, key)
+            if raw is None or is_valid_value(raw):
+                continue
+
+            try:
+                if raw in values or raw in missing:
+                    continue
+            except TypeError:
+                # Unhashable values will de-serialize one by one
+                continue
+
+            value = serializer_cache.get(cache_name, raw, _missing)
+            if value is _missing:
+                missing.add(raw)
+            else:
+                values[raw] = value
+
+        if missing:
+            for raw, value in serializer.deserialize_many(missing).items():
+                # None values (e.g deleted users) are cached as well
+                serializer_cache.set(cache_name, raw, value)
+                values[raw] = value
+
+        for doc in docs:
+            raw = dict.get(doc, key)
+            try:
+                if raw in values:
+                    doc._decoded[key] = (raw, values[raw])
+            except TypeError:
+                pass
+
+    def batch_size(self, batch_size):
+        """
+        Set the number of results of each batch, both for the server and
+        for de-serialization.
+        """
+        self._batch_size = batch_size
+        self._cursor.batch_size(batch_size)
+        return self
+
+    def count(self, with_limit_and_skip=False):
+        """
+        Count the results of the query, the result will be cached if the
+        collection has a result cache.
+        """
+        namespace, key = self._cache_key("count", with_limit_and_skip)
+        if key is None:
+            return self._cursor.count(with_limit_and_skip)
+
+        cache = self.collection.result_cache
+
+        count = cache.get(namespace, key)
+        if count is None:
+            count = self._cursor.count(with_limit_and_skip)
+            cache.set(namespace, key, count)
+
+        return count
+
+    def limit(self, limit):
+        self._cursor.limit(limit)
+        self._modify("limit", limit)
+        return self
+
+    def skip(self, skip):
+        self._cursor.skip(skip)
+        self._modify("skip", skip)
+        return self
+
+    def sort(self, key_or_list, direction=None):
+        self._cursor.sort(key_or_list, direction)
+        if self._recording is not None:
+            sort = key_or_list
+            if direction is not None:
+                sort = [(key_or_list, direction)]
+            self._recording = (self._recording[0], sort)
+
+        self._modify("sort", key_or_list, direction)
+        return self
+
+    def hint(self, index):
+        self._cursor.hint(index)
+        self._modify("hint", index)
+        return self
+
+    def where(self, code):
+        self._cursor.where(code)
+        self._modify("where", code)
+        return self
+
+    def rewind(self):
+        self._buffer.clear()
+        self._results = None
+        self._cursor.rewind()
+        return self
+
+    def clone(self):
+        return self._copy(self._cursor.clone())
+
+    def __copy__(self):
+        return self.clone()
@@ -17,6 +17,36 @@
 #    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 # -----------------------------------------------------------------------------
 
-from .base import Client
+"""
+Shortcuts of the global connections. Nothing here reads settings or opens
+a connection on import, the clients will be created on first use.
+"""
+from .connections import connections
 
-client = Client()
+
+class LazyClient(object):
+    """
+    A proxy of the client of a connection which will be created on the
+    first attribute access.
+    """
+
+    def __init__(self, name="default"):
+        self._name = name
+
+    def __getattr__(self, name):
+        return getattr(connections[self._name], name)
+
+    def __repr__(self):
+        return "<LazyClient '%s'>" % self._name
+
+
+#: Client of the default connection
+client = LazyClient()
+
+
+def warm_up(*names):
+    """
+    Open the connections of the given connection names or all of them,
+    see :py:meth:`~djamo.connections.ConnectionHandler.warm_up`.
+    """
+    return connections.warm_up(names or None)
@@ -20,9 +20,91 @@
 To create document you should subclass the **Document** or any subclasses of
 that.
 """
+import copy
+
 from djamo.utils.six import with_metaclass
 
-from .cache import dummy_cache
+from .cache import serializer_cache
+
+
+_missing = object()
+
+
+def parse_projection(fields):
+    """
+    Return a tuple like (loaded, excluded) for the ``fields`` argument of a
+    query. ``loaded`` is the set of keys which the query returns or None if
+    it returns all the keys except ``excluded`` ones. Keys which only part
+    of them will be returned (like ``a.b`` or ``$slice`` projections) are
+    in ``excluded``.
+    """
+    if isinstance(fields, dict):
+        include = set()
+        exclude = set()
+        partial = set()
+
+        for key, value in fields.items():
+            top = key.split(".")[0]
+
+            if isinstance(value, dict) or "." in key:
+                partial.add(top)
+                if value and not isinstance(value, dict):
+                    include.add(top)
+            elif value:
+                include.add(top)
+            else:
+                exclude.add(top)
+
+    else:
+        # A list of keys always means only those keys and "_id"
+        include = set(i.split(".")[0] for i in fields) | set(["_id"])
+        partial = set(i.split(".")[0] for i in fields if "." in i)
+        exclude = set()
+
+    if include:
+        if "_id" not in exclude:
+            include.add("_id")
+
+        return frozenset(include - partial), frozenset(partial | exclude)
+
+    return None, frozenset(partial | exclude)
+
+
+class FieldDescriptor(object):
+    """
+    Descriptor which maps an attribute of a document to the key with the
+    same name. ``DocumentMeta`` creates one for each field of the document.
+
+    .. Note:: This class is for Djamo internal usage.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+
+        # Fast path for values which are already de-serialized
+        decoded = instance._decoded.get(self.name)
+        if decoded is not None and \
+           decoded[0] is dict.get(instance, self.name, _missing):
+            return decoded[1]
+
+        try:
+            return instance[self.name]
+        except KeyError:
+            raise AttributeError("'%s' object has no attribute '%s'" %
+                                 (owner.__name__, self.name))
+
+    def __set__(self, instance, value):
+        instance[self.name] = value
+
+    def __delete__(self, instance):
+        try:
+            del instance[self.name]
+        except KeyError:
+            raise AttributeError("No attribute called '%s'." % self.name)
 
 
 class DocumentMeta(type):
@@ -43,7 +125,59 @@ class DocumentMeta(type):
             obj_dict["_fields"] = obj_dict["fields"]
             del obj_dict["fields"]
 
-        return type.__new__(cls, name, bases, obj_dict)
+        new_class = type.__new__(cls, name, bases, obj_dict)
+
+        # Create a descriptor for each field to access it like an attribute
+        # without looking it up in the dictionary on each attribute access.
+        # Fields with the same name of a class attribute (like methods)
+        # are only accessible using dictionary approach.
+        for key in new_class._fields:
+            if not hasattr(new_class, key):
+                setattr(new_class, key, FieldDescriptor(key))
+
+        cls.compile(new_class)
+        return new_class
+
+    @staticmethod
+    def compile(new_class):
+        """
+        Pre-compute everything that validate, serialize and deserialize
+        need, so they do not have to use any reflection on each call.
+        """
+        # Document level validators (validate_<key> methods) of each key
+        validators = {}
+        for attr in dir(new_class):
+            if attr.startswith("validate_"):
+                validator = getattr(new_class, attr)
+                if callable(validator):
+                    validators[attr[len("validate_"):]] = validator
+
+        # Each step of the plan is a tuple like:
+        # (key, serializer, validator, required, validate, serialize,
+        #  is_valid_value)
+        # which validate, serialize and is_valid_value are bound methods
+        # of the serializer
+        plan = []
+        defaults = []
+        deserializers = {}
+        for key, serializer in new_class._fields.items():
+            plan.append((key, serializer, validators.get(key),
+                         serializer.is_required, serializer.validate,
+                         serializer.serialize, serializer.is_valid_value))
+
+            deserializers[key] = serializer.deserialize
+
+            if serializer.default_value:
+                defaults.append((key, serializer.default_value))
+
+        new_class._plan = tuple(plan)
+        new_class._defaults = tuple(defaults)
+        new_class._deserializers = deserializers
+
+        # Validators of the keys which do not have any serializer
+        new_class._extra_validators = tuple(
+            (key, validator) for key, validator in validators.items()
+            if key not in new_class._fields)
 
 
 class Document(with_metaclass(DocumentMeta, dict)):
@@ -64,56 +198,170 @@ class Document(with_metaclass(DocumentMeta, dict)):
                      }
 
     .. Note:: Remember that providing a ``fields`` attribute is optional
+
+    Values of the fields which have a serializer will be de-serialized on
+    the first access and the result will be kept on the document instance,
+    so accessing a field again costs nothing. If you set ``lazy`` to
+    ``True`` in your document class, even setting a raw value (for example
+    when a document loads from database) will not de-serialize it and it
+    will be de-serialized on the first access::
+
+        class Comment(Document):
+            lazy = True
+            fields = {
+                "author": DjangoUser(),
+            }
+
+    So documents that loaded but never touched cost nothing to decode.
+
+    Documents which are loaded using a query with a ``fields`` argument are
+    partial (see :py:meth:`partial`). They only validate their loaded keys
+    and collections save them using a ``$set`` of their keys, so the keys
+    that did not load never get overwritten.
+
+    Documents which are loaded from database or saved once keep track of
+    their changed keys, so saving them again only sends the changes (see
+    :py:meth:`serialize_update`). Since changing a list or a dictionary in
+    place is not visible to the document, keys with such values are always
+    considered changed.
     """
 
+    #: If ``True`` raw values will not be de-serialized until first access.
+    lazy = False
+
+    # Projection of partial documents, see parse_projection
+    _loaded = None
+    _excluded = frozenset()
+
+    # Keys of the result which a partial document loaded from
+    _fetched = frozenset()
+
+    # Set of the changed keys since the document loaded or saved, None
+    # means the document does not track its changes
+    _dirty = None
+
     def __init__(self, *args, **kwargs):
+        # De-serialized values of raw values for each key like:
+        # {key: (raw_value, value)}
+        super(Document, self).__setattr__("_decoded", {})
+
         if len(args) > 0:
             super(Document, self).__init__(args[0])
         else:
             super(Document, self).__init__(kwargs)
 
-        # User provided keys in subclass
-        _keyset = set(self._fields)
-
-        # The keys that user passed to init method
-        keyset = set(self.keys())
-
         # Create a key and put a default value in it base on
-        # user provieded data on ``keys`` attribute in document
+        # user provieded data on ``fields`` attribute in document
         # defination.
-        for key in _keyset - keyset:
-            # for each key that user provided in the ``fileds``
-            # dictionary on document difination
-            if self._fields[key].default_value:
-                self[key] == self._fields[key].default_value
+        for key, default in self._defaults:
+            if key not in self:
+                self[key] = default
 
-    def _get_from_cache(self, serializer_name, raw_value, default=None):
+    @classmethod
+    def partial(cls, data, loaded=None, excluded=()):
         """
-        Get the available value of specfied key in raw_value from
-        serializer_name dictionary
+        Create a partial document of the given data which is a result of a
+        query that only returned some of the keys.
+
+        :param data: The result of the query.
+
+        :param loaded: (optional) The keys that query returned, ``None``
+                       means all the keys except the ``excluded`` ones.
+
+        :param excluded: (optional) The keys that query did not return or
+                         only returned a part of them.
         """
-        if serializer_name in dummy_cache:
-            if raw_value in dummy_cache[serializer_name]:
-                return dummy_cache[serializer_name][raw_value]
+        doc = cls(data)
+        doc._loaded = loaded
+        doc._excluded = frozenset(excluded)
+        doc._fetched = frozenset(data)
 
-            return default
+        # Defaults are only for the loaded keys, the real values of the
+        # others are in the database
+        for key, default in cls._defaults:
+            if key not in data and not doc.is_loaded(key):
+                dict.pop(doc, key, None)
 
-        return default
+        return doc
 
-    def _put_to_cache(self, cache_name, raw_value, value):
+    def mark_clean(self):
         """
-        Put value for raw_value to cache_name cache.
+        Forget the changes of the document and start tracking the new ones.
+        Collections call it after loading or saving a document.
         """
-        if cache_name in dummy_cache:
-            dummy_cache[cache_name][raw_value] = value
-        else:
-            dummy_cache[cache_name] = {raw_value: value}
+        self._dirty = set()
+
+    @property
+    def changed_keys(self):
+        """
+        The set of changed keys or ``None`` if the document does not track
+        its changes.
+        """
+        return self._dirty
+
+    # Copies are built without the tracking setters, so they keep the
+    # changes of the original instead of reporting all the keys as changed
+
+    def __copy__(self):
+        doc = self.__class__.__new__(self.__class__)
+        dict.update(doc, self)
+        doc.__dict__.update(self.__dict__)
+
+        doc.__dict__["_decoded"] = dict(self._decoded)
+        if self._dirty is not None:
+            doc.__dict__["_dirty"] = set(self._dirty)
+        return doc
 
-    def __getattribute__(self, name):
-        if name in self:
-            return self[name]
+    def __deepcopy__(self, memo):
+        doc = self.__class__.__new__(self.__class__)
+        memo[id(self)] = doc
 
-        return super(Document, self).__getattribute__(name)
+        # The same memo keeps the raw values of _decoded identical to the
+        # values of the keys
+        dict.update(doc, copy.deepcopy(dict(self), memo))
+        doc.__dict__.update(copy.deepcopy(self.__dict__, memo))
+        return doc
+
+    @property
+    def is_partial(self):
+        """
+        True if the document was loaded using a query which did not return
+        all the keys.
+        """
+        return self._loaded is not None or bool(self._excluded)
+
+    def is_loaded(self, key):
+        """
+        Return True if the value of the key in database is completely
+        loaded into this document.
+        """
+        return (self._loaded is None or key in self._loaded) and \
+            key not in self._excluded
+
+    def _get_from_cache(self, serializer_name, raw_value, default=None):
+        """
+        Get the available value of specfied key in raw_value from
+        serializer_name namespace of the serializers cache.
+        """
+        return serializer_cache.get(serializer_name, raw_value, default)
+
+    def _put_to_cache(self, cache_name, raw_value, value):
+        """
+        Put value for raw_value to cache_name namespace of the serializers
+        cache.
+        """
+        serializer_cache.set(cache_name, raw_value, value)
+
+    def __getattr__(self, name):
+        # Only called for names that are not a normal attribute, so
+        # method and field lookups never pay for it. Fields are always
+        # handled by their descriptors, so here we only deal with the
+        # keys without a serializer.
+        try:
+            return dict.__getitem__(self, name)
+        except KeyError:
+            raise AttributeError("'%s' object has no attribute '%s'" %
+                                 (self.__class__.__name__, name))
 
     def __getitem__(self, name):
         if name in self._fields:
@@ -122,44 +370,52 @@ class Document(with_metaclass(DocumentMeta, dict)):
             # Get current value of current key (raw value)
             value = super(Document, self).__getitem__(name)
 
-            if self._fields[name].is_valid_value(value):
+            # Return the de-serialized value if we already de-serialized
+            # this exact raw value
+            decoded = self._decoded.get(name)
+            if decoded is not None and decoded[0] is value:
+                return decoded[1]
+
+            serializer = self._fields[name]
+            if serializer.is_valid_value(value):
                 # If current value was a valid value (already deserialized)
+                self._decoded[name] = (value, value)
                 return value
 
-            else:
-
-                # Cechking for existance of current value in cache
-                # TODO: Check for much effecient caching algorithm
-                cache_name = self._fields[name].__class__.__name__
+            # Cechking for existance of current value in cache
+            cache_name = serializer.__class__.__name__
 
-                # Get the cached value of current raw value
-                cached_value = self._get_from_cache(cache_name, value)
+            # Get the cached value of current raw value
+            new_value = self._get_from_cache(cache_name, value, _missing)
 
-                if cached_value is None:
-                    # If there was no cached value
-                    # Deserialize the raw value
-                    new_value = self._fields[name].deserialize(value)
+            if new_value is _missing:
+                # If there was no cached value
+                # Deserialize the raw value
+                new_value = serializer.deserialize(value)
 
-                    # Put the deserialized value into cache
-                    self._put_to_cache(cache_name, value, new_value)
-                    return new_value
+                # Put the deserialized value into cache
+                self._put_to_cache(cache_name, value, new_value)
 
-                else:
-                    # Return the cached value
-                    return value
+            self._decoded[name] = (value, new_value)
+            return new_value
 
         else:
             return super(Document, self).__getitem__(name)
 
     def __setattr__(self, name, value):
-        if hasattr(self, name):
+        if name in self.__dict__ or hasattr(self.__class__, name):
+            # Instance and class attributes, field descriptors will set
+            # the value of their key.
             super(Document, self).__setattr__(name, value)
 
         else:
             self[name] = value
 
     def __setitem__(self, name, value):
-        if name in self._fields:
+        if self._dirty is not None:
+            self._dirty.add(name)
+
+        if name in self._fields and not self.__class__.lazy:
 
             if not self._fields[name].is_valid_value(value):
                 self._fields[name].validate(name, value)
@@ -175,24 +431,53 @@ class Document(with_metaclass(DocumentMeta, dict)):
         return super(Document, self).__setitem__(name, value)
 
     def __delattr__(self, name):
-        if name in self.keys():
+        if name in self.__dict__ or hasattr(self.__class__, name):
+            # Instance and class attributes, field descriptors will delete
+            # their key.
+            super(Document, self).__delattr__(name)
+
+        elif name in self:
             del self[name]
+
         else:
             raise AttributeError("No attribute called '%s'." % name)
 
-    def _validate_value(self, key):
-        """
-        Validate a value of an specific key against user provided
-        validator of the serializer class and current document validate_<key>
-        """
-        # Call each validator
-        if key in self._fields:
-            self._fields[key].validate(key, (self[key]))
+    def __delitem__(self, name):
+        super(Document, self).__delitem__(name)
+
+        if self._dirty is not None:
+            self._dirty.add(name)
+
+    # Other dictionary methods which change the document should track
+    # their changes too
+
+    def pop(self, name, *args):
+        if self._dirty is not None and name in self:
+            self._dirty.add(name)
+        return super(Document, self).pop(name, *args)
+
+    def popitem(self):
+        item = super(Document, self).popitem()
+        if self._dirty is not None:
+            self._dirty.add(item[0])
+        return item
 
-        # Call current document validate_<key>
-        validator = getattr(self, "validate_%s" % key, None)
-        if validator:
-            validator(self[key])
+    def setdefault(self, name, default=None):
+        if self._dirty is not None and name not in self:
+            self._dirty.add(name)
+        return super(Document, self).setdefault(name, default)
+
+    def update(self, *args, **kwargs):
+        if self._dirty is not None:
+            data = dict(*args, **kwargs)
+            self._dirty.update(data)
+            return super(Document, self).update(data)
+        return super(Document, self).update(*args, **kwargs)
+
+    def clear(self):
+        if self._dirty is not None:
+            self._dirty.update(self)
+        return super(Document, self).clear()
 
     def validate(self):
         """
@@ -204,23 +489,43 @@ class Document(with_metaclass(DocumentMeta, dict)):
                 # Validation code goes here ....
 
         Remember to replace <field> with your field name.
+
+        Partial documents skip the fields which are not loaded completely.
         """
-        for field, serializer in self._fields.items():
-            if serializer.is_required and field not in self.keys():
-                raise serializer.ValidationError(
-                    "'%s' field is required" % field)
+        get = dict.get
+        partial = self.is_partial
+        excluded = self._excluded
 
-        [self._validate_value(i) for i in self.keys()]
+        for (key, serializer, validator, required,
+             validate, serialize, is_valid_value) in self._plan:
 
-    def _serialize_key(self, key):
-        """
-        Serialize each key/value and return a tuple like:
-        (key, serialized_value)
-        """
-        if key in self._fields:
-            return (key, self._fields[key].serialize(self[key]))
+            value = get(self, key, _missing)
+            if value is _missing:
+                if required and not (partial and not self.is_loaded(key)):
+                    raise serializer.ValidationError(
+                        "'%s' field is required" % key)
+                continue
+
+            if key in excluded:
+                continue
+
+            if not self.__class__.lazy or is_valid_value(value):
+                value = self[key]
+            else:
+                # Validate the raw value or the already de-serialized one
+                # instead of de-serializing it
+                decoded = self._decoded.get(key)
+                if decoded is not None and decoded[0] is value:
+                    value = decoded[1]
+
+            validate(key, value)
+            if validator is not None:
+                validator(self, value)
 
-        return (key, self[key])
+        for key, validator in self._extra_validators:
+            value = get(self, key, _missing)
+            if value is not _missing and key not in excluded:
+                validator(self, value)
 
     def serialize(self):
         """
@@ -234,19 +539,62 @@ class Document(with_metaclass(DocumentMeta, dict)):
 
         """
         self.validate()
-        return dict(map(self._serialize_key, self))
 
-    def _deserialize_key(self, item):
+        data = dict(self)
+        decoded_values = self._decoded
+
+        for (key, serializer, validator, required,
+             validate, serialize, is_valid_value) in self._plan:
+
+            value = data.get(key, _missing)
+            if value is _missing:
+                continue
+
+            decoded = decoded_values.get(key)
+            if decoded is not None and decoded[0] is value:
+                data[key] = serialize(decoded[1])
+
+            elif is_valid_value(value):
+                data[key] = serialize(value)
+
+            # Otherwise it is a raw value which is already serialized
+
+        return data
+
+    def serialize_update(self):
         """
-        de-serialize each key/value using a serializer.
+        Return an update document which saves the current document using
+        ``$set`` and ``$unset`` operators. If the document tracks its
+        changes only the changed keys and the lists and dictionaries will
+        be sent. Keys which are not loaded completely will not be touched
+        unless they are changed.
         """
-        key, value = item
+        data = self.serialize()
+        excluded = self._excluded
+        dirty = self._dirty
+
+        if dirty is None:
+            changes = dict((key, value) for key, value in data.items()
+                           if key != "_id" and key not in excluded)
+
+            removed = dict((key, 1) for key in self._fetched
+                           if key not in data and key not in excluded)
+
+        else:
+            changes = dict(
+                (key, value) for key, value in data.items()
+                if key != "_id" and (key in dirty or (
+                    key not in excluded and isinstance(value, (list, dict)))))
+
+            removed = dict((key, 1) for key in dirty if key not in data)
 
-        if key in self._fields:
-            self[key] = self._fields[key].deserialize(value)
-            return True
+        update = {}
+        if changes:
+            update["$set"] = changes
+        if removed:
+            update["$unset"] = removed
 
-        self[key] = value
+        return update
 
     def deserialize(self, data=None, validate=True, clear=True):
         """
@@ -264,19 +612,44 @@ class Document(with_metaclass(DocumentMeta, dict)):
 
         :param clear: (optional) This argument cause all the current data of
                       this Document instance clear before deserialization.
+
+        The document is clean after de-serializing the given ``data``, see
+        :py:meth:`mark_clean`.
         """
 
         if data and not isinstance(data, dict):
             raise TypeError("'data' should be dict-like object")
 
-        if data and clear:
-            # Clear current keys and values
-            self.clear()
+        # Loading is not a change, populate the document without tracking
+        dirty = self._dirty
+        self._dirty = None
+
+        try:
+            if data and clear:
+                # Clear current keys and values
+                self.clear()
+
+            if not data:
+                data = self
+
+            if self.__class__.lazy:
+                # Keep the raw values, they will de-serialize on first access
+                if data is not self:
+                    super(Document, self).update(data)
+
+            else:
+                deserializers = self._deserializers
+                for key, value in list(data.items()):
+                    if key in deserializers:
+                        value = deserializers[key](value)
+
+                    self[key] = value
 
-        if not data:
-            data = self
+        finally:
+            self._dirty = dirty
 
-        map(self._deserialize_key, (data.items()))
+        if data is not self:
+            self.mark_clean()
 
         if validate:
             self.validate()
@@ -291,11 +664,9 @@ class Document(with_metaclass(DocumentMeta, dict)):
         """
         Deserialize a query that stored in ``item`` tuple like: (key, value)
         """
-        fields = getattr(cls, "fields", None)
-        if fields and isinstance(fields, dict):
-            if item[0] in fields:
-                # deserialize the value using serializer specified by user
-                return {item[0], fields[item(0)].deserialize(item[1])}
+        if item[0] in cls._fields:
+            # deserialize the value using serializer specified by user
+            return {item[0]: cls._fields[item[0]].deserialize(item[1])}
 
         return {item[0]: item[1]}
 
@@ -304,10 +675,9 @@ class Document(with_metaclass(DocumentMeta, dict)):
         """
         Serialize a query that stored in ``item`` tuple like: (key, value)
         """
-        fields = getattr(cls, "fields", None)
-        if fields and isinstance(fields, dict):
-            if item[0] in fields:
-                # Serialize the value using serializer specified by user
-                return fields[item(0)].serialize(item[1], params=args)
+        if item[0] in cls._fields:
+            # Serialize the value using serializer specified by user
+            return {item[0]: cls._fields[item[0]].serialize(item[1],
+                                                            params=args)}
 
         return {item[0]: item[1]}
@@ -0,0 +1,229 @@
+# -----------------------------------------------------------------------------
+#    Djamo - Yetanother Mongodb driver for Django
+#    Copyright (C) 2012-2013 Yellowen
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+# -----------------------------------------------------------------------------
+"""
+An identity map keeps the documents which are loaded by ``_id`` in the
+current scope, so loading the same document again returns the very same
+instance without touching the server. Each thread has its own map and
+all the writes through a collection invalidate its entries.
+
+The identity map is opt-in. You can open a scope explicitly::
+
+    from djamo.identity import identity_map
+
+    with identity_map.scope():
+        a = students.find_one(student_id)
+        b = students.find_one(student_id)
+        assert a is b
+
+or enable it for all the requests using the ``identity_map`` key of
+``settings.DJAMO``. In that case each request has its own map from the
+``request_started`` signal to ``request_finished``::
+
+    DJAMO = {
+        "name": "my_database",
+        "identity_map": True,
+    }
+
+Outside of the requests and scopes (e.g management commands or task
+workers) nothing will be kept, open a scope for each unit of work there.
+
+Only :py:meth:`~djamo.collections.BaseCollection.find_one` by ``_id`` (or
+a ``{"_id": value}`` spec) is served from the map. ``find`` always runs
+its query, but its results with a loaded ``_id`` will be the loaded
+instances.
+"""
+import threading
+from contextlib import contextmanager
+
+
+class IdentityMap(object):
+    """
+    A per thread map of the loaded documents of each collection by their
+    ``_id``.
+
+    :param enabled: (optional) If ``True`` the map is always active. If no
+                    value provided it will be read from settings on first
+                    use.
+    """
+
+    def __init__(self, enabled=None):
+        self._enabled = enabled
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _load_settings(self):
+        """
+        Read the ``identity_map`` flag of ``settings.DJAMO``.
+        """
+        from django.conf import settings
+        from django.core.exceptions import ImproperlyConfigured
+
+        try:
+            djamo_settings = getattr(settings, "DJAMO", {})
+        except ImproperlyConfigured:
+            # Djamo is in use without Django settings (e.g tests)
+            return False
+
+        if not isinstance(djamo_settings, dict):
+            return False
+
+        return bool(djamo_settings.get("identity_map", False))
+
+    @property
+    def enabled(self):
+        """
+        True if the map is active for all the requests.
+        """
+        if self._enabled is None:
+            with self._lock:
+                if self._enabled is None:
+                    self._enabled = self._load_settings()
+
+        return self._enabled
+
+    def configure(self, enabled):
+        self._enabled = enabled
+        self.clear()
+
+    def _documents(self):
+        """
+        Return the map of current thread or None if it is not active.
+        """
+        return getattr(self._local, "documents", None)
+
+    @property
+    def active(self):
+        return self._documents() is not None
+
+    @contextmanager
+    def scope(self):
+        """
+        Activate the map for current thread inside a ``with`` block. Nested
+        scopes share the same map which will be cleared at the end of the
+        outermost scope.
+        """
+        local = self._local
+        outermost = getattr(local, "documents", None) is None
+
+        if outermost:
+            local.documents = {}
+
+        try:
+            yield self
+
+        finally:
+            if outermost:
+                local.documents = None
+
+    def get(self, collection, _id):
+        """
+        Return the loaded document of ``collection`` with the given ``_id``
+        or None.
+        """
+        documents = self._documents()
+        if not documents:
+            return None
+
+        try:
+            return documents.get(collection.full_name, {}).get(_id)
+        except TypeError:
+            # Unhashable ids never get into the map
+            return None
+
+    def add(self, collection, doc):
+        """
+        Put the ``doc`` in the map and return the instance which should be
+        used, that is the already loaded document with the same ``_id`` if
+        there is one.
+        """
+        documents = self._documents()
+        if documents is None:
+            return doc
+
+        _id = dict.get(doc, "_id")
+        if _id is None:
+            return doc
+
+        try:
+            return documents.setdefault(collection.full_name,
+                                        {}).setdefault(_id, doc)
+        except TypeError:
+            return doc
+
+    def discard(self, collection, ids=None):
+        """
+        Remove the documents with given ``ids`` of ``collection`` from the
+        map. If no ids provided all the documents of the collection will be
+        removed.
+        """
+        documents = self._documents()
+        if not documents:
+            return
+
+        if ids is None:
+            documents.pop(collection.full_name, None)
+            return
+
+        loaded = documents.get(collection.full_name)
+        if loaded:
+            for _id in ids:
+                try:
+                    loaded.pop(_id, None)
+                except TypeError:
+                    pass
+
+    def begin_request(self, *args, **kwargs):
+        """
+        Activate a new map for current thread if the map is enabled. It's
+        connected to ``request_started`` signal.
+        """
+        if self.enabled:
+            self._local.documents = {}
+
+    def end_request(self, *args, **kwargs):
+        """
+        Deactivate the map of current thread. It's connected to
+        ``request_finished`` signal.
+        """
+        if self.enabled:
+            self._local.documents = None
+
+    def clear(self, *args, **kwargs):
+        """
+        Remove all the documents of current thread. It accepts any
+        argument so it can be connected to signals.
+        """
+        documents = getattr(self._local, "documents", None)
+        if documents:
+            documents.clear()
+
+
+#: The global identity map which is used by collections
+identity_map = IdentityMap()
+
+
+def _connect_signals():
+    from django.core.signals import request_started, request_finished
+
+    # Settings will be read by the first request
+    request_started.connect(identity_map.begin_request, weak=False)
+    request_finished.connect(identity_map.end_request, weak=False)
+
+
+_connect_signals()
@@ -16,6 +16,34 @@
 #    with this program; if not, write to the Free Software Foundation, Inc.,
 #    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 # -----------------------------------------------------------------------------
+"""
+Indexes are declared using the ``indexes`` attribute of the collections and
+will be synchronized with the server explicitly, creating a collection does
+not touch its indexes. Run the ``syncindexes`` management command after
+each deploy::
+
+    $ python manage.py syncindexes
+    $ python manage.py syncindexes --drop myapp.collections.Students
+
+or call :py:func:`sync_indexes` once at startup (e.g in ``ready`` method of
+an ``AppConfig``)::
+
+    from djamo.index import sync_indexes
+    sync_indexes()
+
+Missing indexes will be built in the background. Indexes on the server
+which are not declared any more are only reported unless ``drop`` is
+``True``.
+"""
+import logging
+
+from pymongo import ASCENDING
+
+from djamo.utils import six
+
+
+logger = logging.getLogger("djamo")
+
 
 class Index(object):
     """
@@ -30,6 +58,8 @@ class Index(object):
             ]
 
     .. Note:: You can use Index separatly by using its ensure method.
+              Declared indexes will not be created automatically, see
+              :py:func:`sync_indexes`.
 
     All optional index creation paramaters should be passed as keyword
     arguments to this method. Valid options include:
@@ -79,3 +109,201 @@ class Index(object):
         return collection.ensure_index(self.keys,
                                        self.cache_time,
                                        **self.kwargs)
+
+    #: Options that should be the same as the options of the index on
+    #: the server
+    compared_options = ("unique", "sparse", "expireAfterSeconds")
+
+    @property
+    def key_list(self):
+        """
+        Return the keys of index as a list of (key, direction) pairs.
+        """
+        if isinstance(self.keys, six.string_types):
+            return [(self.keys, ASCENDING)]
+
+        return [(i, ASCENDING) if isinstance(i, six.string_types)
+                else tuple(i) for i in self.keys]
+
+    @property
+    def name(self):
+        """
+        The custom name of index or the name that MongoDB generates for it.
+        """
+        return self.kwargs.get("name") or \
+            "_".join("%s_%s" % pair for pair in self.key_list)
+
+    def matches(self, info):
+        """
+        Return True if the given index of ``index_information`` has the same
+        keys and options as this index.
+        """
+        if [tuple(i) for i in info["key"]] != self.key_list:
+            return False
+
+        for option in self.compared_options:
+            # Missing and false values are the same
+            if (self.kwargs.get(option) or None) != \
+               (info.get(option) or None):
+                return False
+
+        return True
+
+    def create(self, collection, background=True):
+        """
+        Create the index without checking the server first.
+
+        :param collection: Collection object to create the index for.
+        :param background: (optional) Build the index in the background
+                           unless the index has its own ``background``
+                           option.
+        """
+        options = dict(self.kwargs)
+        options.setdefault("background", background)
+        return collection.create_index(self.key_list, **options)
+
+
+class IndexDiff(object):
+    """
+    Difference of the declared indexes of a collection and its indexes on
+    the server.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+
+        #: Declared indexes which do not exist on the server
+        self.missing = []
+
+        #: List of (index, name) of the declared indexes that exist on the
+        #: server with different keys or options
+        self.changed = []
+
+        #: Name of the indexes on the server which are not declared
+        self.stale = []
+
+    @property
+    def in_sync(self):
+        return not (self.missing or self.changed or self.stale)
+
+    def apply(self, drop=False, background=True):
+        """
+        Create the missing indexes. Changed and stale indexes will be
+        dropped only if ``drop`` is ``True``.
+        """
+        collection = self.collection
+
+        for index, name in self.changed:
+            if not drop:
+                logger.warning("Index '%s' of '%s' differs from its "
+                               "declaration", name, collection.full_name)
+                continue
+
+            collection.drop_index(name)
+            index.create(collection, background)
+
+        for index in self.missing:
+            index.create(collection, background)
+
+        for name in self.stale:
+            if drop:
+                collection.drop_index(name)
+            else:
+                logger.warning("Index '%s' of '%s' is not declared",
+                               name, collection.full_name)
+
+    def __repr__(self):
+        return "<IndexDiff '%s' missing=%s changed=%s stale=%s>" % (
+            self.collection.full_name,
+            [i.name for i in self.missing],
+            [i[1] for i in self.changed],
+            self.stale)
+
+
+def diff_indexes(collection):
+    """
+    Compare the ``indexes`` of the given collection with its indexes on
+    the server and return an :py:class:`IndexDiff`.
+    """
+    info = collection.index_information()
+    diff = IndexDiff(collection)
+    found = set(["_id_"])
+
+    for index in collection.indexes:
+        if not isinstance(index, Index):
+            raise TypeError("'indexes' should be a list of 'Index' "
+                            "instances.")
+
+        name = index.name
+        if name not in info:
+            # The same index with another name
+            name = None
+            for other, current in info.items():
+                if index.matches(current):
+                    name = other
+                    break
+
+        if name is None:
+            diff.missing.append(index)
+            continue
+
+        found.add(name)
+        if not index.matches(info[name]):
+            diff.changed.append((index, name))
+
+    diff.stale = sorted(i for i in info if i not in found)
+    return diff
+
+
+def collection_classes():
+    """
+    Return all the collection classes which are defined so far except the
+    collections of Djamo itself.
+    """
+    from djamo.collections import BaseCollection
+
+    result = []
+    classes = [BaseCollection]
+    while classes:
+        for cls in classes.pop().__subclasses__():
+            classes.append(cls)
+            if not cls.__module__.startswith("djamo.") and \
+               cls not in result:
+                result.append(cls)
+
+    return result
+
+
+def sync_indexes(collections=None, drop=False, background=True,
+                 dry_run=False):
+    """
+    Synchronize the indexes of the given collections with their
+    declarations and return the list of their :py:class:`IndexDiff`.
+
+    :param collections: (optional) List of collection classes or instances,
+                        all the collection classes by default.
+    :param drop: (optional) Drop the indexes which are changed or are not
+                 declared any more.
+    :param background: (optional) Build the indexes in the background.
+    :param dry_run: (optional) Only compare the indexes.
+    """
+    if collections is None:
+        collections = collection_classes()
+
+    result = []
+    seen = set()
+    for collection in collections:
+        if isinstance(collection, type):
+            collection = collection.objects
+
+        # Collections which share a collection on the server
+        if collection.full_name in seen:
+            continue
+        seen.add(collection.full_name)
+
+        diff = diff_indexes(collection)
+        if not dry_run:
+            diff.apply(drop, background)
+        result.append(diff)
+
+    return result
@@ -0,0 +1,454 @@
+# -----------------------------------------------------------------------------
+#    Djamo - Yetanother Mongodb driver for Django
+#    Copyright (C) 2012-2013 Yellowen
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+# -----------------------------------------------------------------------------
+"""
+Collections report the timing of each phase of their operations to the
+registered listeners. Phases are ``prepare`` (validating and serializing
+documents and queries), ``network`` (the PyMongo call) and
+``deserialize`` (building the documents of the results). Results of
+``find`` are reported by the cursor as ``fetch`` operations, one for each
+batch.
+
+Register listeners using the ``listeners`` key of ``settings.DJAMO`` (a
+list of dotted paths of listener classes) or explicitly::
+
+    from djamo.instrumentation import instrumentation, HistogramListener
+
+    histogram = instrumentation.register(HistogramListener())
+    ...
+    histogram.snapshot()
+
+Without any listener the collections do not measure anything. The BSON
+size of the payloads is only computed if a listener sets ``wants_payload``,
+since it means encoding the documents once more.
+"""
+import time
+import logging
+import threading
+from bisect import bisect_left
+
+import bson
+
+from djamo.utils import six, import_object
+
+
+#: Upper bounds (in seconds) of the default histogram buckets
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def payload_size(docs):
+    """
+    Return the BSON size of the given list of dictionaries.
+    """
+    encode = getattr(bson, "encode", None)
+    if encode is None:
+        # PyMongo 2.x
+        encode = bson.BSON.encode
+
+    return sum(len(encode(doc)) for doc in docs)
+
+
+def affected_documents(result):
+    """
+    Return the number of affected documents of the result of a write, or
+    zero if it is not acknowledged.
+    """
+    if isinstance(result, dict):
+        return result.get("n", 0)
+    return 0
+
+
+class Operation(object):
+    """
+    Timing of a single operation of a collection. ``phases`` is a dictionary
+    of phase names to their duration in seconds.
+    """
+
+    def __init__(self, instrumentation, collection, name):
+        self._instrumentation = instrumentation
+        self.collection = collection.full_name
+        self.name = name
+
+        #: The prepared spec of queries, updates and removes
+        self.spec = None
+        self.phases = {}
+        self.documents = 0
+        self.payload = 0
+        self.error = None
+        self.duration = None
+
+        #: True if any listener uses the payload
+        self.wants_payload = instrumentation.wants_payload
+
+        self._start = self._last = time.time()
+
+    def mark(self, phase):
+        """
+        End the current phase with the given name.
+        """
+        now = time.time()
+        self.phases[phase] = self.phases.get(phase, 0.0) + now - self._last
+        self._last = now
+
+    def add(self, phase, duration):
+        """
+        Add a phase which is measured elsewhere (e.g in another thread).
+        """
+        self.phases[phase] = self.phases.get(phase, 0.0) + duration
+        self._start -= duration
+
+    def measure(self, docs):
+        """
+        Add the BSON size of the given documents to the payload if any
+        listener wants it. The time spent is excluded from the phases.
+        """
+        if not self.wants_payload:
+            return
+
+        start = time.time()
+        try:
+            self.payload += payload_size(docs)
+        except Exception:
+            logging.getLogger("djamo").warning(
+                "Can't measure the payload of %s.%s", self.collection,
+                self.name, exc_info=True)
+
+        spent = time.time() - start
+        self._start += spent
+        self._last += spent
+
+    def call(self, func, *args, **kwargs):
+        """
+        Call the given function as the ``network`` phase and emit the
+        operation if it fails.
+        """
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            self.finish("network", error=e)
+            raise
+
+        self.mark("network")
+        return result
+
+    def finish(self, phase=None, documents=None, payload=None, error=None):
+        """
+        End the operation (and its last phase) and emit it to the listeners.
+        """
+        if phase is not None:
+            self.mark(phase)
+
+        if documents is not None:
+            self.documents = documents
+        if payload is not None:
+            self.payload = payload
+
+        self.error = error
+        self.duration = self._last - self._start
+        self._instrumentation.emit(self)
+
+    def __repr__(self):
+        return "<Operation %s.%s %.6fs>" % (self.collection, self.name,
+                                             self.duration or 0.0)
+
+
+class Instrumentation(object):
+    """
+    The registry of the listeners.
+
+    :param listeners: (optional) List of the listeners. If no value
+                      provided they will be read from settings on first use.
+    """
+
+    def __init__(self, listeners=None):
+        self._listeners = listeners
+        self._lock = threading.Lock()
+
+    def _load_settings(self):
+        """
+        Create the listeners of the ``listeners`` key of ``settings.DJAMO``.
+        """
+        from django.conf import settings
+        from django.core.exceptions import ImproperlyConfigured
+
+        try:
+            djamo_settings = getattr(settings, "DJAMO", {})
+        except ImproperlyConfigured:
+            # Djamo is in use without Django settings (e.g tests)
+            return []
+
+        if not isinstance(djamo_settings, dict):
+            return []
+
+        listeners = []
+        for listener in djamo_settings.get("listeners", []):
+            if isinstance(listener, six.string_types):
+                listener = import_object(listener)
+            if isinstance(listener, type):
+                listener = listener()
+            listeners.append(listener)
+
+        return listeners
+
+    @property
+    def listeners(self):
+        if self._listeners is None:
+            with self._lock:
+                if self._listeners is None:
+                    self._listeners = self._load_settings()
+
+        return self._listeners
+
+    @property
+    def active(self):
+        """
+        True if there is any listener.
+        """
+        return bool(self.listeners)
+
+    @property
+    def wants_payload(self):
+        """
+        True if any listener uses the payload of the operations.
+        """
+        return any(getattr(i, "wants_payload", False)
+                   for i in self.listeners)
+
+    def configure(self, listeners):
+        self._listeners = listeners
+
+    def register(self, listener):
+        """
+        Add the given listener and return it.
+        """
+        with self._lock:
+            # Replace the list so emitting never sees a changing list
+            self._listeners = list(self._current()) + [listener]
+        return listener
+
+    def unregister(self, listener):
+        with self._lock:
+            self._listeners = [i for i in self._current()
+                               if i is not listener]
+
+    def _current(self):
+        if self._listeners is None:
+            self._listeners = self._load_settings()
+        return self._listeners
+
+    def operation(self, collection, name):
+        """
+        Return a new :py:class:`Operation` of the given collection or
+        None if there is no listener.
+        """
+        if not self.listeners:
+            return None
+
+        return Operation(self, collection, name)
+
+    def emit(self, operation):
+        for listener in self.listeners:
+            try:
+                listener.event(operation)
+            except Exception:
+                logging.getLogger("djamo").exception(
+                    "Djamo listener %r failed", listener)
+
+
+#: The global instrumentation which is used by collections
+instrumentation = Instrumentation()
+
+
+class Listener(object):
+    """
+    Base class of the listeners.
+    """
+
+    #: Set to True to receive the BSON size of the payloads
+    wants_payload = False
+
+    def event(self, operation):
+        """
+        Receive a finished :py:class:`Operation`.
+        """
+        raise NotImplementedError()
+
+
+class LoggingListener(Listener):
+    """
+    Log each operation using the logging module.
+
+    :param logger: (optional) Name of the logger.
+    :param level: (optional) Level of the records.
+    :param payload: (optional) Log the BSON size of the payloads too.
+    """
+
+    def __init__(self, logger="djamo.instrumentation", level=logging.DEBUG,
+                 payload=False):
+        self.logger = logging.getLogger(logger)
+        self.level = level
+        self.wants_payload = payload
+
+    def event(self, operation):
+        if not self.logger.isEnabledFor(self.level):
+            return
+
+        phases = " ".join("%s=%.6f" % i for i in sorted(
+            operation.phases.items()))
+        self.logger.log(self.level,
+                        "%s.%s %.6fs %s documents=%d payload=%d%s",
+                        operation.collection, operation.name,
+                        operation.duration, phases, operation.documents,
+                        operation.payload,
+                        " error=%r" % operation.error
+                        if operation.error is not None else "")
+
+
+class Histogram(object):
+    """
+    Cumulative bucket counts of some observations.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def as_dict(self):
+        cumulative = []
+        total = 0
+        for i in self.counts:
+            total += i
+            cumulative.append(total)
+
+        return {"buckets": list(zip(list(self.buckets) + [float("inf")],
+                                    cumulative)),
+                "count": self.count,
+                "sum": self.sum}
+
+
+class HistogramListener(Listener):
+    """
+    Keep in memory histograms of the duration of operations and their
+    phases, and the totals of the documents, payloads and errors of each
+    operation of each collection.
+
+    :param buckets: (optional) Sorted upper bounds of the buckets in
+                    seconds.
+    :param payload: (optional) Measure the BSON size of the payloads too.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, payload=False):
+        self.buckets = tuple(buckets)
+        self.wants_payload = payload
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._histograms = {}
+            self._totals = {}
+
+    def event(self, operation):
+        key = (operation.collection, operation.name)
+        phases = [("total", operation.duration)] + \
+            list(operation.phases.items())
+
+        with self._lock:
+            for phase, duration in phases:
+                histogram = self._histograms.get(key + (phase,))
+                if histogram is None:
+                    histogram = self._histograms[key + (phase,)] = \
+                        Histogram(self.buckets)
+                histogram.observe(duration)
+
+            totals = self._totals.setdefault(key, [0, 0, 0])
+            totals[0] += operation.documents
+            totals[1] += operation.payload
+            totals[2] += operation.error is not None
+
+    def snapshot(self):
+        """
+        Return the histograms by (collection, operation, phase) and the
+        totals by (collection, operation).
+        """
+        with self._lock:
+            return {
+                "histograms": dict((key, i.as_dict()) for key, i in
+                                   self._histograms.items()),
+                "totals": dict((key, {"documents": i[0], "payload": i[1],
+                                      "errors": i[2]})
+                               for key, i in self._totals.items())}
+
+
+class PrometheusListener(HistogramListener):
+    """
+    A :py:class:`HistogramListener` which renders its data in the text
+    format of Prometheus, for example in a metrics view::
+
+        def metrics(request):
+            return HttpResponse(listener.render(),
+                                content_type=PrometheusListener.content_type)
+
+    :param prefix: (optional) Prefix of the metric names.
+    """
+
+    content_type = "text/plain; version=0.0.4"
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, prefix="djamo",
+                 payload=False):
+        self.prefix = prefix
+        super(PrometheusListener, self).__init__(buckets, payload)
+
+    def render(self):
+        snapshot = self.snapshot()
+        prefix = self.prefix
+        lines = ["# TYPE %s_operation_seconds histogram" % prefix]
+
+        for key in sorted(snapshot["histograms"]):
+            histogram = snapshot["histograms"][key]
+            labels = 'collection="%s",operation="%s",phase="%s"' % key
+
+            for bound, count in histogram["buckets"]:
+                bound = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append('%s_operation_seconds_bucket{%s,le="%s"} %d' %
+                             (prefix, labels, bound, count))
+
+            lines.append("%s_operation_seconds_sum{%s} %r" %
+                         (prefix, labels, histogram["sum"]))
+            lines.append("%s_operation_seconds_count{%s} %d" %
+                         (prefix, labels, histogram["count"]))
+
+        for name in ("documents", "payload", "errors"):
+            metric = "%s_%s_total" % (prefix, name)
+            if name == "payload":
+                metric = "%s_payload_bytes_total" % prefix
+
+            lines.append("# TYPE %s counter" % metric)
+            for key in sorted(snapshot["totals"]):
+                lines.append('%s{collection="%s",operation="%s"} %d' % (
+                    (metric,) + key + (snapshot["totals"][key][name],)))
+
+        return "\n".join(lines) + "\n"
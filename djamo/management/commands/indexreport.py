@@ -0,0 +1,55 @@
+# -----------------------------------------------------------------------------
+#    Djamo - Yetanother Mongodb driver for Django
+#    Copyright (C) 2012-2013 Yellowen
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+# -----------------------------------------------------------------------------
+from django.core.management.base import BaseCommand
+
+from djamo.advisor import QueryRecorder, advise, explain
+
+
+class Command(BaseCommand):
+    help = ("Compare the recorded query shapes with the declared indexes "
+            "of Djamo collections.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("files", nargs="+",
+                            help="Files of the recorded shapes, see "
+                            "djamo.advisor.QueryRecorder.dump.")
+        parser.add_argument("--explain", action="store_true",
+                            help="Explain the sample queries of the "
+                            "missing indexes on the server.")
+
+    def handle(self, *args, **options):
+        recorder = QueryRecorder(enabled=False)
+        for path in options["files"]:
+            recorder.load(path)
+
+        advice = advise(recorder)
+        if not advice:
+            self.stdout.write("Indexes match the recorded queries.")
+
+        for item in advice:
+            self.stdout.write(str(item))
+
+            if not options["explain"] or item.kind != "missing":
+                continue
+
+            collection = item.collection.objects
+            for shape, stats in item.shapes:
+                plan = explain(collection, shape, stats)
+                if plan is not None:
+                    self.stdout.write("    %s: %s" % (shape, plan))
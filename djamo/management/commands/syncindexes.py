@@ -0,0 +1,70 @@
+# -----------------------------------------------------------------------------
+#    Djamo - Yetanother Mongodb driver for Django
+#    Copyright (C) 2012-2013 Yellowen
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+# -----------------------------------------------------------------------------
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import autodiscover_modules
+
+from djamo.index import sync_indexes
+from djamo.utils import import_object
+
+
+class Command(BaseCommand):
+    help = "Synchronize the indexes of Djamo collections with the server."
+
+    def add_arguments(self, parser):
+        parser.add_argument("collections", nargs="*",
+                            help="Dotted path of the collection classes, "
+                            "all the collections by default.")
+        parser.add_argument("--drop", action="store_true",
+                            help="Drop the indexes which are changed or "
+                            "are not declared any more.")
+        parser.add_argument("--foreground", action="store_true",
+                            help="Do not build the indexes in background.")
+        parser.add_argument("--dry-run", action="store_true",
+                            help="Only show the differences.")
+
+    def handle(self, *args, **options):
+        collections = None
+        if options["collections"]:
+            collections = [import_object(i) for i in options["collections"]]
+        else:
+            # Collections of the apps are usually in their collections or
+            # models modules
+            autodiscover_modules("collections")
+
+        dry_run = options["dry_run"]
+        for diff in sync_indexes(collections, drop=options["drop"],
+                                 background=not options["foreground"],
+                                 dry_run=dry_run):
+            name = diff.collection.full_name
+            if diff.in_sync:
+                self.stdout.write("%s: in sync" % name)
+                continue
+
+            prefix = "would " if dry_run else ""
+            for index in diff.missing:
+                self.stdout.write("%s: %screate %s" % (name, prefix,
+                                                       index.name))
+
+            verb = "drop" if options["drop"] else "keep"
+            for index, index_name in diff.changed:
+                self.stdout.write("%s: %s%s changed %s" % (name, prefix, verb,
+                                                           index_name))
+            for index_name in diff.stale:
+                self.stdout.write("%s: %s%s stale %s" % (name, prefix, verb,
+                                                         index_name))
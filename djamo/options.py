@@ -31,6 +31,11 @@ class Options(object):
     document = ""
     include = []
     exclude = []
+    prefetch = []
+    result_cache = {}
+    connection = ""
+    read_connection = ""
+    read_preference = ""
 
     def __init__(self, meta, **kwargs):
 
@@ -39,7 +44,9 @@ class Options(object):
 
         if meta:
             for key, value in  six.iteritems(meta.__dict__):
-                self.set_attr(key, value)
+                # Skip the class internals like __dict__ and __module__
+                if not key.startswith("__"):
+                    self.set_attr(key, value)
 
     def set_attr(self, key, value):
         my_attr = getattr(self, key, None)
@@ -0,0 +1,276 @@
+# -----------------------------------------------------------------------------
+#    Djamo - Yetanother Mongodb driver for Django
+#    Copyright (C) 2012-2013 Yellowen
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+# -----------------------------------------------------------------------------
+"""
+Djamo compiles each query (spec) shape into a reusable plan. The shape of a
+query is its structure (keys, operators and nesting) without its values, so
+the following queries have the same shape::
+
+    {"name": "Okarin", "age": {"$gt": 18}}
+    {"name": "Kurisu", "age": {"$gt": 17}}
+
+The plan of each shape is compiled once for each Document class and kept in
+a bounded least recently used cache. At call time only the leaf values will
+be serialized by the serializer of their fields.
+
+.. Note:: This module is for Djamo internal usage.
+"""
+from djamo.cache import LRUCache
+
+
+#: Marker for the lists of plain values in the shapes
+LEAVES = "[]"
+
+#: Operators that their values are a list of queries
+LOGICAL_OPERATORS = ("$and", "$or", "$nor")
+
+#: Operators that their values are a list of values of the field
+LIST_OPERATORS = ("$in", "$nin", "$all")
+
+#: Operators that their values are values of the field, operands of the
+#: other ones (like ``$exists``, ``$size`` and ``$type``) are used as they
+#: are
+VALUE_OPERATORS = ("$eq", "$ne", "$gt", "$gte", "$lt", "$lte") + \
+    LIST_OPERATORS
+
+
+def shape_of(query):
+    """
+    Return the hashable shape of the given query (dictionary).
+    """
+    shape = []
+    for key, value in query.items():
+        if isinstance(value, dict):
+            shape.append((key, shape_of(value)))
+
+        elif isinstance(value, (list, tuple)):
+            shape.append((key, list_shape_of(value)))
+
+        else:
+            shape.append((key, None))
+
+    return tuple(shape)
+
+
+def list_shape_of(value):
+    """
+    Return the hashable shape of the given list.
+    """
+    for item in value:
+        if isinstance(item, dict):
+            return (LEAVES, tuple([shape_of(i) if isinstance(i, dict) else
+                                   None for i in value]))
+    return LEAVES
+
+
+class QueryCompiler(object):
+    """
+    Compile query shapes to plans and cache them.
+
+    :param max_plans: (optional) Maximum number of cached plans.
+    """
+
+    def __init__(self, max_plans=1000):
+        self.plans = LRUCache(max_entries=max_plans)
+
+    def prepare(self, collection, query, query_type="query"):
+        """
+        Prepare (serialize) the given query for the document of the given
+        collection.
+        """
+        if not query:
+            return query
+
+        document = collection._get_document()
+        key = (document, collection.__class__, query_type, shape_of(query))
+
+        plan = self.plans.get(key)
+        if plan is None:
+            plan = self.compile(collection, document, key[-1], query_type)
+            self.plans.set(key, plan)
+
+        return plan(query)
+
+    def compile(self, collection, document, shape, query_type="query"):
+        """
+        Compile the given shape to a plan. A plan is a function which
+        receives a query with the same shape and returns the prepared query.
+        """
+        return Compilation(collection, document, query_type).spec(shape)
+
+
+class Compilation(object):
+    """
+    State of compiling a single shape.
+    """
+
+    def __init__(self, collection, document, query_type):
+        self.collection = collection
+        self.document = document
+        self.query_type = query_type
+        self.operators = collection.Operators()
+
+    def leaf(self, field):
+        """
+        Return a function which serialize a value of the given field or
+        ``None`` if the values of the field should be used as they are.
+        """
+        if field is None or "." in field:
+            # TODO: Pass the dot notation of the key to its serializer
+            return None
+
+        serializer = self.document._fields.get(field)
+        if serializer is None:
+            return None
+
+        is_valid_value = serializer.is_valid_value
+        serialize = serializer.serialize
+
+        def leaf(value):
+            if is_valid_value(value):
+                return serialize(value)
+            return value
+
+        return leaf
+
+    def spec(self, shape, field=None):
+        """
+        Compile a dictionary shape. ``field`` is the field that operators of
+        this dictionary belong to, or ``None`` for a query.
+        """
+        steps = []
+        merges = []
+
+        for key, sub_shape in shape:
+            if key.startswith("$"):
+                handler = getattr(self.operators, "%s_%s" % (key[1:],
+                                                             self.query_type),
+                                  None)
+                if handler is not None:
+                    # Custom operator handler returns a dictionary to
+                    # merge into the result
+                    merges.append((key, handler))
+                    continue
+
+                steps.append((key, self.operator(key, sub_shape, field)))
+
+            else:
+                steps.append((key, self.value(sub_shape, key)))
+
+        document = self.document
+        steps = tuple(steps)
+        merges = tuple(merges)
+
+        if not merges and all(step is None for key, step in steps):
+            # Nothing to serialize
+            return dict
+
+        def plan(query):
+            result = {}
+            for key, step in steps:
+                if step is None:
+                    result[key] = query[key]
+                else:
+                    result[key] = step(query[key])
+
+            for key, handler in merges:
+                merge = handler(query[key], document)
+                if merge:
+                    result.update(merge)
+
+            return result
+
+        return plan
+
+    def operator(self, key, shape, field):
+        """
+        Compile the value of an operator.
+        """
+        if key in LOGICAL_OPERATORS and isinstance(shape, tuple) and \
+           shape and shape[0] == LEAVES:
+            return self.list(shape, None, spec=True)
+
+        if field is None:
+            if self.query_type == "update" and \
+               isinstance(shape, tuple) and shape and shape[0] != LEAVES:
+                # Update operators like $set, keys are fields
+                return self.spec(shape)
+
+            # Other query level operators like $where
+            return None
+
+        if key == "$not":
+            if isinstance(shape, tuple) and shape and shape[0] != LEAVES:
+                # Operators of the same field
+                return self.spec(shape, field)
+            return None
+
+        if key not in VALUE_OPERATORS:
+            return None
+
+        return self.value(shape, field, in_operator=True)
+
+    def value(self, shape, field, in_operator=False):
+        """
+        Compile a value of the given field.
+        """
+        if shape is None:
+            return self.leaf(field)
+
+        if not shape:
+            # An empty dictionary
+            return None
+
+        if shape == LEAVES:
+            if in_operator:
+                leaf = self.leaf(field)
+                if leaf is None:
+                    return None
+
+                return lambda value: [leaf(i) for i in value]
+
+            # The whole list is the value of the field
+            return self.leaf(field)
+
+        if shape[0] == LEAVES:
+            return self.list(shape, field)
+
+        if any(key.startswith("$") for key, sub_shape in shape):
+            # Operators of the field
+            return self.spec(shape, field)
+
+        # An embedded document
+        return None
+
+    def list(self, shape, field, spec=False):
+        """
+        Compile a list which contains dictionaries.
+        """
+        if spec:
+            steps = tuple([self.spec(i) if isinstance(i, tuple) and
+                           i and i[0] != LEAVES else None
+                           for i in shape[1]])
+        else:
+            steps = tuple([self.value(i, field, in_operator=True)
+                           for i in shape[1]])
+
+        def plan(value):
+            return [item if step is None else step(item)
+                    for step, item in zip(steps, value)]
+
+        return plan
@@ -0,0 +1,211 @@
+# -----------------------------------------------------------------------------
+#    Djamo - Yetanother Mongodb driver for Django
+#    Copyright (C) 2012-2013 Yellowen
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+# -----------------------------------------------------------------------------
+"""
+Django's ``connection.queries`` does not see the operations of Djamo. The
+query log keeps the operations of each request (thread), with their
+collection, prepared spec, duration, number of documents and the line of
+your code that caused them. It's an instrumentation listener (see
+:py:mod:`djamo.instrumentation`), enable it in settings::
+
+    DJAMO = {
+        "name": "my_database",
+        "listeners": ["djamo.querylog.query_log"],
+        "query_log": {"slow_threshold": 0.1},
+    }
+
+and read it like ``connection.queries``::
+
+    from djamo.querylog import query_log
+
+    for entry in query_log.queries:
+        print(entry["collection"], entry["operation"], entry["duration"])
+
+The log will be cleared when a request starts and when it finishes.
+Batches of ``insert_stream`` (and ``insert`` of iterables) are logged
+when their results reach the caller, with the caller's frame.
+Operations slower than ``slow_threshold`` seconds are logged using the
+``djamo.querylog`` logger even when nobody reads the log.
+:py:meth:`QueryLog.repeated` finds the queries with the same shape that
+run many times in a request, which usually is a N+1 pattern (e.g a
+``ListView`` which loads a related document for each item).
+"""
+import os
+import sys
+import logging
+import threading
+
+from djamo.instrumentation import Listener
+from djamo.query import shape_of
+
+
+logger = logging.getLogger("djamo.querylog")
+
+#: Directory of the Djamo package, its frames are not the callers
+DJAMO_PATH = os.path.dirname(os.path.abspath(__file__))
+_djamo_prefix = DJAMO_PATH + os.sep
+
+
+def caller():
+    """
+    Return (filename, line number, function name) of the nearest frame
+    outside of Djamo or None.
+    """
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if not os.path.abspath(filename).startswith(_djamo_prefix):
+            return (filename, frame.f_lineno, frame.f_code.co_name)
+        frame = frame.f_back
+
+    return None
+
+
+class QueryLog(Listener):
+    """
+    Collect the operations of each thread.
+
+    :param slow_threshold: (optional) Log the operations that take longer
+                           than this number of seconds.
+    :param max_entries: (optional) Maximum number of entries of each
+                        thread, later operations will not be kept.
+
+    Without any parameter they will be read from the ``query_log`` key of
+    ``settings.DJAMO`` on first use. Each log is cleared when a request
+    starts and when it finishes, however it is configured.
+    """
+
+    def __init__(self, slow_threshold=None, max_entries=None):
+        self._config = None
+        if slow_threshold is not None or max_entries is not None:
+            self._config = {"slow_threshold": slow_threshold,
+                            "max_entries": max_entries or 1000}
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+        from django.core.signals import request_started, request_finished
+        request_started.connect(self.clear)
+        request_finished.connect(self.clear)
+
+    def _load_settings(self):
+        """
+        Read the ``query_log`` options of ``settings.DJAMO``.
+        """
+        from django.conf import settings
+        from django.core.exceptions import ImproperlyConfigured
+
+        try:
+            djamo_settings = getattr(settings, "DJAMO", {})
+        except ImproperlyConfigured:
+            # Djamo is in use without Django settings (e.g tests)
+            djamo_settings = {}
+
+        if not isinstance(djamo_settings, dict):
+            djamo_settings = {}
+
+        config = {"slow_threshold": None, "max_entries": 1000}
+        config.update(djamo_settings.get("query_log", None) or {})
+        return config
+
+    @property
+    def config(self):
+        if self._config is None:
+            with self._lock:
+                if self._config is None:
+                    self._config = self._load_settings()
+
+        return self._config
+
+    def configure(self, slow_threshold=None, max_entries=1000):
+        self._config = {"slow_threshold": slow_threshold,
+                        "max_entries": max_entries}
+        self.clear()
+
+    @property
+    def queries(self):
+        """
+        The list of the entries of current thread. Each entry is a
+        dictionary of ``collection``, ``operation``, ``spec``,
+        ``duration``, ``documents``, ``phases``, ``error`` and ``caller``.
+        """
+        queries = getattr(self._local, "queries", None)
+        if queries is None:
+            queries = self._local.queries = []
+
+        return queries
+
+    def clear(self, *args, **kwargs):
+        """
+        Clear the log of current thread. It accepts any argument so it can
+        be connected to signals.
+        """
+        self._local.queries = []
+
+    def event(self, operation):
+        config = self.config
+        entry = {"collection": operation.collection,
+                 "operation": operation.name,
+                 "spec": operation.spec,
+                 "duration": operation.duration,
+                 "documents": operation.documents,
+                 "phases": operation.phases,
+                 "error": operation.error,
+                 "caller": caller()}
+
+        queries = self.queries
+        if len(queries) < config["max_entries"]:
+            queries.append(entry)
+
+        threshold = config["slow_threshold"]
+        if threshold is not None and operation.duration >= threshold:
+            location = entry["caller"]
+            logger.warning("Slow Djamo query (%.3fs) %s.%s %r at %s",
+                           operation.duration, operation.collection,
+                           operation.name, operation.spec,
+                           "%s:%s in %s" % location if location else "?")
+
+    def repeated(self, min_count=2):
+        """
+        Return a list of ``((collection, operation, shape), count)`` of the
+        queries of current thread with the same shape which run at least
+        ``min_count`` times, the most repeated first.
+        """
+        counts = {}
+        for entry in self.queries:
+            if entry["operation"] == "fetch":
+                # Part of a find
+                continue
+
+            spec = entry["spec"]
+            shape = shape_of(spec) if isinstance(spec, dict) else None
+            key = (entry["collection"], entry["operation"], shape)
+            counts[key] = counts.get(key, 0) + 1
+
+        result = [(key, count) for key, count in counts.items()
+                  if count >= min_count]
+        result.sort(key=lambda i: -i[1])
+        return result
+
+    @property
+    def total_time(self):
+        return sum(entry["duration"] for entry in self.queries)
+
+
+#: The global query log
+query_log = QueryLog()
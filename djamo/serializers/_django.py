@@ -24,12 +24,28 @@ class DjangoUser(Serializer):
     """
     Serializer for Django users, This class will de-serialize the data from the
     database to a django user and serialize the user normally to its user id.
+
+    :param user_field: (optional) The user field to store (default: pk)
+
+    :param missing: (optional) What to do with the ids of the users which
+                    do not exist anymore, ``"raise"`` (the default) raises
+                    the ``DoesNotExist`` exception of the user model on
+                    access and ``"null"`` de-serializes them to ``None``,
+                    which is cached like any other user. In this mode
+                    ``None`` is a valid value too and serializes to
+                    ``None``.
     """
 
-    def __init__(self, user_field="pk", *args, **kwargs):
+    batch_deserialize = True
+
+    def __init__(self, user_field="pk", missing="raise", *args, **kwargs):
         from django.conf import settings
 
+        if missing not in ("raise", "null"):
+            raise ValueError("'missing' should be 'raise' or 'null'")
+
         self.user_field = user_field
+        self.missing = missing
 
         settings_auth_model = getattr(settings, "AUTH_USER_MODEL", "auth.User")
 
@@ -47,6 +63,10 @@ class DjangoUser(Serializer):
         """
         Check for a valid Django user in given value
         """
+        if value is None and self.missing == "null":
+            # A deleted user
+            return
+
         super(DjangoUser, self).validate(key, value)
 
         if not isinstance(value, (self._user_model, int)):
@@ -61,6 +81,9 @@ class DjangoUser(Serializer):
         if isinstance(value, self._user_model):
             return getattr(value, self.user_field)
 
+        if value is None and self.missing == "null":
+            return None
+
         raise TypeError(
             "'value' should be an instance of '%s'" % self._user_model.__name__
         )
@@ -70,9 +93,32 @@ class DjangoUser(Serializer):
         Restore the string to Djano User.
         """
         params = {self.user_field: value}
-        return self._user_model.objects.get(**params)
+
+        try:
+            return self._user_model.objects.get(**params)
+        except self._user_model.DoesNotExist:
+            if self.missing == "null":
+                return None
+            raise
+
+    def deserialize_many(self, values):
+        """
+        Fetch all the users of given values with a single query. The ids
+        of missing users are left out unless ``missing`` is ``"null"``.
+        """
+        params = {"%s__in" % self.user_field: list(values)}
+        users = self._user_model.objects.filter(**params)
+
+        result = dict((getattr(user, self.user_field), user)
+                      for user in users)
+
+        if self.missing == "null":
+            for value in values:
+                result.setdefault(value, None)
+
+        return result
 
     def is_valid_value(self, value):
         if isinstance(value, self._user_model):
             return True
-        return False
+        return value is None and self.missing == "null"
@@ -33,6 +33,7 @@ class EmbeddedDocument(Serializer):
 
     def __init__(self, document, *args, **kwargs):
         self.document = document
+        super(EmbeddedDocument, self).__init__(*args, **kwargs)
 
     def validate(self, key, value):
         """
@@ -47,6 +47,9 @@ class Serializer(object):
 
     """
 
+    #: If ``True`` the cursors de-serialize the values of a batch of
+    #: results with a single call to ``deserialize_many``.
+    batch_deserialize = False
 
     def __init__(self, verbose=None, required=False, default=None,
                  help_text=None, form_class=None, form_widget=None):
@@ -85,6 +88,14 @@ class Serializer(object):
         """
         return value
 
+    def deserialize_many(self, values):
+        """
+        De-serialize all the given values at once and return a dictionary
+        of each value to its de-serialized value. Values without a result
+        will be de-serialized one by one later.
+        """
+        return dict((value, self.deserialize(value)) for value in values)
+
     @property
     def default_value(self):
         """
@@ -0,0 +1,97 @@
+# -----------------------------------------------------------------------------
+#    Djamo - Yetanother Mongodb driver for Django
+#    Copyright (C) 2012-2013 Yellowen
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+# -----------------------------------------------------------------------------
+import sys
+import time
+import threading
+from importlib import import_module
+from itertools import islice
+
+from . import six
+
+
+def import_object(path):
+    """
+    Import and return an object (class, function, ...) from its dotted
+    python path like ``djamo.cache.LocalBackend``.
+    """
+    try:
+        module_path, name = path.rsplit(".", 1)
+    except ValueError:
+        raise ImportError("'%s' is not a valid dotted path" % path)
+
+    module = import_module(module_path)
+
+    try:
+        return getattr(module, name)
+    except AttributeError:
+        raise ImportError("module '%s' does not have '%s'" % (module_path,
+                                                              name))
+
+
+def chunks(iterable, size):
+    """
+    Yield lists of at most ``size`` items from any iterable without
+    loading the whole iterable into memory.
+    """
+    iterator = iter(iterable)
+
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+
+        yield chunk
+
+
+class BackgroundCall(threading.Thread):
+    """
+    Run a function in a separate thread and wait for its result using
+    ``result`` method. Exceptions of the function will be re-raised by
+    ``result``. ``elapsed`` is the duration of the call in seconds.
+    """
+
+    def __init__(self, func, *args, **kwargs):
+        super(BackgroundCall, self).__init__()
+        self.daemon = True
+
+        self._func = func
+        self._args = args
+        self._kwargs = kwargs
+        self._result = None
+        self._exc_info = None
+        self.elapsed = 0.0
+
+        self.start()
+
+    def run(self):
+        start = time.time()
+        try:
+            self._result = self._func(*self._args, **self._kwargs)
+        except Exception:
+            self._exc_info = sys.exc_info()
+        finally:
+            self.elapsed = time.time() - start
+
+    def result(self):
+        self.join()
+
+        if self._exc_info is not None:
+            six.reraise(*self._exc_info)
+
+        return self._result
@@ -38,8 +38,9 @@ class MultipleObjectMixin(MOM):
                 queryset = queryset.clone()
 
         elif self.collection is not None:
-            collection = self.collection()
-            queryset = collection.find()
+            # Use the shared instance instead of creating the collection
+            # for each request
+            queryset = self.collection.objects.find()
         else:
             raise ImproperlyConfigured("'%s' must define 'queryset' or 'collection'"
                                        % self.__class__.__name__)
@@ -0,0 +1,132 @@
+"""
+A tiny stand-in server which speaks enough of the Redis protocol to
+exercise the socket based cache backend in tests.
+"""
+import time
+import fnmatch
+import threading
+
+from djamo.utils.six.moves import socketserver
+
+
+class RESPHandler(socketserver.StreamRequestHandler):
+
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+
+        args = []
+        for i in range(int(line[1:-2])):
+            length = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(length + 2)[:-2])
+
+        return args
+
+    def reply(self, value):
+        if value is None:
+            data = b"$-1\r\n"
+        elif isinstance(value, bool):
+            data = b"+OK\r\n"
+        elif isinstance(value, int):
+            data = b":" + str(value).encode("ascii") + b"\r\n"
+        elif isinstance(value, list):
+            self.wfile.write(b"*" + str(len(value)).encode("ascii") + b"\r\n")
+            for item in value:
+                self.reply(item)
+            return
+        else:
+            data = b"$" + str(len(value)).encode("ascii") + b"\r\n" + \
+                   value + b"\r\n"
+
+        self.wfile.write(data)
+
+    def handle(self):
+        while True:
+            args = self.read_command()
+            if args is None:
+                return
+
+            command = args[0].decode("ascii").upper()
+            handler = getattr(self.server, "command_%s" % command.lower(),
+                              None)
+
+            if handler is None:
+                self.wfile.write(b"-ERR unknown command\r\n")
+            else:
+                self.reply(handler(*args[1:]))
+
+
+class RESPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """
+    Stand-in server, start it using ``start`` and use its ``port``.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        socketserver.TCPServer.__init__(self, ("127.0.0.1", 0), RESPHandler)
+        self.port = self.server_address[1]
+        self.data = {}
+        self.commands = 0
+        self._lock = threading.Lock()
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def _alive(self, key):
+        value, expire_time = self.data.get(key, (None, None))
+        if expire_time is not None and expire_time <= time.time():
+            del self.data[key]
+            return None
+        return value
+
+    def command_ping(self):
+        return True
+
+    def command_select(self, db):
+        return True
+
+    def command_get(self, key):
+        with self._lock:
+            self.commands += 1
+            return self._alive(key)
+
+    def command_set(self, key, value, *args):
+        expire_time = None
+        if args and args[0].upper() == b"EX":
+            expire_time = time.time() + int(args[1])
+
+        with self._lock:
+            self.commands += 1
+            self.data[key] = (value, expire_time)
+        return True
+
+    def command_del(self, *keys):
+        with self._lock:
+            return len([self.data.pop(key) for key in keys
+                        if key in self.data])
+
+    def command_incr(self, key):
+        with self._lock:
+            value = int(self._alive(key) or 0) + 1
+            self.data[key] = (str(value).encode("ascii"), None)
+            return value
+
+    def command_scan(self, cursor, *args):
+        pattern = b"*"
+        if b"MATCH" in args:
+            pattern = args[list(args).index(b"MATCH") + 1]
+
+        with self._lock:
+            keys = [key for key in list(self.data)
+                    if fnmatch.fnmatchcase(key.decode("utf-8"),
+                                           pattern.decode("utf-8"))]
+        return [b"0", keys]
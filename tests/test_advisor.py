@@ -0,0 +1,101 @@
+import os
+import tempfile
+
+from djamo import Index
+from djamo.advisor import QueryShape, QueryRecorder, advise, winning_plan
+from djamo.cursor import Cursor
+
+from .test_cursor import Posts, RawCursor
+
+
+class Students(object):
+    """
+    Stand-in for a collection class which only declares indexes.
+    """
+    indexes = [Index("name"), Index([("age", 1), ("uid", 1)]),
+               Index("nick")]
+
+
+class TestAdvisor:
+
+    def test_shapes(self):
+        print("\nShapes --------------")
+        shape = QueryShape.from_query("find", {"name": "Okarin",
+                                               "age": {"$gt": 18},
+                                               "uid": {"$in": [1, 2]},
+                                               "$where": "true"},
+                                      [("rank", -1)])
+
+        assert shape.equality == ("name", "uid")
+        assert shape.ranges == ("age",)
+        assert shape == QueryShape.from_query("find",
+                                              {"name": "Kurisu",
+                                               "age": {"$gt": 17},
+                                               "uid": {"$in": [3]}},
+                                              [("rank", -1)])
+
+        # Equality, sort and then range
+        assert shape.index_keys() == [("name", 1), ("uid", 1),
+                                      ("rank", -1), ("age", 1)]
+        assert shape.supported_by([("uid", 1), ("name", 1), ("rank", 1),
+                                   ("age", 1)])
+        assert not shape.supported_by([("name", 1), ("rank", -1)])
+
+        shape = QueryShape.from_query("find", {"age": {"$gt": 18}})
+        assert shape.supported_by([("age", 1), ("uid", 1)])
+        assert not shape.supported_by([("name", 1)])
+
+    def test_advise(self):
+        print("Advise --------------")
+        recorder = QueryRecorder(enabled=True)
+        students = Students()
+
+        recorder.record(students, "find", {"name": "Okarin"})
+        recorder.record(students, "find", {"age": {"$gte": 18}},
+                        elapsed=0.1)
+        for i in range(3):
+            recorder.record(students, "update", {"email": "a@b.c",
+                                                 "age": {"$lt": i}},
+                            elapsed=0.5)
+
+        stats = recorder.shapes(Students)
+        assert sum(i.count for i in stats.values()) == 5
+
+        advice = advise(recorder)
+        assert [(i.kind, i.index.name) for i in advice] == [
+            ("missing", "email_1_age_1"), ("unused", "nick_1")]
+        assert advice[0].shapes[0][1].count == 3
+
+        # Shapes of other processes
+        path = os.path.join(tempfile.mkdtemp(), "shapes")
+        recorder.dump(path)
+
+        other = QueryRecorder()
+        other.load(path)
+        other.load(path)
+        assert sum(i.count for i in other.shapes(Students).values()) == 10
+
+    def test_cursor(self):
+        print("Cursor recording --------------")
+        from djamo.advisor import recorder
+
+        posts = Posts()
+        cursor = Cursor(posts, RawCursor([{"title": "a"}]))
+
+        with recorder.recording(samples=True):
+            cursor.record({"title": "a"})
+            assert len(list(cursor)) == 1
+
+        shapes = recorder.shapes(Posts)
+        recorder.clear()
+
+        assert list(shapes) == [QueryShape("find", ("title",), (), ())]
+        assert list(shapes.values())[0].sample == {"title": "a"}
+
+    def test_winning_plan(self):
+        print("Winning plan --------------")
+        assert winning_plan({"cursor": "BasicCursor"}) == "BasicCursor"
+        assert winning_plan({"queryPlanner": {"winningPlan": {
+            "stage": "FETCH",
+            "inputStage": {"stage": "IXSCAN", "indexName": "age_1"}}}}) \
+            == "FETCH <- IXSCAN age_1"
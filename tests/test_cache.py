@@ -0,0 +1,237 @@
+import os
+import tempfile
+
+from djamo.cache import (LRUCache, SerializerCache, LocalBackend,
+                         SharedMemoryBackend, RedisBackend, JSONCodec)
+
+from .resp_server import RESPServer
+
+
+class FakeTimer(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestCache:
+
+    def test_lru_eviction(self):
+        print("\nLRU eviction --------------")
+        c = LRUCache(max_entries=3)
+
+        for i in range(3):
+            c.set(i, "value%s" % i)
+
+        # Touch 0 so 1 would be the least recently used entry
+        assert c.get(0) == "value0"
+        c.set(3, "value3")
+
+        assert len(c) == 3
+        assert c.get(1) is None
+        assert c.get(0) == "value0"
+        assert c.stats.evictions == 1
+
+    def test_max_bytes(self):
+        print("Max bytes --------------")
+        c = LRUCache(max_entries=None, max_bytes=100,
+                     sizeof=lambda key, value: len(value))
+
+        c.set("a", "x" * 60)
+        c.set("b", "x" * 30)
+        c.set("c", "x" * 30)
+
+        assert c.size <= 100
+        assert c.get("a") is None
+        assert c.get("b") and c.get("c")
+
+        # An entry that never fit should not be stored
+        assert not c.set("d", "x" * 101)
+        assert c.get("d") is None
+
+    def test_ttl(self):
+        print("TTL --------------")
+        timer = FakeTimer()
+        c = LRUCache(ttl=10, timer=timer)
+
+        c.set("a", 1)
+        timer.now += 5
+        assert c.get("a") == 1
+
+        timer.now += 6
+        assert c.get("a") is None
+        assert c.stats.expirations == 1
+        assert len(c) == 0
+
+    def test_counters(self):
+        print("Counters --------------")
+        c = LRUCache()
+        c.set("a", 1)
+        c.get("a")
+        c.get("b")
+
+        # Unhashable keys are always a miss
+        c.set({}, 1)
+        c.get({})
+
+        assert c.stats.as_dict() == {"hits": 1, "misses": 2,
+                                     "evictions": 0, "expirations": 0,
+                                     "errors": 0}
+
+    def test_namespaces(self):
+        print("Namespaces --------------")
+        cache = SerializerCache({"max_entries": 2,
+                                 "namespaces": {"DjangoUser":
+                                                {"max_entries": 10}}})
+
+        for i in range(5):
+            cache.set("DjangoUser", i, i)
+            cache.set("EmbeddedDocument", i, i)
+
+        assert cache.get("DjangoUser", 1) == 1
+        assert cache.get("EmbeddedDocument", 1) is None
+
+        stats = cache.stats()
+        assert stats["DjangoUser"]["entries"] == 5
+        assert stats["EmbeddedDocument"]["entries"] == 2
+        assert stats["EmbeddedDocument"]["evictions"] == 3
+
+        cache.clear()
+        assert cache.get("DjangoUser", 1) is None
+
+
+class TestBackends:
+
+    def shm_fixture(self, **kwargs):
+        path = os.path.join(tempfile.mkdtemp(), "djamo-cache")
+        return SharedMemoryBackend(path=path, **kwargs)
+
+    def test_serializer_cache_backend(self):
+        print("\nBackend config --------------")
+        cache = SerializerCache({"backend": "local", "max_entries": 1})
+        assert isinstance(cache.backend, LocalBackend)
+
+        backend = self.shm_fixture()
+        cache = SerializerCache({"backend": backend})
+        cache.set("DjangoUser", 1, "user")
+        assert cache.get("DjangoUser", 1) == "user"
+
+    def test_null_values(self):
+        print("Null values --------------")
+        missing = object()
+
+        for backend in (LocalBackend(), self.shm_fixture(),
+                        self.shm_fixture(codec=JSONCodec())):
+            cache = SerializerCache({"backend": backend})
+
+            # A cached None is not a miss
+            cache.set("DjangoUser", 1, None)
+            assert cache.get("DjangoUser", 1, missing) is None
+            assert cache.get("DjangoUser", 2, missing) is missing
+
+            cache.set("DjangoUser", 3, "__djamo_null__")
+            assert cache.get("DjangoUser", 3) == "__djamo_null__"
+
+    def test_shared_memory(self):
+        print("Shared memory --------------")
+        backend = self.shm_fixture(slots=64, slot_size=256)
+
+        backend.set("DjangoUser", 1, {"name": "Okarin"})
+        backend.set("EmbeddedDocument", 1, [1, 2])
+
+        assert backend.get("DjangoUser", 1) == {"name": "Okarin"}
+        assert backend.get("DjangoUser", 2) is None
+
+        # Values bigger than a slot would not be cached
+        assert not backend.set("DjangoUser", 3, "x" * 1024)
+
+        backend.clear("DjangoUser")
+        assert backend.get("DjangoUser", 1) is None
+        assert backend.get("EmbeddedDocument", 1) == [1, 2]
+
+    def test_shared_memory_between_processes(self):
+        print("Shared memory between processes --------------")
+        backend = self.shm_fixture()
+
+        pid = os.fork()
+        if pid == 0:
+            backend.set("DjangoUser", 42, "from child")
+            os._exit(0)
+
+        os.waitpid(pid, 0)
+
+        other = SharedMemoryBackend(path=backend.path)
+        assert other.get("DjangoUser", 42) == "from child"
+
+    def test_shared_memory_header(self):
+        print("Shared memory header --------------")
+        backend = self.shm_fixture(slots=64, slot_size=256)
+        backend.set("DjangoUser", 1, "user")
+
+        same = SharedMemoryBackend(path=backend.path, slots=64,
+                                   slot_size=256)
+        assert same.get("DjangoUser", 1) == "user"
+
+        for options in ({"slots": 32, "slot_size": 256},
+                        {"slots": 64, "slot_size": 256,
+                         "codec": JSONCodec()}):
+            try:
+                SharedMemoryBackend(path=backend.path, **options)
+                assert False, "ValueError expected"
+            except ValueError:
+                pass
+
+    def test_shared_memory_names(self):
+        print("Shared memory names --------------")
+        from djamo.cache import ResultCache
+        from djamo.cache._shm import default_path
+
+        assert default_path() != default_path("results")
+
+        cache = ResultCache({"backend": "shared_memory",
+                             "versions": {"backend": "shared_memory"}})
+        assert cache.cache._get_config()["name"] == "results"
+        assert cache.versions._get_config()["name"] == "versions"
+
+    def test_redis(self):
+        print("Redis protocol --------------")
+        server = RESPServer().start()
+
+        try:
+            backend = RedisBackend(port=server.port, codec=JSONCodec())
+
+            assert backend.set("DjangoUser", 1, {"name": "Okarin"})
+            assert backend.get("DjangoUser", 1) == {"name": "Okarin"}
+            assert backend.get("DjangoUser", 2) is None
+
+            # Another process would see the same value
+            other = RedisBackend(port=server.port, codec=JSONCodec())
+            assert other.get("DjangoUser", 1) == {"name": "Okarin"}
+
+            backend.set("EmbeddedDocument", 1, 1)
+            backend.clear("DjangoUser")
+            assert backend.get("DjangoUser", 1) is None
+            assert backend.get("EmbeddedDocument", 1) == 1
+
+            assert backend.stats()["DjangoUser"]["hits"] == 1
+
+            # Counters are plain integers on the server
+            assert backend.counter("Posts", "version") is None
+            assert backend.incr("Posts", "version") == 1
+            assert other.incr("Posts", "version") == 2
+            assert backend.counter("Posts", "version") == 2
+
+        finally:
+            server.stop()
+
+        # A dead server is just a cache miss
+        backend = RedisBackend(port=server.port)
+        assert backend.get("EmbeddedDocument", 1) is None
+        assert not backend.set("EmbeddedDocument", 1, 1)
+        assert backend.stats()["EmbeddedDocument"]["errors"] == 2
+
+        backend.clear("EmbeddedDocument")
+        backend.clear()
+        assert backend.stats()["EmbeddedDocument"]["errors"] == 3
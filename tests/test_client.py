@@ -0,0 +1,107 @@
+import time
+
+import pymongo
+
+from djamo.base import Client
+from djamo import Collection, Document
+
+
+class Student(Document):
+    pass
+
+
+class Students(Collection):
+    document = Student
+
+
+class TestClient:
+
+    def fixture(self, **config):
+        config.setdefault("name", "djamo_test")
+        config.setdefault("heartbeat_interval", None)
+        return Client(config=config)
+
+    def test_health_check(self):
+        print("\nHealth check --------------")
+        client = self.fixture()
+
+        assert client.ping()
+        assert client.is_healthy
+
+        stats = client.pool_stats()
+        assert stats["pings"] == 1 and stats["ping_failures"] == 0
+        print("PING: %f" % stats["last_latency"])
+
+    def test_recycle(self):
+        print("Recycle --------------")
+        client = self.fixture(max_age=0)
+        c = Students(client=client)
+
+        c.insert({"name": "Okarin"})
+        client.recycle_if_expired()
+
+        # Collections keep working with the recycled pool
+        start = time.time()
+        assert c.find_one({"name": "Okarin"}) is not None
+        stop = time.time()
+        print("FIRST QUERY AFTER RECYCLE: %f" % (stop - start))
+
+
+class FakeConnection(object):
+    """
+    Stand-in for a MongoClient which records how it's closed.
+    """
+
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class LegacyConnection(FakeConnection):
+
+    def disconnect(self):
+        self.disconnected = True
+
+
+class TestPool:
+
+    def fixture(self):
+        return Client(config={"name": "djamo_test",
+                              "heartbeat_interval": None, "max_age": 0})
+
+    def test_recycle(self):
+        print("\nPool recycle --------------")
+        client = self.fixture()
+        old = client._connection = FakeConnection()
+
+        expire_time = client.expire_time
+        client.recycle_if_expired()
+
+        # Other threads may still use the client, it's never closed
+        assert not old.closed
+        assert client._connection is old
+        assert client.generation == 0
+        assert client.stats.recycles == 0
+        assert client.expire_time >= expire_time
+
+    def test_idle_time(self):
+        print("Idle time --------------")
+        client = Client(config={"name": "djamo_test", "max_age": 30,
+                                "heartbeat_interval": None})
+
+        if pymongo.version_tuple[0] >= 3:
+            # The driver retires the idle connections
+            assert client.pool_options["maxIdleTimeMS"] == 30000
+
+    def test_legacy_recycle(self):
+        print("Legacy pool recycle --------------")
+        client = self.fixture()
+        old = client._connection = LegacyConnection()
+
+        client.recycle()
+        assert old.disconnected and not old.closed
+        assert client._connection is old
+        assert client.generation == 0
+        assert client.stats.recycles == 1
@@ -3,8 +3,12 @@ import sys
 
 from djamo.base import Client
 from djamo import Collection, Document, Index
+from djamo.identity import identity_map
+from djamo.index import sync_indexes, diff_indexes
 from djamo.serializers import *
 
+from .test_document import Box, CountingSerializer
+
 
 class Student(Document):
     pass
@@ -59,6 +63,82 @@ class TestCollection:
         stop = time.time()
         print("MASS INSERT: %f" % (stop - start))
 
+    def test_stream_insert(self):
+        print("Stream insert------------------------")
+        c = self.fixture()
+
+        def students():
+            for i in range(200000):
+                yield Student({"name": "Monkey .D Luffy%s" % i,
+                               "ttl": i/2000})
+
+        start = time.time()
+        results = list(c.insert_stream(students(), batch_size=5000))
+        stop = time.time()
+
+        assert len(results) == 40
+        assert all(i.ok for i in results)
+        assert sum(len(i.ids) for i in results) == 200000
+        print("STREAM INSERT: %f" % (stop - start))
+
+    def test_stream_insert_errors(self):
+        print("Stream insert errors------------------------")
+        c = self.fixture()
+
+        docs = [{"_id": "stream-%s" % i} for i in range(10)]
+        docs.append({"_id": "stream-0"})
+
+        results = list(c.insert_stream(docs, batch_size=5,
+                                       stop_on_error=False))
+
+        assert [i.ok for i in results] == [True, True, False]
+        assert results[2].count == 1
+
+    def test_parallel_insert(self):
+        print("Parallel insert------------------------")
+        c = self.fixture()
+
+        def wrap(i):
+            a = Student({"name": "Monkey .D Luffy%s" % i,
+                         "ttl": i/2000})
+            a.age = a.ttl * 4
+            return a
+
+        l = [wrap(i) for i in range(200000)]
+
+        start = time.time()
+        ids = c.insert(l, processes=4, batch_size=5000)
+        stop = time.time()
+
+        assert len(ids) == 200000
+        print("PARALLEL INSERT: %f" % (stop - start))
+
+    def test_bulk(self):
+        print("Bulk --------------")
+        c = self.fixture()
+        c.remove({"bulk": True})
+
+        bulk = c.bulk(ordered=False, batch_size=500)
+
+        start = time.time()
+        for i in range(2000):
+            bulk.insert({"_id": "bulk-%s" % i, "bulk": True, "rank": i})
+        bulk.insert({"_id": "bulk-0", "bulk": True})
+
+        bulk.find({"_id": "bulk-1"}).update_one({"$set": {"rank": -1}})
+        bulk.find({"_id": "bulk-new"}).upsert().update_one(
+            {"$set": {"bulk": True}})
+        bulk.find({"bulk": True, "rank": {"$gte": 1000}}).remove()
+
+        result = bulk.execute()
+        stop = time.time()
+
+        assert result.n_inserted == 2000
+        assert result.n_upserted == 1
+        assert result.n_removed == 1000
+        assert [i[0] for i in result.errors] == [2000]
+        print("BULK: %f" % (stop - start))
+
     def test_find(self):
         print("Find --------------")
         c = self.fixture()
@@ -68,6 +148,26 @@ class TestCollection:
         stop = time.time()
         print("FIND: %f" % (stop - start))
 
+    def test_find_one(self):
+        print("Find one --------------")
+        c = self.fixture()
+        _id = c.insert(Student({"name": "Okabe"}))
+
+        start = time.time()
+        for i in range(1000):
+            doc = c.find_one(_id)
+        stop = time.time()
+
+        assert isinstance(doc, Student)
+        assert doc.name == "Okabe"
+        assert c.find_one({"name": "Okabe"})["_id"] == _id
+        assert c.find_one({"name": "Not There"}) is None
+
+        # Specs of a single _id use the identity map too
+        with identity_map.scope():
+            assert c.find_one({"_id": _id}) is c.find_one(_id)
+        print("FIND ONE x1000: %f" % (stop - start))
+
     def test_get_all(self):
         print("Find All --------------")
         c = self.fixture()
@@ -121,11 +221,17 @@ class TestCollection:
         c.save(a)
         stop1 = time.time()
 
+        # Saved documents only send their changes
         a.name = "itachi"
+        assert a.serialize_update() == {"$set": {"name": "itachi"}}
+
         start2 = time.time()
         c.save(a)
         stop2 = time.time()
 
+        saved = c.find_one(a["_id"])
+        assert saved.name == "itachi" and saved.age == 20
+
         print("Save: %f" % (stop1 - start1))
         print("Second Save: %f" % (stop2 - start2))
 
@@ -133,6 +239,8 @@ class TestCollection:
         print("Indexing --------------")
         client = Client(config={"name": "djamo_test"})
         c = IStudents(client=client)
+        sync_indexes([c], background=False)
+        assert diff_indexes(c).in_sync
 
         def wrap(i):
             a = Student({"name": "Madara %s" % i,
@@ -152,3 +260,166 @@ class TestCollection:
         stop = time.time()
         print("%s found" % d)
         print("FIND WITH INDEX: %f" % (stop - start))
+
+
+class Player(Document):
+    fields = {
+        "box": CountingSerializer(),
+    }
+
+
+class TestWrites:
+    """
+    Write paths of collections using stand-ins of the PyMongo calls.
+    """
+
+    def fixture(self, monkeypatch, **calls):
+        from pymongo.collection import Collection as MongoCollection
+
+        for name, call in calls.items():
+            monkeypatch.setattr(MongoCollection, name, call, raising=False)
+
+        class Players(Collection):
+            document = Player
+
+        client = Client(config={"name": "djamo_test",
+                                "heartbeat_interval": None})
+        return Players(client=client)
+
+    def test_save_serializes(self, monkeypatch):
+        print("\nSave serializes --------------")
+        saved = []
+
+        def save(collection, data, *args, **kwargs):
+            saved.append(data)
+            return 7
+
+        players = self.fixture(monkeypatch, save=save)
+        doc = Player({"name": "Okarin"})
+        doc["box"] = Box(3)
+
+        assert players.save(doc) == 7
+        assert saved == [{"name": "Okarin", "box": 3}]
+        assert not isinstance(saved[0], Document)
+        assert doc["_id"] == 7 and doc.changed_keys == set()
+
+    def test_insert_ids(self, monkeypatch):
+        print("Insert ids --------------")
+
+        def insert(collection, data, *args, **kwargs):
+            return [i["_id"] for i in data]
+
+        players = self.fixture(monkeypatch, insert=insert)
+
+        # A single document gets its _id, lists get a list of them
+        assert players.insert(Player({"_id": 1, "name": "Okarin"})) == 1
+        assert players.insert([{"_id": 2}, {"_id": 3}]) == [2, 3]
+
+    def test_failed_update(self, monkeypatch):
+        print("Failed update --------------")
+
+        def update(collection, *args, **kwargs):
+            raise IOError("network")
+
+        players = self.fixture(monkeypatch, update=update)
+        doc = Player({"_id": 1, "name": "Okarin"})
+        doc.mark_clean()
+        doc.name = "Kyouma"
+
+        try:
+            players.update({"_id": 1}, doc)
+            assert False, "IOError expected"
+        except IOError:
+            pass
+
+        # A retry would send the same changes
+        assert doc.changed_keys == set(["name"])
+
+    def test_instrumented_errors(self, monkeypatch):
+        print("Instrumented errors --------------")
+        from djamo.instrumentation import instrumentation, HistogramListener
+
+        def insert(collection, data, *args, **kwargs):
+            return [i["_id"] for i in data]
+
+        players = self.fixture(monkeypatch, insert=insert)
+        histogram = instrumentation.register(HistogramListener(payload=True))
+
+        try:
+            try:
+                players.insert([42])
+                assert False, "Error expected"
+            except Exception:
+                pass
+
+            players.insert([{"_id": 1, "name": "Okarin"}])
+        finally:
+            instrumentation.unregister(histogram)
+
+        snapshot = histogram.snapshot()
+        key = (players.full_name, "insert")
+        assert snapshot["totals"][key]["errors"] == 1
+        assert snapshot["totals"][key]["documents"] == 1
+        assert snapshot["totals"][key]["payload"] > 0
+
+    def test_bulk_documents(self, monkeypatch):
+        print("Bulk documents --------------")
+        players = self.fixture(monkeypatch)
+        bulk = players.bulk(ordered=False)
+
+        docs = [Player({"name": "Okarin"}), {"name": "Kurisu"}]
+        bulk.insert(docs)
+        assert [i[1][0] for i in bulk._operations] == ["insert", "insert"]
+
+        # The caller's documents get the _id of their inserts
+        assert [i["_id"] for i in docs] == \
+            [i[1][1]["_id"] for i in bulk._operations]
+
+        # A replacement is a single document
+        bulk.find({"name": "Okarin"}).replace_one([{"name": "Kyouma"}])
+        assert len(bulk) == 3 and len(bulk._operations) == 2
+        assert isinstance(bulk.result.errors[0][1], TypeError)
+
+
+class FakePool(object):
+    """
+    Stand-in for a ``multiprocessing.Pool`` which runs the jobs at once.
+    """
+
+    class Job(object):
+
+        def __init__(self, value):
+            self.value = value
+
+        def get(self):
+            return self.value
+
+    def __init__(self, processes):
+        self._processes = processes
+        self.jobs = 0
+
+    def apply_async(self, func, args):
+        self.jobs += 1
+        return self.Job(func(*args))
+
+
+class TestParallel:
+
+    def test_inflight(self):
+        print("\nIn flight chunks --------------")
+        from djamo.collections.parallel import prepare_documents
+
+        docs = [{"name": "student%s" % i} for i in range(10)]
+
+        # Two chunks for the only worker of the pool, plus the new one
+        pool = FakePool(1)
+        batches = prepare_documents(Student, iter(docs), pool, 1)
+        next(batches)
+        assert pool.jobs == 3
+
+        pool = FakePool(1)
+        batches = prepare_documents(Student, iter(docs), pool, 1,
+                                    max_inflight=5)
+        next(batches)
+        assert pool.jobs == 6
+        assert sum(i[0] for i in batches) == 9
@@ -0,0 +1,187 @@
+import pytest
+from pymongo import ReadPreference
+
+from djamo import Collection, Document
+from djamo.connections import ConnectionHandler, Router, connections
+
+
+class Log(Document):
+    pass
+
+
+class Logs(Collection):
+    document = Log
+
+    class Meta:
+        connection = "archive"
+
+
+class Orders(Collection):
+    document = Log
+
+    class Meta:
+        read_connection = "analytics"
+        read_preference = "secondary"
+
+
+class Students(Collection):
+    document = Log
+
+
+class StudentsRouter(Router):
+
+    def write(self, collection):
+        if collection is Students:
+            return "hot"
+
+
+def settings(**kwargs):
+    config = {
+        "connections": {
+            "default": {"name": "djamo_test"},
+            "hot": {"name": "djamo_test", "port": 27018},
+            "archive": {"name": "djamo_archive"},
+            "analytics": {"name": "djamo_test",
+                          "read_preference": "secondary_preferred"},
+        },
+    }
+    for i in config["connections"].values():
+        i["heartbeat_interval"] = None
+
+    config.update(kwargs)
+    return config
+
+
+class TestConnections:
+
+    def teardown_method(self, method):
+        connections.configure(None)
+
+    def test_clients(self):
+        print("\nConnections --------------")
+        handler = ConnectionHandler(settings())
+
+        assert handler["archive"] is handler["archive"]
+        assert handler["archive"].db_name == "djamo_archive"
+
+        with pytest.raises(KeyError):
+            handler["missing"]
+
+        # Old style settings describe the default connection
+        handler = ConnectionHandler({"name": "djamo_test",
+                                     "heartbeat_interval": None})
+        assert handler["default"].db_name == "djamo_test"
+
+    def test_routing(self):
+        print("Routing --------------")
+        handler = ConnectionHandler(settings(router=StudentsRouter))
+
+        assert handler.route(Logs, "read") == "archive"
+        assert handler.route(Orders, "read") == "analytics"
+        assert handler.route(Orders, "write") == "default"
+        assert handler.route(Students, "write") == "hot"
+        assert handler.route(Students, "read") == "default"
+
+    def test_collections(self):
+        print("Collection connections --------------")
+        connections.configure(settings(router=StudentsRouter))
+
+        assert Logs().db.name == "djamo_archive"
+        assert Logs()._reader is None
+
+        orders = Orders()
+        assert orders._client is connections["default"]
+        assert orders._reader.database.client is \
+            connections["analytics"]._connection
+        assert orders._reader.read_preference == ReadPreference.SECONDARY
+
+        assert Students()._client is connections["hot"]
+
+    def test_lazy(self):
+        print("Lazy clients --------------")
+        handler = ConnectionHandler({"name": "djamo_test",
+                                     "heartbeat_interval": 60})
+        assert handler.all() == []
+
+        # Creating the client neither connects nor starts the monitor
+        client = handler["default"]
+        assert client._monitor is None
+
+        try:
+            # Neither does using it
+            client.get_database()
+            assert client._monitor is None
+
+            # warm_up starts it, without pinging a server here
+            client._start_monitor()
+            assert client._monitor.is_alive()
+        finally:
+            client.close()
+
+        from djamo import db
+        assert repr(db.client) == "<LazyClient 'default'>"
+
+    def test_fork(self):
+        print("Fork --------------")
+        handler = ConnectionHandler({"name": "djamo_test",
+                                     "heartbeat_interval": None})
+        client = handler["default"]
+        collection = Students(client=client)
+        old = client._connection
+
+        assert not client.check_fork()
+
+        # Pretend that the client is inherited from a parent process
+        client._pid = -1
+        collection._check_client()
+
+        assert client.generation == 1
+        assert client._connection is not old
+        assert collection.db is client.get_database()
+        assert collection.database.client is client._connection
+        assert not client.check_fork()
+
+    def test_objects(self):
+        print("Shared collections --------------")
+        from djamo.collections.registry import registry
+
+        connections.configure(settings())
+        students = Students.objects
+        assert isinstance(students, Students)
+        assert Students.objects is students
+        assert Logs.objects is not students
+
+        # Forked processes create their own instances
+        registry._pid = -1
+        assert Students.objects is not students
+
+        students = Students.objects
+        connections.configure(settings())
+        assert Students.objects is not students
+
+    def test_fork_threads(self):
+        print("Fork threads --------------")
+        import threading
+
+        client = ConnectionHandler({"name": "djamo_test",
+                                    "heartbeat_interval": None})["default"]
+        client._pid = -1
+
+        start = threading.Event()
+        connections = []
+
+        def first_call():
+            start.wait()
+            client.get_database()
+            connections.append(client._connection)
+
+        threads = [threading.Thread(target=first_call) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        start.set()
+        for thread in threads:
+            thread.join()
+
+        # Only one of the threads re-creates the MongoClient
+        assert client.generation == 1
+        assert set(connections) == set([client._connection])
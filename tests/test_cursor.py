@@ -0,0 +1,279 @@
+import pytest
+
+import os
+import tempfile
+
+from djamo import Document
+from djamo.cache import serializer_cache, ResultCache, SharedMemoryBackend
+from djamo.cursor import Cursor
+from djamo.options import Options
+from djamo.serializers import Serializer
+
+from .test_document import Box, CountingSerializer
+
+
+class BatchSerializer(Serializer):
+    """
+    Serializer which de-serializes its values in batches and records the
+    batches.
+    """
+    batch_deserialize = True
+
+    def __init__(self, *args, **kwargs):
+        self.batches = []
+        super(BatchSerializer, self).__init__(*args, **kwargs)
+
+    def deserialize(self, value):
+        self.batches.append([value])
+        return Box(value)
+
+    def deserialize_many(self, values):
+        self.batches.append(sorted(values))
+        # Negative values are missing
+        return dict((i, Box(i)) for i in values if i >= 0)
+
+    def is_valid_value(self, value):
+        return isinstance(value, Box)
+
+
+class Post(Document):
+    fields = {
+        "author": BatchSerializer(),
+        "editor": CountingSerializer(),
+    }
+
+
+class NullSerializer(BatchSerializer):
+    """
+    Like ``DjangoUser(missing="null")``, negative values are None.
+    """
+
+    def deserialize_many(self, values):
+        self.batches.append(sorted(values))
+        return dict((i, Box(i) if i >= 0 else None) for i in values)
+
+
+class Review(Document):
+    fields = {
+        "reviewer": NullSerializer(),
+    }
+
+
+class Reviews(object):
+
+    def _get_document(self):
+        return Review
+
+
+class Posts(object):
+    """
+    Stand-in for a collection which only provides the document.
+    """
+
+    def _get_document(self):
+        return Post
+
+
+class RawCursor(object):
+    """
+    Stand-in for a PyMongo cursor over a list of raw results.
+    """
+
+    def __init__(self, docs):
+        self.docs = docs
+        self._iter = iter(docs)
+
+    def limit(self, limit):
+        self.docs = self.docs[:limit]
+        self._iter = iter(self.docs)
+
+    def __iter__(self):
+        return self._iter
+
+    def __next__(self):
+        return next(self._iter)
+
+    next = __next__
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return RawCursor(self.docs[index])
+        return self.docs[index]
+
+    def count(self, with_limit_and_skip=False):
+        return len(self.docs)
+
+
+class TestCursor:
+
+    def setup_method(self, method):
+        serializer_cache.configure({"max_entries": 0})
+        Post._fields["author"].batches = []
+        Post._fields["editor"].calls = 0
+
+    def teardown_method(self, method):
+        serializer_cache.configure(None)
+
+    def fixture(self, count=5, **kwargs):
+        docs = [{"title": "post%s" % i, "author": i % 3, "editor": 1}
+                for i in range(count)]
+        return Cursor(Posts(), RawCursor(docs), batch_size=2, **kwargs)
+
+    def test_batches(self):
+        print("\nBatches --------------")
+        serializer = Post._fields["author"]
+        cursor = self.fixture()
+
+        first = next(cursor)
+        assert isinstance(first, Post)
+        assert serializer.batches == [[0, 1]]
+
+        posts = [first] + list(cursor)
+        assert [i.title for i in posts] == ["post%s" % i for i in range(5)]
+        assert serializer.batches == [[0, 1], [0, 2], [1]]
+
+        # Prefetched values never de-serialize again
+        assert [i.author.value for i in posts] == [0, 1, 2, 0, 1]
+        assert len(serializer.batches) == 3
+
+    def test_cached_values(self):
+        print("Cached values --------------")
+        serializer_cache.configure({})
+        serializer = Post._fields["author"]
+
+        # Only the values which are not in the cache get fetched
+        list(self.fixture())
+        assert serializer.batches == [[0, 1], [2]]
+
+        serializer.batches = []
+        list(self.fixture())
+        assert serializer.batches == []
+
+    def test_delegation(self):
+        print("Delegation --------------")
+        cursor = self.fixture()
+
+        assert cursor.count() == 5
+        assert cursor[3].title == "post3"
+        assert [i.title for i in cursor[1:3]] == ["post1", "post2"]
+        assert isinstance(cursor.collection, Posts)
+
+    def test_prefetch(self):
+        print("Prefetch --------------")
+        serializer = Post._fields["editor"]
+
+        posts = list(self.fixture(prefetch=["editor"]))
+        assert serializer.calls == 3
+
+        # The editors were de-serialized once per batch
+        assert [i.editor.value for i in posts] == [1] * 5
+        assert serializer.calls == 3
+
+        with pytest.raises(KeyError):
+            self.fixture().prefetch("title")
+
+    def test_missing_values(self):
+        print("Missing values --------------")
+        serializer = Post._fields["author"]
+        docs = [{"author": -1}, {"author": 1}]
+
+        posts = list(Cursor(Posts(), RawCursor(docs)))
+        assert serializer.batches == [[-1, 1]]
+
+        # Missing values de-serialize one by one on access
+        assert posts[0].author.value == -1
+        assert serializer.batches == [[-1, 1], [-1]]
+
+    def test_null_values(self):
+        print("Null values --------------")
+        serializer_cache.configure({})
+        serializer = Review._fields["reviewer"]
+        docs = [{"reviewer": -1}, {"reviewer": 1}]
+
+        for i in range(2):
+            reviews = list(Cursor(Reviews(), RawCursor(docs)))
+            assert reviews[0].reviewer is None
+            assert reviews[1].reviewer.value == 1
+
+        # Known missing values are cached too
+        assert serializer.batches == [[-1, 1]]
+        assert Review({"reviewer": -1}).reviewer is None
+        assert serializer.batches == [[-1, 1]]
+
+    def test_meta_options(self):
+        print("Meta options --------------")
+
+        class Meta:
+            prefetch = ["editor"]
+
+        assert Options(Meta).prefetch == ["editor"]
+
+
+class CachedPosts(Posts):
+    full_name = "djamo_test.cached_posts"
+
+    def __init__(self, **config):
+        self.result_cache = ResultCache(config)
+
+
+class TestResultCache:
+
+    def fixture(self, collection, titles, **kwargs):
+        docs = [{"title": i} for i in titles]
+        query = {"spec": {"author": 1}, "fields": None, "args": (),
+                 "options": {}, "modifiers": []}
+        return Cursor(collection, RawCursor(docs), query=query, **kwargs)
+
+    def titles(self, cursor):
+        return [i.title for i in cursor]
+
+    def test_read_through(self):
+        print("\nResult cache --------------")
+        posts = CachedPosts()
+
+        cursor = self.fixture(posts, ["a", "b"])
+        assert self.titles(cursor) == ["a", "b"]
+        assert cursor.count() == 2
+
+        # The same query never reaches the server cursor again
+        assert self.titles(self.fixture(posts, ["c"])) == ["a", "b"]
+        assert self.fixture(posts, []).count() == 2
+
+        # Modifiers are a part of the key
+        cursor = self.fixture(posts, ["c", "d"]).limit(1)
+        assert self.titles(cursor) == ["c"]
+
+        posts.result_cache.invalidate(posts.full_name)
+        assert self.titles(self.fixture(posts, ["e"])) == ["e"]
+
+    def test_max_results(self):
+        print("Result cache max results --------------")
+        posts = CachedPosts(max_results=2)
+
+        cursor = self.fixture(posts, ["a", "b", "c"], batch_size=1)
+        assert self.titles(cursor) == ["a", "b", "c"]
+        assert self.titles(self.fixture(posts, ["d"])) == ["d"]
+
+    def test_cached_values_are_copies(self):
+        print("Result cache copies --------------")
+        posts = CachedPosts()
+
+        doc = list(self.fixture(posts, ["a"]))[0]
+        doc.title = "changed"
+
+        assert self.titles(self.fixture(posts, [])) == ["a"]
+
+    def test_shared_versions(self):
+        print("Result cache shared versions --------------")
+        path = os.path.join(tempfile.mkdtemp(), "djamo-cache")
+        versions = {"backend": SharedMemoryBackend(path=path)}
+
+        # Two processes with their own results and the same counters
+        first = CachedPosts(versions=versions)
+        second = CachedPosts(versions=versions)
+
+        self.titles(self.fixture(first, ["a"]))
+        self.titles(self.fixture(second, ["a"]))
+
+        first.result_cache.invalidate(first.full_name)
+        assert self.titles(self.fixture(second, ["b"])) == ["b"]
@@ -0,0 +1,246 @@
+import pytest
+
+from djamo import Document
+from djamo.document import parse_projection
+from djamo.cache import serializer_cache
+from djamo.serializers import Serializer
+
+
+class Box(object):
+
+    def __init__(self, value):
+        self.value = value
+
+
+class CountingSerializer(Serializer):
+    """
+    Serializer which wraps its values in a Box and counts its
+    de-serializations.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.calls = 0
+        super(CountingSerializer, self).__init__(*args, **kwargs)
+
+    def serialize(self, value, **kwargs):
+        return value.value
+
+    def deserialize(self, value):
+        self.calls += 1
+        return Box(value)
+
+    def is_valid_value(self, value):
+        return isinstance(value, Box)
+
+
+class Lazy(Document):
+    lazy = True
+    fields = {
+        "box": CountingSerializer(),
+    }
+
+
+class Student(Document):
+    fields = {
+        "box": CountingSerializer(),
+        "keys": CountingSerializer(),
+    }
+
+
+class Player(Document):
+    fields = {
+        "box": CountingSerializer(required=True),
+        "level": CountingSerializer(default=Box(1)),
+    }
+
+    def validate_box(self, value):
+        if value.value < 0:
+            raise ValueError("negative box")
+
+    def validate_nick(self, value):
+        if not value:
+            raise ValueError("empty nick")
+
+
+class TestDocument:
+
+    def setup_method(self, method):
+        serializer_cache.configure({"max_entries": 0})
+        Lazy._fields["box"].calls = 0
+
+    def teardown_method(self, method):
+        serializer_cache.configure(None)
+
+    def test_lazy_decoding(self):
+        print("\nLazy decoding --------------")
+        serializer = Lazy._fields["box"]
+
+        doc = Lazy()
+        doc["box"] = 10
+        assert serializer.calls == 0
+
+        # Documents which are never touched never decode
+        assert doc.serialize() == {"box": 10}
+        assert serializer.calls == 0
+
+        box = doc["box"]
+        assert isinstance(box, Box)
+        assert doc["box"] is box
+        assert doc.box is box
+        assert serializer.calls == 1
+
+        # A new raw value should be decoded again
+        doc["box"] = 11
+        assert doc["box"].value == 11
+        assert serializer.calls == 2
+
+    def test_cached_value(self):
+        print("Cached value --------------")
+        serializer_cache.configure({})
+        serializer = Lazy._fields["box"]
+
+        a = Lazy({"box": 20})
+        b = Lazy({"box": 20})
+
+        assert a["box"] is b["box"]
+        assert serializer.calls == 1
+
+    def test_attributes(self):
+        print("Attributes --------------")
+        doc = Student({"name": "narto"})
+
+        # Non field keys
+        assert doc.name == "narto"
+        doc.name = "itachi"
+        assert doc["name"] == "itachi"
+        assert "name" not in doc.__dict__
+
+        # Field keys
+        doc.box = Box(1)
+        assert doc["box"].value == 1
+        del doc.box
+        assert "box" not in doc
+
+        for action in (lambda: doc.box, lambda: delattr(doc, "box"),
+                       lambda: delattr(doc, "nothing")):
+            try:
+                action()
+                assert False, "AttributeError expected"
+            except AttributeError:
+                pass
+
+        del doc.name
+        assert "name" not in doc
+
+        # Fields never shadow the document methods
+        doc["keys"] = Box(2)
+        assert callable(doc.keys)
+
+    def test_plan(self):
+        print("Plan --------------")
+        assert [i[0] for i in Player._plan] == ["box", "level"]
+
+        doc = Player()
+        assert doc["level"].value == 1
+
+        with pytest.raises(CountingSerializer.ValidationError):
+            doc.validate()
+
+        doc.box = Box(-1)
+        with pytest.raises(ValueError):
+            doc.validate()
+
+        doc.box = Box(2)
+        doc.nick = ""
+        with pytest.raises(ValueError):
+            doc.validate()
+
+        doc.nick = "Okarin"
+        assert doc.serialize() == {"box": 2, "level": 1, "nick": "Okarin"}
+
+    def test_projection(self):
+        print("Projection --------------")
+        assert parse_projection(["name"]) == (frozenset(["name", "_id"]),
+                                              frozenset())
+        assert parse_projection({"_id": 0, "name": 1}) == \
+            (frozenset(["name"]), frozenset(["_id"]))
+        assert parse_projection({"bio": 0}) == (None, frozenset(["bio"]))
+        assert parse_projection({"name": 1, "box.value": 1}) == \
+            (frozenset(["name", "_id"]), frozenset(["box"]))
+        assert parse_projection({"comments": {"$slice": 5}}) == \
+            (None, frozenset(["comments"]))
+
+    def test_partial(self):
+        print("Partial --------------")
+        loaded, excluded = parse_projection(["box", "nick"])
+        doc = Player.partial({"_id": 1, "box": 2, "nick": "Okarin"},
+                             loaded, excluded)
+
+        assert doc.is_partial
+        assert doc.is_loaded("box") and not doc.is_loaded("level")
+
+        # The default of an unloaded key would overwrite the real value
+        assert "level" not in doc
+
+        # Required fields which are not loaded never fail
+        doc.validate()
+        assert doc.serialize_update() == {"$set": {"box": 2,
+                                                   "nick": "Okarin"}}
+
+        del doc.nick
+        doc.email = "okarin@example.com"
+        assert doc.serialize_update() == {
+            "$set": {"box": 2, "email": "okarin@example.com"},
+            "$unset": {"nick": 1}}
+
+        assert not Player().is_partial
+
+    def test_changes(self):
+        print("Changes --------------")
+        doc = Student({"_id": 1, "name": "narto", "tags": ["ninja"],
+                       "box": 2})
+        assert doc.changed_keys is None
+
+        doc.mark_clean()
+        assert doc.serialize_update() == {"$set": {"tags": ["ninja"]}}
+
+        doc.name = "itachi"
+        doc.box = Box(3)
+        del doc.tags
+        doc.update({"rank": "jonin"})
+
+        assert doc.changed_keys == set(["name", "box", "tags", "rank"])
+        assert doc.serialize_update() == {
+            "$set": {"name": "itachi", "box": 3, "rank": "jonin"},
+            "$unset": {"tags": 1}}
+
+        doc.mark_clean()
+        assert doc.serialize_update() == {}
+
+    def test_loaded_changes(self):
+        print("Loaded changes --------------")
+        import copy
+
+        doc = Student({"_id": 1, "name": "narto", "box": 2})
+        doc.mark_clean()
+
+        # Copies and de-serialized documents are not changed by building
+        for other in (copy.copy(doc), copy.deepcopy(doc),
+                      Student().deserialize(dict(doc))):
+            assert other.serialize() == {"_id": 1, "name": "narto", "box": 2}
+            assert other.changed_keys == set()
+            assert other.serialize_update() == {}
+
+        doc.name = "itachi"
+        other = copy.deepcopy(doc)
+        assert other.changed_keys == set(["name"])
+
+        # Changes of a copy are its own
+        other.rank = "jonin"
+        assert doc.changed_keys == set(["name"])
+
+        loaded = Student({"name": "narto"})
+        loaded.mark_clean()
+        loaded.deserialize({"_id": 2, "name": "sasuke"})
+        assert loaded.changed_keys == set()
+        assert loaded.name == "sasuke" and "box" not in loaded
@@ -0,0 +1,121 @@
+import threading
+
+from djamo import Document
+from djamo.cursor import Cursor
+from djamo.identity import IdentityMap, identity_map
+
+from .test_cursor import Posts, RawCursor
+
+
+class Students(object):
+    full_name = "djamo_test.students"
+
+
+class TestIdentityMap:
+
+    def test_scope(self):
+        print("\nIdentity map scope --------------")
+        m = IdentityMap(enabled=False)
+        c = Students()
+        a = Document({"_id": 1})
+
+        # Inactive maps keep nothing
+        assert m.add(c, a) is a
+        assert m.get(c, 1) is None
+
+        with m.scope():
+            assert m.add(c, a) is a
+            assert m.add(c, Document({"_id": 1})) is a
+
+            with m.scope():
+                assert m.get(c, 1) is a
+
+            assert m.get(c, 1) is a
+
+            # Other threads have their own map
+            result = []
+            t = threading.Thread(target=lambda: result.append(m.get(c, 1)))
+            t.start()
+            t.join()
+            assert result == [None]
+
+        assert m.get(c, 1) is None
+
+    def test_invalidation(self):
+        print("Identity map invalidation --------------")
+        m = IdentityMap(enabled=True)
+        c = Students()
+
+        # Outside of requests nothing will be kept
+        m.add(c, Document({"_id": 0}))
+        assert m.get(c, 0) is None
+
+        m.begin_request()
+        for i in range(3):
+            m.add(c, Document({"_id": i}))
+
+        m.discard(c, [0, {"unhashable": 1}])
+        assert m.get(c, 0) is None
+        assert m.get(c, 1) is not None
+
+        m.discard(c)
+        assert m.get(c, 1) is None
+
+        m.add(c, Document({"_id": 1}))
+        m.clear()
+        assert m.get(c, 1) is None
+
+        m.add(c, Document({"_id": 1}))
+        m.end_request()
+        assert not m.active
+
+    def test_cursor(self):
+        print("Identity map cursor --------------")
+        docs = [{"_id": 1, "title": "first"}, {"_id": 2, "title": "second"}]
+        posts = Posts()
+        posts.full_name = "djamo_test.posts"
+
+        with identity_map.scope():
+            first = list(Cursor(posts, RawCursor(docs)))
+            second = list(Cursor(posts, RawCursor(docs)))
+            assert first[0] is second[0]
+            assert first[1] is second[1]
+
+            # Partial results never replace the loaded documents
+            partial = list(Cursor(posts, RawCursor(docs), fields=["title"]))
+            assert partial[0] is not first[0]
+
+    def test_stream(self, monkeypatch):
+        print("Identity map stream --------------")
+        from pymongo.collection import Collection as MongoCollection
+
+        from djamo import Collection
+        from djamo.base import Client
+
+        threads = []
+
+        def insert(collection, docs, *args, **kwargs):
+            threads.append(threading.current_thread())
+            return [doc.setdefault("_id", i) for i, doc in enumerate(docs)]
+
+        # Inserts are the only server calls of the stream
+        monkeypatch.setattr(MongoCollection, "insert", insert, raising=False)
+
+        class Logs(Collection):
+            document = Document
+
+        client = Client(config={"name": "djamo_test",
+                                "heartbeat_interval": None})
+        logs = Logs(client=client)
+
+        with identity_map.scope():
+            loaded = identity_map.add(logs, Document({"_id": 1}))
+
+            docs = ({"msg": i} for i in range(4))
+            results = list(logs.insert_stream(docs, batch_size=2))
+
+            assert [i.ids for i in results] == [[0, 1], [0, 1]]
+            assert threading.current_thread() not in threads
+
+            # The map of this thread is invalidated
+            assert identity_map.get(logs, 1) is not loaded
@@ -0,0 +1,66 @@
+import pytest
+
+from djamo import Index
+from djamo.index import diff_indexes, sync_indexes
+
+
+class FakeCollection(object):
+    """
+    A collection which keeps its indexes in memory.
+    """
+
+    full_name = "djamo_test.students"
+
+    def __init__(self, indexes, info):
+        self.indexes = indexes
+        self.info = info
+        self.created = []
+        self.dropped = []
+
+    def index_information(self):
+        return dict(self.info)
+
+    def create_index(self, keys, **options):
+        self.created.append((keys, options))
+
+    def drop_index(self, name):
+        self.dropped.append(name)
+
+
+class TestIndex:
+
+    def test_names(self):
+        print("\nIndex names --------------")
+        assert Index("name").key_list == [("name", 1)]
+        assert Index(["age", ("uid", -1)]).name == "age_1_uid_-1"
+        assert Index("name", name="by_name").name == "by_name"
+
+    def test_diff(self):
+        print("Index diff --------------")
+        info = {"_id_": {"key": [("_id", 1)]},
+                "by_age": {"key": [("age", 1)]},
+                "name_1": {"key": [("name", 1)]},
+                "old_1": {"key": [("old", 1)]}}
+        collection = FakeCollection([Index("age"),
+                                     Index("name", unique=True),
+                                     Index("uid")], info)
+
+        diff = diff_indexes(collection)
+        assert [i.name for i in diff.missing] == ["uid_1"]
+        assert [i[1] for i in diff.changed] == ["name_1"]
+        assert diff.stale == ["old_1"]
+
+        # Nothing will be dropped by default
+        sync_indexes([collection])
+        assert collection.created == [([("uid", 1)], {"background": True})]
+        assert collection.dropped == []
+
+        collection.created = []
+        sync_indexes([collection], drop=True, background=False)
+        assert collection.dropped == ["name_1", "old_1"]
+        assert [i[0] for i in collection.created] == [[("name", 1)],
+                                                      [("uid", 1)]]
+
+        collection.indexes = ["name"]
+        with pytest.raises(TypeError):
+            diff_indexes(collection)
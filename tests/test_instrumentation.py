@@ -0,0 +1,96 @@
+import logging
+
+import pytest
+
+from djamo.cursor import Cursor
+from djamo.instrumentation import (Instrumentation, instrumentation,
+                                   HistogramListener, LoggingListener,
+                                   PrometheusListener, payload_size)
+
+from .test_cursor import Posts, RawCursor
+
+
+class NamedPosts(Posts):
+    full_name = "djamo_test.posts"
+
+
+class TestInstrumentation:
+
+    def teardown_method(self, method):
+        instrumentation.configure([])
+
+    def test_operations(self):
+        print("\nOperations --------------")
+        registry = Instrumentation([])
+        assert registry.operation(NamedPosts(), "insert") is None
+
+        histogram = registry.register(HistogramListener(buckets=[1, 10]))
+        operation = registry.operation(NamedPosts(), "insert")
+        operation.mark("prepare")
+        operation.finish("network", documents=2, payload=10)
+
+        with pytest.raises(ValueError):
+            operation = registry.operation(NamedPosts(), "insert")
+            operation.call(int, "x")
+
+        snapshot = histogram.snapshot()
+        key = ("djamo_test.posts", "insert")
+        assert snapshot["totals"][key] == {"documents": 2, "payload": 10,
+                                           "errors": 1}
+        total = snapshot["histograms"][key + ("total",)]
+        assert total["count"] == 2
+        assert total["buckets"][0] == (1, 2)
+        assert set(i[2] for i in snapshot["histograms"]) == \
+            set(["total", "prepare", "network"])
+
+        registry.unregister(histogram)
+        assert not registry.active
+
+    def test_cursor(self):
+        print("Cursor --------------")
+        histogram = instrumentation.register(HistogramListener(payload=True))
+        docs = [{"title": "post%s" % i} for i in range(3)]
+
+        posts = list(Cursor(NamedPosts(), RawCursor(docs), batch_size=2))
+        assert len(posts) == 3
+
+        snapshot = histogram.snapshot()
+        key = ("djamo_test.posts", "fetch")
+        assert snapshot["totals"][key]["documents"] == 3
+        assert snapshot["totals"][key]["payload"] == payload_size(docs)
+        # The last fetch finds nothing
+        assert snapshot["histograms"][key + ("deserialize",)]["count"] == 3
+
+    def test_exporters(self, caplog):
+        print("Exporters --------------")
+        prometheus = PrometheusListener(buckets=[1])
+        registry = Instrumentation([prometheus, LoggingListener()])
+
+        with caplog.at_level(logging.DEBUG, "djamo.instrumentation"):
+            registry.operation(NamedPosts(), "remove").finish("network", 4)
+
+        assert "djamo_test.posts.remove" in caplog.text
+        assert "documents=4" in caplog.text
+
+        text = prometheus.render()
+        labels = 'collection="djamo_test.posts",operation="remove"'
+        assert ('djamo_operation_seconds_bucket{%s,phase="network",'
+                'le="+Inf"} 1' % labels) in text
+        assert 'djamo_documents_total{%s} 4' % labels in text
+
+    def test_payload(self, caplog):
+        print("Payload --------------")
+        registry = Instrumentation([HistogramListener()])
+        operation = registry.operation(NamedPosts(), "insert")
+        operation.measure([{"title": "post"}])
+        assert operation.payload == 0
+
+        registry.register(LoggingListener(payload=True))
+        operation = registry.operation(NamedPosts(), "insert")
+        operation.measure([{"title": "post"}])
+        assert operation.payload == payload_size([{"title": "post"}])
+
+        with caplog.at_level(logging.WARNING, "djamo"):
+            operation.measure([{"title": object()}])
+
+        assert "Can't measure the payload" in caplog.text
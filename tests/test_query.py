@@ -0,0 +1,84 @@
+import time
+
+from djamo.base import Client
+from djamo import Collection, Document
+from djamo.serializers import *
+
+
+class Flag(Serializer):
+    """
+    Stores booleans as 1 and 0.
+    """
+
+    def serialize(self, value, **kwargs):
+        return int(value)
+
+    def is_valid_value(self, value):
+        return isinstance(value, bool)
+
+
+class Car(Document):
+    fields = {
+        "model": String(min_length=3, max_length=15, required=True),
+        "cost": Float(min_value=7.0, max_value=40000.50),
+        "sold": Flag(),
+    }
+
+
+class Cars(Collection):
+    document = Car
+
+
+class TestQuery:
+
+    def fixture(self):
+        client = Client(config={"name": "djamo_test"})
+        c = Cars(client=client)
+        return c
+
+    def test_prepare_query(self):
+        print("\nPrepare query --------------")
+        c = self.fixture()
+
+        assert c.prepare_query({"model": "bmw", "a.b": 1}) == \
+            {"model": "bmw", "a.b": 1}
+
+        assert c.prepare_query({"cost": {"$in": [10.0, 12.5]},
+                                "$or": [{"model": "bmw"},
+                                        {"cost": {"$gt": 20.0}}]}) == \
+            {"cost": {"$in": [10.0, 12.5]},
+             "$or": [{"model": "bmw"}, {"cost": {"$gt": 20.0}}]}
+
+        assert c.prepare_query({"$set": {"model": "bmw"},
+                                "$pop": {"owners": 1}}, "update") == \
+            {"$set": {"model": "bmw"}, "$pop": {"owners": 1}}
+
+    def test_operands(self):
+        print("Operands --------------")
+        c = self.fixture()
+
+        # Only the operands of value operators are values of the field
+        assert c.prepare_query({"sold": {"$exists": True}}) == \
+            {"sold": {"$exists": True}}
+        assert c.prepare_query({"sold": {"$type": "bool", "$size": 2}}) == \
+            {"sold": {"$type": "bool", "$size": 2}}
+        assert c.prepare_query({"sold": {"$ne": True, "$in": [False]}}) == \
+            {"sold": {"$ne": 1, "$in": [0]}}
+        assert c.prepare_query({"sold": {"$not": {"$eq": True}}}) == \
+            {"sold": {"$not": {"$eq": 1}}}
+
+    def test_plan_cache(self):
+        print("Plan cache --------------")
+        c = self.fixture()
+        plans = c.query_compiler.plans
+
+        c.prepare_query({"model": "bmw", "cost": {"$gt": 10.0}})
+        hits = plans.stats.hits
+
+        start = time.time()
+        for i in range(100000):
+            c.prepare_query({"model": "benz", "cost": {"$gt": float(i)}})
+        stop = time.time()
+
+        assert plans.stats.hits == hits + 100000
+        print("PREPARE QUERY: %f" % (stop - start))
@@ -0,0 +1,122 @@
+import logging
+import threading
+
+from djamo.instrumentation import Instrumentation
+from djamo.querylog import QueryLog
+
+from .test_instrumentation import NamedPosts
+
+
+class TestQueryLog:
+
+    def fixture(self, **kwargs):
+        log = QueryLog(**kwargs)
+        return log, Instrumentation([log])
+
+    def run(self, registry, name, spec, documents=0):
+        operation = registry.operation(NamedPosts(), name)
+        operation.spec = spec
+        operation.finish("network", documents)
+
+    def test_entries(self):
+        print("\nQuery log --------------")
+        log, registry = self.fixture(max_entries=3)
+
+        self.run(registry, "find_one", {"_id": 1}, 1)
+        entry = log.queries[0]
+        assert entry["collection"] == "djamo_test.posts"
+        assert entry["spec"] == {"_id": 1}
+        assert entry["documents"] == 1
+        assert entry["caller"][0] == __file__.rstrip("c")
+        assert entry["caller"][2] == "run"
+
+        for i in range(2, 5):
+            self.run(registry, "find_one", {"_id": i})
+        assert len(log.queries) == 3
+
+        # N+1 queries
+        assert log.repeated() == [(("djamo_test.posts", "find_one",
+                                    (("_id", None),)), 3)]
+
+        # Each thread has its own log
+        others = []
+        thread = threading.Thread(target=lambda: others.append(
+            list(log.queries)))
+        thread.start()
+        thread.join()
+        assert others == [[]]
+
+        log.clear()
+        assert log.queries == []
+
+    def test_requests(self):
+        print("Requests --------------")
+        from django.core.signals import request_started, request_finished
+
+        log, registry = self.fixture(max_entries=3)
+        self.run(registry, "find_one", {"_id": 1})
+        # Other receivers of the signals may need Django settings
+        request_started.send_robust(sender=None)
+        assert log.queries == []
+
+        log.configure(max_entries=10)
+        self.run(registry, "find_one", {"_id": 1})
+        request_finished.send_robust(sender=None)
+        assert log.queries == []
+
+    def test_caller(self):
+        print("Caller --------------")
+        from djamo.querylog import DJAMO_PATH, caller
+
+        # A sibling directory of the package is not a part of Djamo
+        filename = DJAMO_PATH + "_app/views.py"
+        namespace = {"caller": caller}
+        exec(compile("def view():\n    return caller()\n", filename,
+                     "exec"), namespace)
+
+        assert namespace["view"]()[0] == filename
+
+    def test_slow_queries(self, caplog):
+        print("Slow queries --------------")
+        log, registry = self.fixture(slow_threshold=0)
+
+        with caplog.at_level(logging.WARNING, "djamo.querylog"):
+            self.run(registry, "remove", {"age": 12})
+
+        assert "Slow Djamo query" in caplog.text
+        assert "djamo_test.posts.remove {'age': 12}" in caplog.text
+
+    def test_stream(self, monkeypatch):
+        print("Query log stream --------------")
+        from pymongo.collection import Collection as MongoCollection
+
+        from djamo import Collection, Document
+        from djamo.base import Client
+        from djamo.instrumentation import instrumentation
+
+        def insert(collection, docs, *args, **kwargs):
+            return [doc.setdefault("_id", i) for i, doc in enumerate(docs)]
+
+        # Inserts are the only server calls of the stream
+        monkeypatch.setattr(MongoCollection, "insert", insert, raising=False)
+
+        class Logs(Collection):
+            document = Document
+
+        client = Client(config={"name": "djamo_test",
+                                "heartbeat_interval": None})
+        logs = Logs(client=client)
+        log = QueryLog()
+        log.configure()
+        instrumentation.configure([log])
+
+        try:
+            for result in logs.insert_stream(({"msg": i} for i in range(3)),
+                                             batch_size=2):
+                assert result.ok
+        finally:
+            instrumentation.configure([])
+
+        assert [(i["operation"], i["documents"]) for i in log.queries] == \
+            [("insert", 2), ("insert", 1)]
+        assert log.queries[0]["caller"][2] == "test_stream"
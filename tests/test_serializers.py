@@ -58,3 +58,54 @@ class TestSerializers:
         with pytest.raises(Integer.ValidationError):
             a.acc = "asdasdasd"
             c.insert(a)
+
+
+def setup_django():
+    """
+    Configure Django with an in memory database of the auth models.
+    """
+    from django.conf import settings
+
+    if not settings.configured:
+        import django
+        from django.core.management import call_command
+
+        settings.configure(
+            INSTALLED_APPS=["django.contrib.auth",
+                            "django.contrib.contenttypes"],
+            DATABASES={"default": {"ENGINE": "django.db.backends.sqlite3",
+                                   "NAME": ":memory:"}})
+        django.setup()
+        call_command("migrate", verbosity=0)
+
+
+class TestDjangoUser:
+
+    def test_missing_user(self):
+        print("\nMissing user --------------")
+        setup_django()
+        from django.contrib.auth.models import User
+
+        class Comment(Document):
+            fields = {
+                "author": DjangoUser(missing="null"),
+            }
+
+        user = User.objects.create(username="okarin")
+        data = {"author": user.pk, "text": "El Psy Congroo"}
+        user.delete()
+
+        doc = Comment(data)
+        assert doc.author is None
+
+        # Deleted users still validate, serialize and save
+        doc.validate()
+        assert doc.serialize() == {"author": None, "text": "El Psy Congroo"}
+
+        doc.mark_clean()
+        doc.text = "Tuturu"
+        assert doc.serialize_update() == {"$set": {"text": "Tuturu"}}
+
+        loaded = Comment().deserialize(doc.serialize())
+        assert loaded.author is None
+        assert loaded.serialize() == {"author": None, "text": "Tuturu"}